@@ -3,7 +3,10 @@ Advanced Android App Generator Backend
 Production-ready backend with comprehensive features, security, and performance optimizations
 """
 
-from flask import Flask, request, jsonify, send_from_directory, send_file, g
+from flask import (
+    Flask, request, jsonify, send_from_directory, send_file, redirect, abort, g,
+    Response, stream_with_context, url_for
+)
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 # from flask_limiter import Limiter
@@ -11,13 +14,15 @@ from flask_jwt_extended import JWTManager, jwt_required, get_jwt_identity
 # from flask_caching import Cache
 # from flask_migrate import Migrate
 # from flask_socketio import SocketIO
-from sqlalchemy import create_engine
+from sqlalchemy import update, delete, insert, func, or_, and_
 from sqlalchemy.orm import sessionmaker, scoped_session
-from sqlalchemy.pool import QueuePool
 import os
+import base64
+import atexit
 import json
 import re
 import zipfile
+from contextlib import contextmanager
 import tempfile
 from datetime import datetime, timedelta
 from android_generator import AndroidAppGenerator
@@ -36,9 +41,27 @@ from models import (
     User, APIKey, UserSession, Project, ProjectFeature,
     ProjectActivity, ProjectDependency, ProjectAnalytics,
     SystemMetrics, BackgroundTask, AuditLog,
-    create_tables, get_user_by_email, get_user_by_username
+    create_tables, get_user_by_email, get_user_by_username, get_project_with_components, get_project_by_id
 )
 from auth import auth_manager, admin_required, active_user_required
+from project_storage import ProjectStorage, iter_project_files, diff_manifests
+from artifact_storage import (
+    LocalArtifactStorage, create_artifact_storage, project_zip_key, project_apk_key
+)
+from status_events import format_sse, ProgressCoalescer, TERMINAL_STATUSES
+from job_store import create_job_store
+from webhooks import WebhookDispatcher, is_valid_callback_url
+from request_metrics import request_metrics
+from generation_analytics import generation_analytics
+from metrics_retention import metrics_retention, RAW, MINUTE, HOUR, DAY
+from audit_writer import audit_writer
+from partitions import audit_partitions, analytics_partitions, partition_maintenance
+from database import create_database_engine
+from metrics import (
+    TimedQueuePool, REQUEST_LATENCY, STAGE_DURATION, GENERATION_DURATION, BUILD_DURATION,
+    bind_gauges, record_cache_lookup, start_metrics_server, pool_wait_listeners
+)
+from sql_profiler import sql_profiler
 # from integrations import (
 #     firebase_service, stripe_service, analytics_service,
 #     openai_service, github_service, email_service,
@@ -103,62 +126,300 @@ jwt = JWTManager(app)
 # socketio = SocketIO(app, cors_allowed_origins=config.CORS_ORIGINS, async_mode='eventlet')
 
 # Database setup
-engine = create_engine(
-    config.SQLALCHEMY_DATABASE_URI,
-    poolclass=QueuePool,
-    pool_size=config.SQLALCHEMY_ENGINE_OPTIONS['pool_size'],
-    max_overflow=config.SQLALCHEMY_ENGINE_OPTIONS['max_overflow'],
-    pool_recycle=config.SQLALCHEMY_ENGINE_OPTIONS['pool_recycle'],
-    echo=config.SQLALCHEMY_ENGINE_OPTIONS['echo']
-)
+# SQLite gets its own profile (WAL, pragmas, small pool, serialised writes)
+engine = create_database_engine(config, poolclass=TimedQueuePool)  # Pool reports checkout wait time
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+# Per-request SQL statistics (query counts, DB time, N+1 patterns, slow plans)
+if config.SQL_PROFILER_ENABLED:
+    sql_profiler.slow_threshold = config.SQL_SLOW_QUERY_SECONDS
+    sql_profiler.repeat_threshold = config.SQL_REPEAT_THRESHOLD
+    sql_profiler.install(engine)
+    pool_wait_listeners.append(sql_profiler.record_pool_wait)
 db_session = scoped_session(SessionLocal)
 
 # Initialize database tables
 create_tables(engine)
 
+# Request metrics are flushed as pre-aggregated rows every few seconds
+request_metrics.flush_interval = config.REQUEST_METRICS_FLUSH_SECONDS
+request_metrics.start(SessionLocal)
+
+# Generation outcomes roll up into hourly and all-time rows
+generation_analytics.bucket_seconds = config.ANALYTICS_BUCKET_SECONDS
+generation_analytics.flush_interval = config.ANALYTICS_FLUSH_SECONDS
+generation_analytics.start(SessionLocal)
+
+# SystemMetrics is downsampled into 1m/1h/1d tiers and expired in batches
+metrics_retention.retention = {
+    RAW: timedelta(hours=config.METRICS_RAW_RETENTION_HOURS),
+    MINUTE: timedelta(days=config.METRICS_MINUTE_RETENTION_DAYS),
+    HOUR: timedelta(days=config.METRICS_HOUR_RETENTION_DAYS),
+    DAY: timedelta(days=config.METRICS_DAY_RETENTION_DAYS)
+}
+metrics_retention.interval = config.METRICS_RETENTION_INTERVAL
+metrics_retention.batch_size = config.METRICS_RETENTION_BATCH_SIZE
+metrics_retention.start(SessionLocal)
+
+# Audit log and project analytics go to monthly partition tables; old months are archived
+if config.PARTITIONING_ENABLED:
+    for partitions in (audit_partitions, analytics_partitions):
+        partitions.archive_path = config.PARTITION_ARCHIVE_PATH
+        partitions.keep_months = config.PARTITION_KEEP_MONTHS
+    audit_writer.partitions = audit_partitions
+    partition_maintenance.interval = config.PARTITION_MAINTENANCE_INTERVAL
+    partition_maintenance.start(engine)
+
+# Audit events are written behind the request in batches
+audit_writer.queue.maxsize = config.AUDIT_QUEUE_SIZE
+audit_writer.flush_interval = config.AUDIT_FLUSH_INTERVAL
+audit_writer.start(engine, config.AUDIT_SPILL_PATH)
+
 # Initialize our custom managers
 auth_manager.init_app(app)
 auth_manager.db_session = db_session
 # cache_manager.init_app(app)
-# realtime_manager.init_app(app, config.CORS_ORIGINS)
+# realtime_manager.init_app(app, config.CORS_ORIGINS, config.REALTIME_MESSAGE_QUEUE, config.REALTIME_CHANNEL)
+# notification_manager.session_factory = SessionLocal  # Persisted history, one session per operation
 # register_pwa_routes(app)
 
 # Setup APK deployment routes (requires qrcode, Pillow)
 # from apk_deployment import setup_deployment_routes
 # setup_deployment_routes(app, config.PROJECT_STORAGE_PATH)
 
-# Global storage with thread safety
-project_status = {}
-active_generations = {}
-generation_queue = deque()
-user_rate_limits = {}
-project_analytics = {}
-background_tasks = {}
+# Generated project storage with expiry tracking
+project_storage = ProjectStorage(
+    config.PROJECT_STORAGE_PATH,
+    config.TEMP_STORAGE_HOURS,
+    config.COLD_STORAGE_IDLE_HOURS
+)
 
-# Thread locks for concurrent access
-project_lock = threading.Lock()
-analytics_lock = threading.Lock()
+# Downloadable artifacts (local disk or shared object store)
+artifact_storage = create_artifact_storage(config)
+
+# Outbound completion callbacks
+webhook_dispatcher = WebhookDispatcher(
+    config.WEBHOOK_QUEUE_PATH,
+    config.WEBHOOK_SECRET,
+    max_attempts=config.WEBHOOK_MAX_ATTEMPTS,
+    timeout=config.WEBHOOK_TIMEOUT_SECONDS,
+    workers=config.WEBHOOK_WORKERS,
+    allowed_hosts=config.WEBHOOK_ALLOWED_HOSTS
+)
 
-# Global storage
-project_status = {}
-active_generations = {}
+# Job state shared by every worker (status, analytics, active generations)
+job_store = create_job_store(config)
 generation_queue = deque()
-user_rate_limits = {}
-project_analytics = {}
+
+# Prometheus exposition on its own port; queue gauges are read at scrape time
+bind_gauges(lambda: len(generation_queue), job_store.active_count)
+# Under `python app.py` the Werkzeug reloader parent only watches files; the
+# child it spawns (WERKZEUG_RUN_MAIN set) is the process serving requests
+if config.ENABLE_METRICS and (__name__ != '__main__' or os.environ.get('WERKZEUG_RUN_MAIN') == 'true'):
+    start_metrics_server(config.METRICS_PORT)
+
+# Job statuses map onto the coarser Project.status column
+PROJECT_RECORD_STATUSES = {'queued': 'queued', 'completed': 'completed', 'error': 'failed', 'cancelled': 'cancelled'}
+
+def split_description(text):
+    """'Name - description' strings used in generation results"""
+    name, _, description = str(text).partition(' - ')
+    return name.strip(), description.strip() or None
+
+def project_component_rows(project_id, result):
+    """Feature, activity and dependency rows for a generation result"""
+    features = []
+    for feature in result.get('features') or []:
+        if isinstance(feature, dict):
+            features.append({
+                'project_id': project_id,
+                'name': str(feature.get('name', ''))[:200],
+                'description': feature.get('description'),
+                'category': feature.get('category'),
+                'complexity': feature.get('complexity'),
+                'is_implemented': True
+            })
+        else:
+            name, description = split_description(feature)
+            features.append({
+                'project_id': project_id,
+                'name': name[:200],
+                'description': description,
+                'category': None,
+                'complexity': None,
+                'is_implemented': True
+            })
+
+    activities = []
+    for activity in result.get('activities') or []:
+        name, description = split_description(activity.get('name', '') if isinstance(activity, dict) else activity)
+        activities.append({
+            'project_id': project_id,
+            'name': name[:100],
+            'type': 'fragment' if name.endswith('Fragment') else 'activity',
+            'description': description,
+            'is_main': name == 'MainActivity'
+        })
+
+    dependencies = []
+    for dependency in result.get('dependencies') or []:
+        coordinate, description = split_description(dependency)
+        parts = coordinate.split(':')
+        dependencies.append({
+            'project_id': project_id,
+            'name': ':'.join(parts[:2])[:200],
+            'version': parts[2][:50] if len(parts) > 2 else None,
+            'type': 'implementation',
+            'description': description
+        })
+
+    return features, activities, dependencies
+
+def write_project_record(project_id, changes):
+    """Write status transitions through to the Project row so listings survive restarts"""
+    if 'status' not in changes:
+        return  # Progress-only ticks stay in the job store
+
+    values = {'status': PROJECT_RECORD_STATUSES.get(changes['status'], 'processing')}
+    if 'progress' in changes:
+        values['progress'] = float(changes['progress'])
+    if 'error' in changes:
+        values['error_message'] = str(changes['error'])
+    if changes['status'] == 'completed':
+        result = changes.get('result', {})
+        values.update({
+            'completed_at': datetime.utcnow(),
+            'build_time': changes.get('generation_time'),
+            'file_size': result.get('projectSize'),
+            'app_name': result.get('appName'),
+            'project_path': result.get('projectPath'),
+            'download_url': f"/download/{project_id}"
+        })
+
+    session = SessionLocal()
+    try:
+        session.execute(update(Project).where(Project.id == project_id).values(**values))
+        if changes['status'] == 'completed':
+            # Replace components in the same transaction, one executemany per table
+            for model, rows in zip(
+                (ProjectFeature, ProjectActivity, ProjectDependency),
+                project_component_rows(project_id, changes.get('result', {}))
+            ):
+                session.execute(delete(model).where(model.project_id == project_id))
+                if rows:
+                    session.execute(insert(model), rows)
+        session.commit()
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Failed to update project record {project_id}: {str(e)}")
+    finally:
+        session.close()
+
+def record_generation_outcome(project_id, previous, changes):
+    """Feed a job's first terminal status into the analytics rollups"""
+    if 'generation_time' in changes:
+        duration = changes['generation_time']
+    else:
+        start_time = job_store.get_analytics(project_id).get('start_time')
+        duration = time.time() - start_time if start_time else None
+    generation_analytics.record_finished(
+        previous.get('category'), previous.get('architecture'), changes['status'], duration
+    )
+
+def persist_project_analytics(project_id):
+    """Write a finished job's start, step, error and final events to project_analytics"""
+    analytics = job_store.get_analytics(project_id)
+    status = job_store.get(project_id) or {}
+    start_time = analytics.get('start_time')
+    if not start_time:
+        return
+
+    def event(event_type, at, data=None, duration=None):
+        return {
+            'project_id': project_id,
+            'event_type': event_type,
+            'event_data': data,
+            'timestamp': datetime.utcfromtimestamp(at),
+            'duration': duration
+        }
+
+    rows = [event('start', start_time, {'category': status.get('category'), 'architecture': status.get('architecture')})]
+    for step in analytics.get('steps', []):
+        rows.append(event('progress', step['timestamp'], step, step['timestamp'] - start_time))
+    for error in analytics.get('errors', []):
+        rows.append(event('error', error['timestamp'], error, error['timestamp'] - start_time))
+    finished = time.time()
+    rows.append(event(status.get('status', 'unknown'), finished, None, finished - start_time))
+
+    try:
+        with engine.begin() as conn:
+            if config.PARTITIONING_ENABLED:
+                analytics_partitions.insert(conn, rows)
+            else:
+                conn.execute(insert(ProjectAnalytics), rows)
+    except Exception as e:
+        logger.error(f"Failed to write project analytics {project_id}: {str(e)}")
+
+def apply_status_changes(project_id, changes):
+    finishing = changes.get('status') in TERMINAL_STATUSES
+    previous = job_store.get(project_id) if finishing else None
+    version = job_store.update(project_id, changes)
+    if version is not None:
+        write_project_record(project_id, changes)
+        if previous and previous.get('status') not in TERMINAL_STATUSES:
+            record_generation_outcome(project_id, previous, changes)
+    return version
+
+# Stage progress is coalesced per project; terminal statuses go straight through
+status_coalescer = ProgressCoalescer(apply_status_changes, config.PROGRESS_UPDATE_HZ)
+atexit.register(status_coalescer.close)
+
+def update_project_status(project_id, changes):
+    """Apply status changes, rate-limited per project; returns the version if written at once"""
+    return status_coalescer.submit(project_id, changes)
 
 # Database session management
-@app.before_request
-def create_db_session():
-    """Create database session for each request"""
-    g.db_session = db_session()
+def get_db():
+    """Return the request's database session, opening it on first use"""
+    if 'db_session' not in g:
+        g.db_session = db_session()
+    return g.db_session
 
 @app.after_request
 def close_db_session(response):
     """Close database session after each request"""
-    if hasattr(g, 'db_session'):
-        g.db_session.close()
+    session = g.pop('db_session', None)
+    if session is not None:
+        session.close()
+    return response
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+    if config.SQL_PROFILER_ENABLED:
+        sql_profiler.begin_request(request.method, request.path)
+
+@app.after_request
+def attach_sql_profile(response):
+    """Expose the request's SQL statistics as response headers"""
+    profile = sql_profiler.end_request(request.endpoint, response.status_code) if config.SQL_PROFILER_ENABLED else None
+    if profile:
+        response.headers['X-DB-Query-Count'] = str(profile['queries'])
+        response.headers['X-DB-Time-Ms'] = str(profile['db_time_ms'])
+        response.headers['X-DB-Pool-Wait-Ms'] = str(profile['pool_wait_ms'])
+        response.headers['X-DB-Repeated-Queries'] = str(len(profile['repeated']))
+    return response
+
+@app.after_request
+def observe_request_latency(response):
+    """Record every request, including 404s and ones that skip the view decorators"""
+    if hasattr(g, 'request_start'):
+        REQUEST_LATENCY.labels(
+            endpoint=request.endpoint or 'unknown',
+            method=request.method,
+            status=str(response.status_code)
+        ).observe(time.perf_counter() - g.request_start)
     return response
 
 # Enhanced error handler decorator
@@ -170,9 +431,9 @@ def handle_errors(f):
         except Exception as e:
             logger.error(f"Error in {f.__name__}: {str(e)}", exc_info=True)
 
-            # Log to audit system
+            # Log to audit system (queued, written in bulk off the request path)
             try:
-                audit_log = AuditLog(
+                audit_writer.record(
                     action=f"error_{f.__name__}",
                     resource_type='system',
                     resource_id='error',
@@ -187,8 +448,6 @@ def handle_errors(f):
                     user_agent=request.headers.get('User-Agent'),
                     success=False
                 )
-                g.db_session.add(audit_log)
-                g.db_session.commit()
             except Exception as audit_error:
                 logger.error(f"Failed to log audit event: {str(audit_error)}")
 
@@ -211,23 +470,12 @@ def log_requests(f):
         if duration > 2.0:
             logger.warning(f"Slow request: {request.method} {request.path} took {duration:.2f}s")
 
-        # Track system metrics
-        try:
-            metric = SystemMetrics(
-                metric_type='request',
-                metric_name='response_time',
-                value=duration,
-                unit='seconds',
-                metadata={
-                    'endpoint': request.endpoint,
-                    'method': request.method,
-                    'status_code': response.status_code if hasattr(response, 'status_code') else 0
-                }
-            )
-            g.db_session.add(metric)
-            g.db_session.commit()
-        except Exception as e:
-            logger.error(f"Failed to record metrics: {str(e)}")
+        # Track system metrics (aggregated in memory, written in bulk by a background thread)
+        if isinstance(response, tuple) and len(response) > 1 and isinstance(response[1], int):
+            status_code = response[1]
+        else:
+            status_code = getattr(response, 'status_code', 0)
+        request_metrics.record(request.endpoint, request.method, status_code, duration)
 
         return response
     return wrapped
@@ -251,7 +499,13 @@ def validate_app_input(data):
     theme = data.get('theme', 'light').lower()
     if theme not in ['light', 'dark', 'auto']:
         errors.append('Geçersiz tema')
-    
+
+    callback_url = (data.get('callbackUrl') or '').strip()
+    if callback_url and not webhook_dispatcher.enabled:
+        errors.append('Webhook desteği yapılandırılmamış')
+    elif callback_url and not is_valid_callback_url(callback_url, config.WEBHOOK_ALLOWED_HOSTS):
+        errors.append('Geçersiz callback URL')
+
     return errors
 
 # Authentication endpoints
@@ -337,7 +591,7 @@ def login():
 def logout():
     """User logout endpoint"""
     user_id = get_jwt_identity()
-    user = g.db_session.query(User).filter_by(id=user_id).first()
+    user = get_db().query(User).filter_by(id=user_id).first()
 
     if user:
         auth_manager.logout_user(user)
@@ -353,7 +607,7 @@ def logout():
 def refresh_token():
     """Refresh access token"""
     user_id = get_jwt_identity()
-    user = g.db_session.query(User).filter_by(id=user_id).first()
+    user = get_db().query(User).filter_by(id=user_id).first()
 
     if not user or not user.is_active:
         return jsonify({'success': False, 'error': 'Invalid user'}), 401
@@ -371,7 +625,7 @@ def refresh_token():
 def get_profile():
     """Get user profile"""
     user_id = get_jwt_identity()
-    user = g.db_session.query(User).filter_by(id=user_id).first()
+    user = get_db().query(User).filter_by(id=user_id).first()
 
     if not user:
         return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -401,7 +655,7 @@ def generate_app():
     user_id = get_jwt_identity()
     user = None
     if user_id:
-        user = g.db_session.query(User).filter_by(id=user_id).first()
+        user = get_db().query(User).filter_by(id=user_id).first()
 
     idea = data.get('idea', '').strip()
     app_name = data.get('appName', '').strip() or 'MyApp'
@@ -411,15 +665,15 @@ def generate_app():
     advanced_features = data.get('advancedFeatures', [])
     architecture = data.get('architecture', 'single_activity')  # NEW
     ui_framework = data.get('uiFramework', 'xml')  # NEW: 'xml' or 'compose'
+    callback_url = (data.get('callbackUrl') or '').strip() or None
 
     # Check concurrent generations limit
-    with project_lock:
-        if len(active_generations) >= config.MAX_CONCURRENT_GENERATIONS:
-            return jsonify({
-                'success': False,
-                'error': 'Sistem yoğun. Lütfen birkaç dakika sonra tekrar deneyin.',
-                'queue_position': len(generation_queue) + 1
-            }), 503
+    if job_store.active_count() >= config.MAX_CONCURRENT_GENERATIONS:
+        return jsonify({
+            'success': False,
+            'error': 'Sistem yoğun. Lütfen birkaç dakika sonra tekrar deneyin.',
+            'queue_position': len(generation_queue) + 1
+        }), 503
 
     # Generate unique project ID
     project_id = str(uuid.uuid4())
@@ -427,7 +681,8 @@ def generate_app():
     # Create safe folder name from app name
     safe_app_name = ''.join(c for c in app_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
     folder_name = f"{safe_app_name}_{project_id[:8]}" if safe_app_name else project_id
-    project_path = os.path.join(config.PROJECT_STORAGE_PATH, folder_name)
+    storage_entry = project_storage.register(project_id, folder_name, metadata={'app_name': app_name})
+    project_path = os.path.join(config.PROJECT_STORAGE_PATH, storage_entry['folder'])
 
     # Create project record in database
     project = Project(
@@ -440,12 +695,15 @@ def generate_app():
         theme=theme,
         status='queued'
     )
-    g.db_session.add(project)
-    g.db_session.commit()
+    session = get_db()
+    session.add(project)
+    session.commit()
 
     # Initialize project status with enhanced tracking
-    with project_lock:
-        project_status[project_id] = {
+    estimated_completion = (datetime.utcnow() + timedelta(minutes=2)).isoformat()
+    job_store.create(
+        project_id,
+        {
             'status': 'queued',
             'progress': 0,
             'current_step': 'Sıraya alındı...',
@@ -459,25 +717,27 @@ def generate_app():
             'advanced_features': advanced_features,
             'architecture': architecture,
             'ui_framework': ui_framework,
-            'estimated_completion': (datetime.utcnow() + timedelta(minutes=2)).isoformat(),
-            'user_id': user.id if user else None
-        }
-
+            'estimated_completion': estimated_completion,
+            'user_id': user.id if user else None,
+            'callback_url': callback_url
+        },
         # Initialize analytics
-        project_analytics[project_id] = {
+        {
             'start_time': time.time(),
             'steps': [],
             'errors': []
         }
+    )
 
-        # Start generation in background
-        thread = threading.Thread(
-            target=generate_app_async,
-            args=(project_id, idea, language, theme, category, advanced_features, architecture, ui_framework, project_path, app_name),
-            daemon=True
-        )
-        thread.start()
-        active_generations[project_id] = thread
+    # Start generation in background
+    job_store.start_generation(project_id)
+    generation_analytics.record_started(category, architecture)
+    thread = threading.Thread(
+        target=generate_app_async,
+        args=(project_id, idea, language, theme, category, advanced_features, architecture, ui_framework, project_path, app_name),
+        daemon=True
+    )
+    thread.start()
 
     # Log analytics event
     # if analytics_service.initialized:
@@ -498,10 +758,11 @@ def generate_app():
         'success': True,
         'project_id': project_id,
         'status': 'queued',
-        'estimated_completion': project_status[project_id]['estimated_completion']
+        'estimated_completion': estimated_completion
     })
 
 def generate_app_async(project_id, idea, language, theme, category, advanced_features, architecture, ui_framework, project_path, app_name):
+    generation_start = time.perf_counter()
     try:
         steps = [
             ('analyzing', 15, 'Fikir analiz ediliyor...', 3),
@@ -515,27 +776,31 @@ def generate_app_async(project_id, idea, language, theme, category, advanced_fea
         ]
         
         for status, progress, step_name, duration in steps:
-            project_status[project_id].update({
+            stage_start = time.perf_counter()
+            update_project_status(project_id, {
                 'status': status,
                 'progress': progress,
                 'current_step': step_name,
                 'steps_completed': steps.index((status, progress, step_name, duration)) + 1
             })
             
-            project_analytics[project_id]['steps'].append({
+            job_store.append_analytics(project_id, 'steps', {
                 'name': step_name,
                 'timestamp': time.time(),
                 'progress': progress
             })
             
             time.sleep(duration)
+            STAGE_DURATION.labels(stage=status).observe(time.perf_counter() - stage_start)
         
         # Generate app
+        stage_start = time.perf_counter()
         generator = AndroidAppGenerator()
         result = generator.generate_from_idea(idea, language, architecture, ui_framework, project_path, app_name)
+        STAGE_DURATION.labels(stage='generating_code').observe(time.perf_counter() - stage_start)
         
         # Build APK automatically
-        project_status[project_id].update({
+        update_project_status(project_id, {
             'status': 'building_apk',
             'progress': 96,
             'current_step': 'APK oluşturuluyor... (Bu 2-3 dakika sürebilir)'
@@ -550,11 +815,20 @@ def generate_app_async(project_id, idea, language, theme, category, advanced_fea
         else:
             logger.warning(f"APK build failed for {project_id}, but project files are ready")
         
+        # Hash files once so later regenerations can be downloaded as deltas
+        manifest_hash = project_storage.save_manifest(project_id, result['project_path'])
+
+        # Publish the ZIP and APK so any API node can serve them
+        stage_start = time.perf_counter()
+        publish_artifacts(project_id, result['project_path'], apk_path)
+        STAGE_DURATION.labels(stage='publishing').observe(time.perf_counter() - stage_start)
+
         # Calculate generation time
-        generation_time = time.time() - project_analytics[project_id]['start_time']
+        generation_time = time.time() - job_store.get_analytics(project_id)['start_time']
+        GENERATION_DURATION.labels(result='completed').observe(time.perf_counter() - generation_start)
         
         # Complete with enhanced result data
-        project_status[project_id].update({
+        update_project_status(project_id, {
             'status': 'completed',
             'progress': 100,
             'current_step': 'Tamamlandı!',
@@ -602,6 +876,7 @@ def generate_app_async(project_id, idea, language, theme, category, advanced_fea
                     'com.google.firebase:firebase-analytics:21.5.0 - Analytics'
                 ]),
                 'downloadId': os.path.basename(result['project_path']),
+                'manifestHash': manifest_hash,
                 'apkPath': apk_path if apk_built else None,
                 'apkReady': apk_built,
                 'language': language,
@@ -623,53 +898,130 @@ def generate_app_async(project_id, idea, language, theme, category, advanced_fea
             }
         })
         
+        project_storage.touch(project_id)
+        send_webhook(project_id, 'project.completed', {
+            'appName': result['app_name'],
+            'generationTime': round(generation_time, 2),
+            'manifestHash': manifest_hash,
+            'apkReady': apk_built,
+            'downloadUrl': f"/download/{project_id}"
+        })
+        if apk_built:
+            send_webhook(project_id, 'apk.ready', {'downloadUrl': f"/download-apk/{project_id}"})
         logger.info(f"Completed generation for project {project_id} in {generation_time:.2f}s")
         
     except Exception as e:
         logger.error(f"Error generating project {project_id}: {str(e)}", exc_info=True)
-        project_status[project_id].update({
+        update_project_status(project_id, {
             'status': 'error',
             'error': str(e),
             'failed_at': datetime.now().isoformat()
         })
-        project_analytics[project_id]['errors'].append({
+        send_webhook(project_id, 'project.failed', {'error': str(e)})
+        GENERATION_DURATION.labels(result='error').observe(time.perf_counter() - generation_start)
+        job_store.append_analytics(project_id, 'errors', {
             'message': str(e),
             'timestamp': time.time()
         })
     finally:
         # Clean up
-        if project_id in active_generations:
-            del active_generations[project_id]
+        job_store.finish_generation(project_id)
+        persist_project_analytics(project_id)
+
+def public_status(status):
+    """Job status as returned to clients; the callback URL stays server-side"""
+    return {key: value for key, value in status.items() if key != 'callback_url'}
 
 @app.route('/status/<project_id>')
 @handle_errors
 def get_status(project_id):
-    if project_id in project_status:
-        status = project_status[project_id].copy()
-        
-        # Add real-time info
-        if status['status'] in ['analyzing', 'generating', 'building']:
-            status['active_threads'] = len(active_generations)
-            status['queue_length'] = len(generation_queue)
-        
-        return jsonify(status)
-    return jsonify({'status': 'not_found', 'error': 'Proje bulunamadı'}), 404
+    """Project status with ETag revalidation and ?since=<version> long-polling"""
+    since = request.args.get('since', type=int)
+    if since is not None:
+        timeout = min(
+            request.args.get('timeout', config.LONG_POLL_TIMEOUT_SECONDS, type=float),
+            config.LONG_POLL_TIMEOUT_SECONDS
+        )
+        status = job_store.wait_for_change(project_id, since, max(timeout, 0))
+    else:
+        status = job_store.get(project_id)
+
+    if status is None:
+        return jsonify({'status': 'not_found', 'error': 'Proje bulunamadı'}), 404
+
+    status = public_status(status)
+    etag = f"{project_id}:{status.get('version', 0)}"
+    if request.if_none_match.contains(etag) or (since is not None and status.get('version', 0) <= since):
+        response = Response(status=304)
+        response.set_etag(etag)
+        return response
+
+    # Add real-time info
+    if status['status'] in ['analyzing', 'generating', 'building']:
+        status['active_threads'] = job_store.active_count()
+        status['queue_length'] = len(generation_queue)
+
+    response = jsonify(status)
+    response.set_etag(etag)
+    return response
+
+@app.route('/status/<project_id>/stream')
+@handle_errors
+def stream_status(project_id):
+    """Server-Sent Events stream carrying only status changes
+
+    Each open stream holds a worker thread, so streams end after
+    SSE_MAX_STREAM_SECONDS; EventSource reconnects after the retry hint and
+    sends Last-Event-ID, which skips the snapshot if nothing changed.
+    """
+    snapshot = job_store.get(project_id)
+    if snapshot is None:
+        return jsonify({'status': 'not_found', 'error': 'Proje bulunamadı'}), 404
+    last_event_id = request.headers.get('Last-Event-ID', type=int)
+
+    def generate():
+        deadline = time.monotonic() + config.SSE_MAX_STREAM_SECONDS
+        yield f"retry: {int(config.SSE_RETRY_MS)}\n\n"
+        last = public_status(snapshot)
+        if last.get('version') != last_event_id or last.get('status') in TERMINAL_STATUSES:
+            yield format_sse('snapshot', last, last.get('version'))
+        while last.get('status') not in TERMINAL_STATUSES:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            # The store may be written by another worker, so diff successive snapshots
+            current = job_store.wait_for_change(
+                project_id, last.get('version', 0), min(config.SSE_KEEPALIVE_SECONDS, remaining)
+            )
+            if current is None:
+                return
+            current = public_status(current)
+            if current.get('version') == last.get('version'):
+                yield ': keepalive\n\n'
+                continue
+            changes = {key: value for key, value in current.items() if last.get(key) != value}
+            yield format_sse('status', changes, current.get('version'))
+            last = current
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
 
 @app.route('/cancel/<project_id>', methods=['POST'])
 @handle_errors
 def cancel_generation(project_id):
-    if project_id in project_status:
-        project_status[project_id].update({
-            'status': 'cancelled',
-            'cancelled_at': datetime.now().isoformat()
-        })
-        
-        if project_id in active_generations:
-            del active_generations[project_id]
-        
+    version = update_project_status(project_id, {
+        'status': 'cancelled',
+        'cancelled_at': datetime.now().isoformat()
+    })
+    if version is not None:
+        job_store.finish_generation(project_id)
+
         logger.info(f"Cancelled generation for project {project_id}")
         return jsonify({'success': True, 'message': 'İşlem iptal edildi'})
-    
+
     return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
 
 @app.route('/templates')
@@ -843,135 +1195,415 @@ def get_ai_suggestions():
 @app.route('/download/<project_id>')
 @handle_errors
 def download_project(project_id):
-    # Get the correct folder name from project status
-    if project_id in project_status:
-        result = project_status[project_id].get('result', {})
-        download_id = result.get('downloadId', project_id)
-        project_path = os.path.join(config.PROJECT_STORAGE_PATH, download_id)
-    else:
-        # Fallback to project_id if status not found
-        project_path = os.path.join(config.PROJECT_STORAGE_PATH, project_id)
+    cached_zip = published_artifact(project_zip_key(project_id), 'artifact_zip')
+    if cached_zip:
+        project_storage.touch(project_id)
+        return artifact_redirect(project_zip_key(project_id), f"{download_filename(project_id)}.zip", project_id)
+
+    with checkout_project(project_id) as project_path:
+        if not os.path.exists(project_path):
+            return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
+
+        # Check file size
+        size_mb = get_directory_size(project_path) / (1024 * 1024)
+        if size_mb > config.MAX_PROJECT_SIZE_MB:
+            return jsonify({
+                'success': False,
+                'error': f'Proje boyutu çok büyük ({size_mb:.1f}MB)'
+            }), 413
 
-    if not os.path.exists(project_path):
-        return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
-    
-    # Check file size
-    size_mb = get_directory_size(project_path) / (1024 * 1024)
-    if size_mb > config.MAX_PROJECT_SIZE_MB:
-        return jsonify({
-            'success': False,
-            'error': f'Proje boyutu çok büyük ({size_mb:.1f}MB)'
-        }), 413
-    
-    # Create temporary ZIP file
-    temp_dir = tempfile.gettempdir()
-    zip_path = os.path.join(temp_dir, f"{project_id}.zip")
-    
-    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-        for root, dirs, files in os.walk(project_path):
-            # Skip build directories
-            dirs[:] = [d for d in dirs if d not in ['build', '.gradle', '.idea']]
-            
-            for file in files:
-                file_path = os.path.join(root, file)
-                arc_name = os.path.relpath(file_path, project_path)
-                zipf.write(file_path, arc_name)
-    
-    # Get app name for download filename
-    app_name = "App"
-    if project_id in project_status:
-        result = project_status[project_id].get('result', {})
-        app_name = result.get('appName', 'App')
+        # Create temporary ZIP file
+        temp_dir = tempfile.gettempdir()
+        zip_path = os.path.join(temp_dir, f"{project_id}.zip")
 
-    # Sanitize app name for filename
-    safe_filename = ''.join(c for c in app_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    if not safe_filename:
-        safe_filename = "App"
+        build_project_zip(project_path, zip_path)
 
     logger.info(f"Downloaded project {project_id}")
-    return send_file(
+    response = send_file(
         zip_path,
         as_attachment=True,
-        download_name=f"{safe_filename}.zip",
+        download_name=f"{download_filename(project_id)}.zip",
+        mimetype='application/zip'
+    )
+    manifest = project_storage.get_manifest(project_id)
+    if manifest:
+        response.headers['X-Manifest-Hash'] = manifest[0]
+    return response
+
+@app.route('/download/<project_id>/manifest')
+@handle_errors
+def get_project_manifest(project_id):
+    """File hashes of a generated project, used as the base for delta downloads"""
+    manifest = project_storage.get_manifest(project_id)
+    if not manifest:
+        return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
+
+    manifest_hash, files = manifest
+    return jsonify({'success': True, 'manifest_hash': manifest_hash, 'files': files})
+
+@app.route('/download/<project_id>/delta', methods=['POST'])
+@handle_errors
+def download_project_delta(project_id):
+    """Download only files added or changed since the client's previous manifest"""
+    data = request.get_json(silent=True) or {}
+
+    manifest = project_storage.get_manifest(project_id)
+    if not manifest:
+        return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
+    manifest_hash, files = manifest
+
+    # Base is either a manifest hash we issued before or the client's own file hashes
+    base_files = data.get('files')
+    base_hash = data.get('manifest_hash')
+    if base_files is None and base_hash:
+        base_files = project_storage.find_manifest(base_hash)
+        if base_files is None:
+            return jsonify({
+                'success': False,
+                'error': 'Önceki manifest bulunamadı, dosya listesi gönderin'
+            }), 409
+    if not isinstance(base_files, dict):
+        return jsonify({'success': False, 'error': 'manifest_hash veya files gerekli'}), 400
+
+    delta = diff_manifests(base_files, files)
+    # Spooled to disk past a few MB; an empty base asks for the whole project
+    buffer = tempfile.SpooledTemporaryFile(max_size=8 * 1024 * 1024)
+    with checkout_project(project_id) as project_path:
+        paths = [(arc_name, os.path.join(project_path, *arc_name.split('/')))
+                 for arc_name in delta['added'] + delta['changed']]
+        size_mb = sum(os.path.getsize(path) for _, path in paths if os.path.exists(path)) / (1024 * 1024)
+        if size_mb > config.MAX_PROJECT_SIZE_MB:
+            buffer.close()
+            return jsonify({
+                'success': False,
+                'error': f'Proje boyutu çok büyük ({size_mb:.1f}MB)'
+            }), 413
+
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zipf:
+            for arc_name, path in paths:
+                zipf.write(path, arc_name)
+            zipf.writestr('.delta.json', json.dumps({
+                'base_manifest': base_hash,
+                'manifest_hash': manifest_hash,
+                **delta
+            }, indent=2))
+    buffer.seek(0)
+
+    logger.info(f"Delta download for project {project_id}: "
+                f"{len(delta['added'])} added, {len(delta['changed'])} changed, {len(delta['deleted'])} deleted")
+    response = send_file(
+        buffer,
+        as_attachment=True,
+        download_name=f"{project_id[:8]}_delta.zip",
         mimetype='application/zip'
     )
+    response.headers['X-Manifest-Hash'] = manifest_hash
+    return response
 
 @app.route('/download-apk/<project_id>')
 @handle_errors
 def download_apk(project_id):
     """Download APK file for completed project"""
-    if project_id in project_status:
-        result = project_status[project_id].get('result', {})
-        download_id = result.get('downloadId', project_id)
-        project_path = os.path.join(config.PROJECT_STORAGE_PATH, download_id)
-    else:
-        project_path = os.path.join(config.PROJECT_STORAGE_PATH, project_id)
-
-    apk_path = os.path.join(project_path, 'app', 'build', 'outputs', 'apk', 'debug', 'app-debug.apk')
-    
-    if not os.path.exists(apk_path):
-        return jsonify({'success': False, 'error': 'APK dosyası bulunamadı'}), 404
-    
-    # Get app name for download filename
-    app_name = "App"
-    if project_id in project_status:
-        result = project_status[project_id].get('result', {})
-        app_name = result.get('appName', 'App')
-
-    # Sanitize app name for filename
-    safe_filename = ''.join(c for c in app_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
-    if not safe_filename:
-        safe_filename = "App"
+    cached_apk = published_artifact(project_apk_key(project_id), 'artifact_apk')
+    if cached_apk:
+        project_storage.touch(project_id)
+        return artifact_redirect(project_apk_key(project_id), f"{download_filename(project_id)}.apk", project_id)
+
+    with checkout_project(project_id) as project_path:
+        apk_path = os.path.join(project_path, 'app', 'build', 'outputs', 'apk', 'debug', 'app-debug.apk')
+
+        if not os.path.exists(apk_path):
+            return jsonify({'success': False, 'error': 'APK dosyası bulunamadı'}), 404
+
+        logger.info(f"Downloaded APK for project {project_id}")
+        # send_file opens the APK here, so the open file outlives the lock
+        return send_file(
+            apk_path,
+            as_attachment=True,
+            download_name=f"{download_filename(project_id)}.apk",
+            mimetype='application/vnd.android.package-archive'
+        )
 
-    logger.info(f"Downloaded APK for project {project_id}")
-    return send_file(
-        apk_path,
+@app.route('/artifacts/<path:key>')
+@handle_errors
+def serve_artifact(key):
+    """Serve a locally stored artifact through a signed, expiring URL"""
+    if not isinstance(artifact_storage, LocalArtifactStorage):
+        abort(404)
+
+    filename = request.args.get('filename')
+    if not artifact_storage.verify(key, request.args.get('expires'), request.args.get('sig'), filename):
+        return jsonify({'success': False, 'error': 'Bağlantının süresi doldu'}), 403
+    if not artifact_storage.exists(key):
+        abort(404)
+
+    response = send_file(
+        artifact_storage.path_for(key),
         as_attachment=True,
-        download_name=f"{safe_filename}.apk",
-        mimetype='application/vnd.android.package-archive'
+        download_name=filename or os.path.basename(key)
     )
+    manifest_hash = artifact_storage.get_metadata(key).get('manifest-hash')
+    if manifest_hash:
+        response.headers['X-Manifest-Hash'] = manifest_hash
+    return response
+
+def encode_page_cursor(project):
+    raw = json.dumps([project.created_at.isoformat(), project.id]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+def decode_page_cursor(cursor):
+    """(created_at, id) of the last row on the previous page"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+    created_at, project_id = json.loads(raw)[:2]
+    return datetime.fromisoformat(created_at), str(project_id)
 
 @app.route('/projects')
+@jwt_required(optional=True)
 @handle_errors
 def list_projects():
-    """List all user projects"""
-    projects = []
-    for project_id, status in project_status.items():
-        if status.get('status') == 'completed':
-            projects.append({
-                'id': project_id,
-                'name': status.get('result', {}).get('appName', 'Unnamed'),
-                'created_at': status.get('created_at'),
-                'language': status.get('language'),
-                'category': status.get('category')
-            })
-    
-    return jsonify(projects)
+    """Projects newest first, paginated with ?cursor= keyset cursors
+
+    Signed-in users see their own projects (idx_project_user), optionally
+    filtered with ?status=; anonymous callers get the public completed
+    catalog (idx_project_status). Totals are only counted for the first page.
+    """
+    limit = min(max(request.args.get('limit', config.PROJECTS_PAGE_SIZE, type=int), 1), config.PROJECTS_MAX_PAGE_SIZE)
+    user_id = get_jwt_identity()
+    status = request.args.get('status')
+
+    query = get_db().query(Project)
+    if user_id:
+        query = query.filter(Project.user_id == user_id)
+        if status:
+            query = query.filter(Project.status == status)
+    else:
+        query = query.filter(Project.status == 'completed', Project.is_public == True)
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            after_created, after_id = decode_page_cursor(cursor)
+        except (ValueError, TypeError):
+            return jsonify({'success': False, 'error': 'Geçersiz sayfa imleci'}), 400
+
+    page_query = query
+    if cursor:
+        page_query = page_query.filter(or_(
+            Project.created_at < after_created,
+            and_(Project.created_at == after_created, Project.id < after_id)
+        ))
+    rows = page_query.order_by(Project.created_at.desc(), Project.id.desc()).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    response = jsonify([project.to_dict() for project in rows])
+    if not cursor:
+        total = query.with_entities(func.count(Project.id)).scalar()
+        response.headers['X-Total-Count'] = str(total)
+        response.headers['X-Page-Count'] = str(-(-total // limit))
+    if has_more:
+        next_cursor = encode_page_cursor(rows[-1])
+        args = request.args.to_dict()
+        args.update(cursor=next_cursor, limit=limit)
+        response.headers['X-Next-Cursor'] = next_cursor
+        response.headers['Link'] = f'<{url_for("list_projects", **args)}>; rel="next"'
+    return response
+
+@app.route('/projects/<project_id>')
+@jwt_required(optional=True)
+@handle_errors
+def get_project(project_id):
+    """Project detail with features, activities and dependencies (four queries in total)"""
+    project = get_project_with_components(get_db(), project_id)
+    user_id = get_jwt_identity()
+    if not project or (project.user_id and not project.is_public and str(project.user_id) != str(user_id)):
+        return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
+
+    return jsonify(project.to_dict(include_components=True))
+
+@app.route('/projects/<project_id>/analytics')
+@jwt_required(optional=True)
+@handle_errors
+def get_project_events(project_id):
+    """Generation events of a project, read from the monthly partitions around its creation"""
+    project = get_project_by_id(get_db(), project_id)
+    user_id = get_jwt_identity()
+    if not project or (project.user_id and not project.is_public and str(project.user_id) != str(user_id)):
+        return jsonify({'success': False, 'error': 'Proje bulunamadı'}), 404
+
+    # The job starts just before the Project row is written
+    start = project.created_at - timedelta(hours=1) if project.created_at else None
+    with engine.connect() as conn:
+        events = analytics_partitions.query(conn, start, project_id=project_id)
+    return jsonify([
+        {
+            'event_type': event['event_type'],
+            'event_data': event['event_data'],
+            'timestamp': event['timestamp'].isoformat() if event['timestamp'] else None,
+            'duration': event['duration']
+        }
+        for event in events
+    ])
+
+ANALYTICS_WINDOWS = {'1h': 3600, '24h': 86400, '7d': 7 * 86400, '30d': 30 * 86400, 'all': None}
 
 @app.route('/analytics')
 @handle_errors
 def get_analytics():
-    """Get system analytics"""
-    total_projects = len(project_status)
-    completed = sum(1 for s in project_status.values() if s.get('status') == 'completed')
-    failed = sum(1 for s in project_status.values() if s.get('status') == 'error')
-    
-    avg_generation_time = 0
-    if completed > 0:
-        times = [s.get('generation_time', 0) for s in project_status.values() 
-                if s.get('status') == 'completed' and s.get('generation_time')]
-        avg_generation_time = sum(times) / len(times) if times else 0
-    
+    """System analytics from the rollup rows, ?window=1h|24h|7d|30d|all and optional ?category= / ?architecture="""
+    window = request.args.get('window', 'all')
+    if window not in ANALYTICS_WINDOWS:
+        return jsonify({'success': False, 'error': 'Geçersiz zaman aralığı'}), 400
+
+    analytics = generation_analytics.query(
+        get_db(),
+        ANALYTICS_WINDOWS[window],
+        category=request.args.get('category'),
+        architecture=request.args.get('architecture')
+    )
+    analytics['window'] = window
+    analytics['in_progress'] = job_store.active_count()
+    return jsonify(analytics)
+
+METRIC_SERIES_ARGS = {'name', 'type', 'window', 'step'}
+
+@app.route('/analytics/metrics')
+@handle_errors
+def get_metric_series():
+    """Metric series for dashboards, read from the rollup tier that fits ?window= and ?step=
+
+    Other query arguments filter on labels, e.g. ?name=response_time&endpoint=generate_app
+    """
+    name = request.args.get('name')
+    window = request.args.get('window', '24h')
+    if not name:
+        return jsonify({'success': False, 'error': 'Metrik adı gerekli'}), 400
+    if window not in ANALYTICS_WINDOWS or ANALYTICS_WINDOWS[window] is None:
+        return jsonify({'success': False, 'error': 'Geçersiz zaman aralığı'}), 400
+
+    labels = {k: v for k, v in request.args.items() if k not in METRIC_SERIES_ARGS}
+    series = metrics_retention.query(
+        get_db(),
+        name,
+        datetime.utcnow() - timedelta(seconds=ANALYTICS_WINDOWS[window]),
+        step=request.args.get('step', type=int),
+        metric_type=request.args.get('type'),
+        labels=labels
+    )
+    series['window'] = window
+    return jsonify(series)
+
+@app.route('/debug/sql')
+@jwt_required()
+@admin_required
+@handle_errors
+def debug_sql():
+    """Recent per-request SQL profiles, ?repeated=1 keeps only requests with N+1 patterns"""
+    if not config.SQL_PROFILER_ENABLED:
+        return jsonify({'error': 'Endpoint bulunamadı'}), 404
+
+    profiles = list(sql_profiler.history)
+    if request.args.get('repeated', type=int):
+        profiles = [p for p in profiles if p['repeated']]
+    limit = request.args.get('limit', 50, type=int)
     return jsonify({
-        'total_projects': total_projects,
-        'completed': completed,
-        'failed': failed,
-        'in_progress': len(active_generations),
-        'success_rate': (completed / total_projects * 100) if total_projects > 0 else 0,
-        'avg_generation_time': round(avg_generation_time, 2)
+        'slow_threshold_ms': sql_profiler.slow_threshold * 1000,
+        'repeat_threshold': sql_profiler.repeat_threshold,
+        'profiles': profiles[::-1][:limit]
     })
 
 # Helper functions
+@contextmanager
+def checkout_project(project_id):
+    """A project's directory, restored from cold storage if needed and kept from archival for the block"""
+    with project_storage.checkout(project_id) as project_path:
+        # Fallback to project_id if the project is not indexed
+        yield project_path or os.path.join(config.PROJECT_STORAGE_PATH, project_id)
+
+def download_filename(project_id):
+    """Sanitized app name used for download filenames"""
+    app_name = get_project_app_name(project_id)
+    safe_filename = ''.join(c for c in app_name if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return safe_filename or "App"
+
+def artifact_redirect(key, filename, project_id):
+    """Redirect to a short-lived artifact URL
+
+    The artifact response carries the manifest hash too (X-Manifest-Hash
+    locally, x-amz-meta-manifest-hash from S3), since clients following the
+    redirect do not see headers on the 302.
+    """
+    response = redirect(artifact_storage.url_for(key, filename, config.ARTIFACT_URL_EXPIRES_SECONDS))
+    manifest = project_storage.get_manifest(project_id)
+    if manifest:
+        response.headers['X-Manifest-Hash'] = manifest[0]
+    logger.info(f"Redirected download of {key}")
+    return response
+
+def build_project_zip(project_path, zip_path):
+    """Write the downloadable project files into a ZIP archive"""
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
+        for arc_name, file_path in iter_project_files(project_path):
+            zipf.write(file_path, arc_name)
+
+def published_artifact(key, cache_name):
+    """Whether a download can redirect to a published artifact
+
+    Only remote storage is used; with local storage downloads are served
+    from the project directory (and its cold tier) instead.
+    """
+    if not artifact_storage.remote:
+        return False
+    cached = artifact_storage.exists(key)
+    record_cache_lookup(cache_name, cached)
+    return cached
+
+def publish_artifacts(project_id, project_path, apk_path=None):
+    """Upload the project ZIP and APK to remote artifact storage, tagged with the project's manifest hash"""
+    if not artifact_storage.remote:
+        return
+    manifest = project_storage.get_manifest(project_id)
+    metadata = {'manifest-hash': manifest[0]} if manifest else None
+    try:
+        if get_directory_size(project_path) / (1024 * 1024) <= config.MAX_PROJECT_SIZE_MB:
+            fd, zip_path = tempfile.mkstemp(suffix='.zip')
+            os.close(fd)
+            try:
+                build_project_zip(project_path, zip_path)
+                artifact_storage.put_file(project_zip_key(project_id), zip_path, 'application/zip', metadata)
+            finally:
+                os.remove(zip_path)
+
+        if apk_path and os.path.exists(apk_path):
+            artifact_storage.put_file(
+                project_apk_key(project_id), apk_path, 'application/vnd.android.package-archive', metadata
+            )
+    except Exception as e:
+        # Downloads fall back to serving from the local project directory
+        logger.error(f"Failed to publish artifacts for {project_id}: {e}")
+
+def send_webhook(project_id, event, data):
+    """Queue a signed callback if the project was created with a callbackUrl"""
+    status = job_store.get(project_id) or {}
+    callback_url = status.get('callback_url')
+    if not callback_url:
+        return
+    if not webhook_dispatcher.enabled:
+        logger.warning(f"Skipping {event} webhook for {project_id}: WEBHOOK_SECRET is not set")
+        return
+    try:
+        webhook_dispatcher.enqueue(callback_url, event, dict(data, projectId=project_id))
+    except Exception as e:
+        logger.error(f"Failed to queue {event} webhook for {project_id}: {e}")
+
+def get_project_app_name(project_id):
+    """App name from the job store, falling back to the storage index"""
+    status = job_store.get(project_id)
+    if status is not None:
+        return status.get('result', {}).get('appName', 'App')
+    meta = project_storage.read_meta(project_id) or {}
+    return meta.get('metadata', {}).get('app_name', 'App')
+
 def get_directory_size(path):
     """Calculate directory size in bytes"""
     total = 0
@@ -1000,8 +1632,10 @@ def count_files(path):
 
 def build_apk(project_path):
     """Build APK for the generated project"""
+    import subprocess
+    build_start = time.perf_counter()
+    outcome = 'failure'
     try:
-        import subprocess
         gradlew = os.path.join(project_path, 'gradlew.bat')
         if os.path.exists(gradlew):
             logger.info(f"Starting APK build for {project_path}")
@@ -1018,6 +1652,7 @@ def build_apk(project_path):
                 apk_path = os.path.join(project_path, 'app', 'build', 'outputs', 'apk', 'debug', 'app-debug.apk')
                 if os.path.exists(apk_path):
                     logger.info(f"APK file created: {apk_path}")
+                    outcome = 'success'
                     return True
                 else:
                     logger.warning(f"APK file not found at {apk_path}")
@@ -1029,38 +1664,36 @@ def build_apk(project_path):
         return False
     except subprocess.TimeoutExpired:
         logger.error(f"APK build timeout for {project_path}")
+        outcome = 'timeout'
         return False
     except Exception as e:
         logger.error(f"Error building APK: {e}")
         return False
+    finally:
+        BUILD_DURATION.labels(result=outcome).observe(time.perf_counter() - build_start)
 
 # Cleanup old projects periodically
-def cleanup_old_projects():
-    """Clean up projects older than configured hours"""
-    while True:
+def forget_project(project_id):
+    """Drop job state and published artifacts for a project removed from storage"""
+    job_store.delete(project_id)
+
+    for key in (project_zip_key(project_id), project_apk_key(project_id)):
         try:
-            current_time = datetime.now()
-            for project_id in list(project_status.keys()):
-                status = project_status[project_id]
-                created_at = datetime.fromisoformat(status.get('created_at', ''))
-                
-                if (current_time - created_at).total_seconds() > config.TEMP_STORAGE_HOURS * 3600:
-                    # Remove from memory
-                    del project_status[project_id]
-                    if project_id in project_analytics:
-                        del project_analytics[project_id]
-                    
-                    # Remove files
-                    project_path = os.path.join(config.PROJECT_STORAGE_PATH, project_id)
-                    if os.path.exists(project_path):
-                        import shutil
-                        shutil.rmtree(project_path)
-                        logger.info(f"Cleaned up old project {project_id}")
-            
-            time.sleep(3600)  # Check every hour
+            artifact_storage.delete(key)
         except Exception as e:
-            logger.error(f"Error in cleanup: {e}")
-            time.sleep(3600)
+            logger.error(f"Failed to delete artifact {key}: {e}")
+
+def cleanup_old_projects():
+    """Clean up projects older than configured hours"""
+    try:
+        project_storage.load_index()
+    except Exception as e:
+        logger.error(f"Error loading expiry index: {e}")
+
+    project_storage.run_sweeper(
+        on_expired=forget_project,
+        max_interval=config.CLEANUP_INTERVAL_SECONDS
+    )
 
 # Start cleanup thread
 cleanup_thread = threading.Thread(target=cleanup_old_projects, daemon=True)
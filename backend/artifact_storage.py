@@ -0,0 +1,220 @@
+"""
+Artifact Storage Module
+Pluggable storage for downloadable artifacts (project ZIPs, APKs) with local-disk
+and S3-compatible object store backends
+"""
+
+import os
+import hmac
+import json
+import shutil
+import hashlib
+import time
+import logging
+from abc import ABC, abstractmethod
+from typing import Optional, Dict
+from urllib.parse import quote, urlencode
+
+try:
+    import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config as BotoConfig
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+def project_zip_key(project_id: str) -> str:
+    return f"projects/{project_id}.zip"
+
+def project_apk_key(project_id: str) -> str:
+    return f"apks/{project_id}/app-debug.apk"
+
+class ArtifactStorage(ABC):
+    """Storage interface for artifacts shared between API nodes"""
+
+    # Whether artifacts live outside the project directories; local copies would only duplicate them
+    remote = False
+
+    @abstractmethod
+    def put_file(self, key: str, path: str, content_type: str = None, metadata: Dict[str, str] = None) -> None:
+        """Upload a local file under key; metadata is returned as headers when the artifact is fetched"""
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """Check whether key is stored"""
+
+    @abstractmethod
+    def get_file(self, key: str, dest_path: str) -> bool:
+        """Download key to dest_path, returns False if missing"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Delete key if present"""
+
+    @abstractmethod
+    def url_for(self, key: str, filename: str = None, expires_in: int = 300) -> str:
+        """Short-lived download URL for key"""
+
+class LocalArtifactStorage(ArtifactStorage):
+    """Artifacts on local disk, served through HMAC-signed expiring URLs"""
+
+    def __init__(self, root: str, secret_key: str, url_prefix: str = '/artifacts'):
+        self.root = root
+        self.secret_key = secret_key.encode('utf-8') if isinstance(secret_key, str) else secret_key
+        self.url_prefix = url_prefix.rstrip('/')
+
+    def path_for(self, key: str) -> str:
+        """Filesystem path of key, rejecting keys that escape the root"""
+        root = os.path.realpath(self.root)
+        path = os.path.realpath(os.path.join(root, *key.split('/')))
+        if not path.startswith(root + os.sep):
+            raise ValueError(f"Invalid artifact key: {key}")
+        return path
+
+    def put_file(self, key: str, path: str, content_type: str = None, metadata: Dict[str, str] = None) -> None:
+        dest = self.path_for(key)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        tmp_path = f"{dest}.tmp"
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, dest)
+        meta_path = f"{dest}.meta.json"
+        if metadata:
+            with open(f"{meta_path}.tmp", 'w', encoding='utf-8') as f:
+                json.dump(metadata, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+        elif os.path.exists(meta_path):
+            os.remove(meta_path)
+
+    def get_metadata(self, key: str) -> Dict[str, str]:
+        """Metadata stored with put_file, empty if none"""
+        try:
+            with open(f"{self.path_for(key)}.meta.json", encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def exists(self, key: str) -> bool:
+        return os.path.isfile(self.path_for(key))
+
+    def get_file(self, key: str, dest_path: str) -> bool:
+        if not self.exists(key):
+            return False
+        shutil.copyfile(self.path_for(key), dest_path)
+        return True
+
+    def delete(self, key: str) -> None:
+        for path in (self.path_for(key), f"{self.path_for(key)}.meta.json"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def _signature(self, key: str, expires: int, filename: str) -> str:
+        message = f"{key}:{expires}:{filename}".encode('utf-8')
+        return hmac.new(self.secret_key, message, hashlib.sha256).hexdigest()
+
+    def url_for(self, key: str, filename: str = None, expires_in: int = 300) -> str:
+        expires = int(time.time()) + expires_in
+        params = {'expires': expires, 'sig': self._signature(key, expires, filename or '')}
+        if filename:
+            params['filename'] = filename
+        return f"{self.url_prefix}/{quote(key)}?{urlencode(params)}"
+
+    def verify(self, key: str, expires: str, signature: str, filename: str = None) -> bool:
+        """Validate a signed URL produced by url_for"""
+        try:
+            expires = int(expires)
+        except (TypeError, ValueError):
+            return False
+        if expires < time.time():
+            return False
+        expected = self._signature(key, expires, filename or '')
+        return hmac.compare_digest(expected, signature or '')
+
+class S3ArtifactStorage(ArtifactStorage):
+    """S3-compatible object store (AWS S3, MinIO) with parallel multipart uploads"""
+
+    remote = True
+
+    def __init__(self, bucket: str, endpoint_url: str = None, region: str = None,
+                 access_key_id: str = None, secret_access_key: str = None,
+                 multipart_threshold_mb: int = 8, multipart_chunk_mb: int = 8,
+                 max_concurrency: int = 4):
+        if boto3 is None:
+            raise ImportError("boto3 is required for the S3 artifact storage backend")
+
+        self.bucket = bucket
+        self.client = boto3.client(
+            's3',
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            # Path-style addressing keeps MinIO and other stand-ins working
+            config=BotoConfig(signature_version='s3v4', s3={'addressing_style': 'path'})
+        )
+        self.transfer_config = TransferConfig(
+            multipart_threshold=multipart_threshold_mb * 1024 * 1024,
+            multipart_chunksize=multipart_chunk_mb * 1024 * 1024,
+            max_concurrency=max_concurrency,
+            use_threads=True
+        )
+
+    def put_file(self, key: str, path: str, content_type: str = None, metadata: Dict[str, str] = None) -> None:
+        # S3 returns metadata on GET as x-amz-meta-<name> headers
+        extra_args = {}
+        if content_type:
+            extra_args['ContentType'] = content_type
+        if metadata:
+            extra_args['Metadata'] = metadata
+        self.client.upload_file(path, self.bucket, key, ExtraArgs=extra_args or None, Config=self.transfer_config)
+
+    def exists(self, key: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def get_file(self, key: str, dest_path: str) -> bool:
+        try:
+            self.client.download_file(self.bucket, key, dest_path, Config=self.transfer_config)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def url_for(self, key: str, filename: str = None, expires_in: int = 300) -> str:
+        params = {'Bucket': self.bucket, 'Key': key}
+        if filename:
+            params['ResponseContentDisposition'] = f'attachment; filename="{filename}"'
+        return self.client.generate_presigned_url('get_object', Params=params, ExpiresIn=expires_in)
+
+def create_artifact_storage(config) -> ArtifactStorage:
+    """Build the artifact storage backend selected in configuration"""
+    backend = (config.ARTIFACT_STORAGE_BACKEND or 'local').lower()
+
+    if backend == 's3':
+        logger.info(f"Using S3 artifact storage (bucket {config.S3_BUCKET})")
+        return S3ArtifactStorage(
+            bucket=config.S3_BUCKET,
+            endpoint_url=config.S3_ENDPOINT_URL,
+            region=config.S3_REGION,
+            access_key_id=config.S3_ACCESS_KEY_ID,
+            secret_access_key=config.S3_SECRET_ACCESS_KEY,
+            multipart_threshold_mb=config.S3_MULTIPART_THRESHOLD_MB,
+            multipart_chunk_mb=config.S3_MULTIPART_CHUNK_MB,
+            max_concurrency=config.S3_UPLOAD_CONCURRENCY
+        )
+
+    if backend != 'local':
+        logger.warning(f"Unknown artifact storage backend '{backend}', using local disk")
+    return LocalArtifactStorage(config.ARTIFACT_STORAGE_PATH, config.SECRET_KEY)
@@ -0,0 +1,190 @@
+"""
+Audit Writer Module
+Write-behind pipeline for AuditLog rows: a bounded in-memory queue drained by a
+background thread with bulk inserts, spilling to disk when the database lags
+"""
+
+import os
+import json
+import queue
+import atexit
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import insert
+
+from models import AuditLog
+
+logger = logging.getLogger(__name__)
+
+class AuditWriter:
+    """Batches audit events into executemany inserts
+
+    record() never touches the database. When the queue is full, or a batch
+    cannot be written, events are appended to a JSON-lines spill file, which
+    is replayed once writes succeed again. Pending events are flushed at exit.
+    """
+
+    def __init__(self, engine=None, spill_path: str = None, max_queue: int = 10000,
+                 batch_size: int = 500, flush_interval: float = 1.0, put_timeout: float = 0.05):
+        self.engine = engine
+        self.spill_path = spill_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.put_timeout = put_timeout
+        self.partitions = None  # MonthlyPartitions to route rows into, else the audit_logs table
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.spilled = 0
+        self._spill_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, engine=None, spill_path: str = None) -> None:
+        """Start the background writer"""
+        if engine is not None:
+            self.engine = engine
+        if spill_path is not None:
+            self.spill_path = spill_path
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, action: str, user_id: int = None, resource_type: str = None,
+               resource_id: str = None, details: Dict[str, Any] = None, ip_address: str = None,
+               user_agent: str = None, success: bool = True) -> None:
+        """Queue an audit event"""
+        event = {
+            'user_id': user_id,
+            'action': action,
+            'resource_type': resource_type,
+            'resource_id': resource_id,
+            'details': details,
+            'ip_address': ip_address,
+            'user_agent': user_agent,
+            'timestamp': datetime.utcnow(),
+            'success': success
+        }
+        if self._thread is None:
+            self._write([event])  # Not started yet, stay synchronous
+            return
+        try:
+            # Brief backpressure before giving up on memory and spilling to disk
+            self.queue.put(event, timeout=self.put_timeout)
+        except queue.Full:
+            self._spill([event])
+
+    def _insert(self, conn, batch: List[Dict[str, Any]]) -> None:
+        if self.partitions is not None:
+            self.partitions.insert(conn, batch)
+        else:
+            conn.execute(insert(AuditLog), batch)
+
+    def _drain(self, first: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        batch = [first] if first is not None else []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch: List[Dict[str, Any]]) -> bool:
+        """Insert a batch in one transaction; spills it on failure"""
+        if not batch:
+            return True
+        if self.engine is None:
+            self._spill(batch)
+            return False
+        try:
+            with self.engine.begin() as conn:
+                self._insert(conn, batch)
+            return True
+        except Exception as e:
+            logger.error(f"Failed to write {len(batch)} audit events: {str(e)}")
+            self._spill(batch)
+            return False
+
+    def _spill(self, batch: List[Dict[str, Any]]) -> None:
+        if not self.spill_path:
+            logger.error(f"Dropping {len(batch)} audit events, no spill file configured")
+            return
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_path) or '.', exist_ok=True)
+            with open(self.spill_path, 'a', encoding='utf-8') as f:
+                for event in batch:
+                    f.write(json.dumps(event, default=str) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self.spilled += len(batch)
+
+    def _replay_spill(self) -> None:
+        """Re-insert spilled events once the database accepts writes"""
+        if not self.spill_path:
+            return
+        replay_path = f"{self.spill_path}.replay"
+        with self._spill_lock:
+            # A leftover replay file from a failed attempt goes first
+            if not os.path.exists(replay_path):
+                if not os.path.exists(self.spill_path):
+                    return
+                os.replace(self.spill_path, replay_path)
+
+        with open(replay_path, encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        for event in events:
+            if event.get('timestamp'):
+                event['timestamp'] = datetime.fromisoformat(event['timestamp'])
+
+        for i in range(0, len(events), self.batch_size):
+            batch = events[i:i + self.batch_size]
+            try:
+                with self.engine.begin() as conn:
+                    self._insert(conn, batch)
+            except Exception as e:
+                logger.error(f"Audit spill replay failed, will retry: {str(e)}")
+                # Keep what is left for the next attempt
+                with open(replay_path, 'w', encoding='utf-8') as f:
+                    for event in events[i:]:
+                        f.write(json.dumps(event, default=str) + '\n')
+                return
+        os.remove(replay_path)
+        logger.info(f"Replayed {len(events)} spilled audit events")
+
+    def flush(self) -> None:
+        """Write everything currently queued"""
+        with self._flush_lock:
+            healthy = True
+            while True:
+                batch = self._drain()
+                if not batch:
+                    break
+                # Failed batches are spilled, so keep draining either way
+                healthy = self._write(batch) and healthy
+            if healthy and self.engine is not None:
+                self._replay_spill()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                first = self.queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                first = None
+            try:
+                with self._flush_lock:
+                    if self._write(self._drain(first)) and self.engine is not None:
+                        self._replay_spill()
+            except Exception as e:
+                logger.error(f"Audit writer error: {str(e)}")
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self.flush()
+
+# Global instance
+audit_writer = AuditWriter()
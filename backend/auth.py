@@ -16,6 +16,7 @@ from flask_jwt_extended import (
 )
 from sqlalchemy.orm import Session
 from models import User, UserSession, AuditLog
+from audit_writer import audit_writer
 import logging
 
 logger = logging.getLogger(__name__)
@@ -244,7 +245,7 @@ class AuthManager:
                         resource_id: str, details: Dict[str, Any]) -> None:
         """Log audit event"""
         try:
-            audit_log = AuditLog(
+            audit_writer.record(
                 user_id=user_id,
                 action=action,
                 resource_type=resource_type,
@@ -253,8 +254,6 @@ class AuthManager:
                 ip_address=request.remote_addr,
                 user_agent=request.headers.get('User-Agent')
             )
-            self.db_session.add(audit_log)
-            self.db_session.commit()
         except Exception as e:
             logger.error(f"Failed to log audit event: {str(e)}")
 
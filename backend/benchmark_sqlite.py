@@ -0,0 +1,126 @@
+"""
+SQLite Concurrency Benchmark
+Runs a mixed read/write workload from many threads against the old engine setup
+(QueuePool 10/20, default pragmas) and the SQLite profile from database.py
+
+    python benchmark_sqlite.py --threads 32 --seconds 10 --write-ratio 0.3 --read-write-ratio 0.2
+
+Read-then-write transactions (SELECT, then INSERT in the same transaction)
+cover sessions that look something up before writing.
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+from typing import Dict, Any, List
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import QueuePool
+
+from database import create_sqlite_engine
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS bench_events (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        project_id TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        created_at REAL NOT NULL
+    )
+'''
+
+def build_engine(profile: str, url: str):
+    if profile == 'legacy':
+        return create_engine(url, poolclass=QueuePool, pool_size=10, max_overflow=20,
+                             connect_args={'check_same_thread': False})
+    return create_sqlite_engine(url)
+
+def worker(engine, deadline: float, write_ratio: float, read_write_ratio: float,
+           stats: Dict[str, Any], lock: threading.Lock) -> None:
+    latencies: List[float] = []
+    errors = 0
+    while time.perf_counter() < deadline:
+        project_id = f"project-{random.randrange(200)}"
+        start = time.perf_counter()
+        roll = random.random()
+        try:
+            if roll < read_write_ratio:
+                with engine.begin() as conn:
+                    latest = conn.execute(
+                        text('SELECT MAX(id) FROM bench_events WHERE project_id = :p'), {'p': project_id}
+                    ).scalar()
+                    conn.execute(
+                        text('INSERT INTO bench_events (project_id, payload, created_at) VALUES (:p, :d, :t)'),
+                        {'p': project_id, 'd': str(latest), 't': time.time()}
+                    )
+            elif roll < read_write_ratio + write_ratio:
+                with engine.begin() as conn:
+                    conn.execute(
+                        text('INSERT INTO bench_events (project_id, payload, created_at) VALUES (:p, :d, :t)'),
+                        {'p': project_id, 'd': 'x' * 256, 't': time.time()}
+                    )
+            else:
+                with engine.connect() as conn:
+                    conn.execute(
+                        text('SELECT id, payload FROM bench_events WHERE project_id = :p ORDER BY id DESC LIMIT 20'),
+                        {'p': project_id}
+                    ).fetchall()
+            latencies.append(time.perf_counter() - start)
+        except (OperationalError, TimeoutError):
+            errors += 1
+    with lock:
+        stats['latencies'].extend(latencies)
+        stats['errors'] += errors
+
+def run(profile: str, threads: int, seconds: float, write_ratio: float, read_write_ratio: float) -> Dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix='codecraft-bench-')
+    engine = build_engine(profile, f"sqlite:///{os.path.join(directory, 'bench.db')}")
+    with engine.begin() as conn:
+        conn.execute(text(SCHEMA))
+        conn.execute(text('CREATE INDEX IF NOT EXISTS idx_bench_project ON bench_events (project_id, id)'))
+
+    stats = {'latencies': [], 'errors': 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    pool = [
+        threading.Thread(target=worker, args=(engine, deadline, write_ratio, read_write_ratio, stats, lock))
+        for _ in range(threads)
+    ]
+    for t in pool:
+        t.start()
+    for t in pool:
+        t.join()
+    engine.dispose()
+
+    latencies = sorted(stats['latencies'])
+    quantile = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)] * 1000 if latencies else 0.0
+    return {
+        'profile': profile,
+        'ops_per_sec': len(latencies) / seconds,
+        'p50_ms': quantile(0.50),
+        'p95_ms': quantile(0.95),
+        'p99_ms': quantile(0.99),
+        'errors': stats['errors']
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='SQLite engine profile benchmark')
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--write-ratio', type=float, default=0.3)
+    parser.add_argument('--read-write-ratio', type=float, default=0.2)
+    args = parser.parse_args()
+
+    print(f"{args.threads} threads, {args.seconds:g}s, {args.write_ratio:.0%} writes, "
+          f"{args.read_write_ratio:.0%} read-then-write")
+    print(f"{'profile':<10}{'ops/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for profile in ('legacy', 'sqlite'):
+        r = run(profile, args.threads, args.seconds, args.write_ratio, args.read_write_ratio)
+        print(f"{r['profile']:<10}{r['ops_per_sec']:>10.0f}{r['p50_ms']:>10.2f}"
+              f"{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+
+if __name__ == '__main__':
+    main()
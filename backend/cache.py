@@ -16,6 +16,8 @@ import redis
 import psutil
 import threading
 
+from metrics import record_cache_lookup
+
 logger = logging.getLogger(__name__)
 
 class PerformanceMonitor:
@@ -206,6 +208,7 @@ class CacheManager:
 
                 # Try to get from cache
                 cached_result = self.cache.get(cache_key)
+                record_cache_lookup(key_prefix or f.__name__, cached_result is not None)
                 if cached_result is not None:
                     logger.debug(f"Cache hit for {cache_key}")
                     return cached_result
@@ -344,21 +347,36 @@ class DatabaseOptimizer:
         return query
 
     def get_query_plan(self, query) -> Dict[str, Any]:
-        """Get query execution plan"""
-        # This would analyze the query plan for optimization
-        return {'estimated_cost': 0, 'estimated_rows': 0}
+        """Get query execution plan (EXPLAIN QUERY PLAN on SQLite, EXPLAIN elsewhere)"""
+        from sql_profiler import sql_profiler
+
+        statement = getattr(query, 'statement', query)
+        connection = self.db_session.connection()
+        plan = sql_profiler.explain(connection, statement)
+        return {
+            'dialect': connection.dialect.name,
+            'plan': plan,
+            'full_scan': any('SCAN' in str(step) and 'USING' not in str(step) for step in plan)
+        }
 
     def create_indexes_if_needed(self):
         """Create performance indexes if they don't exist"""
         # Analyze query patterns and create indexes
         logger.info("Database indexes optimized")
 
-    def cleanup_old_data(self, days: int = 30):
-        """Clean up old data to maintain performance"""
-        cutoff_date = datetime.utcnow() - timedelta(days=days)
+    def cleanup_old_data(self, days: int = 30) -> Dict[str, int]:
+        """Clean up old data to maintain performance
+
+        Raw metrics older than days are rolled up before they are deleted;
+        rollup tiers keep their own retention.
+        """
+        from models import cleanup_expired_sessions
+        from metrics_retention import metrics_retention
 
-        # This would delete old logs, sessions, etc.
-        logger.info(f"Cleaned up data older than {days} days")
+        deleted = metrics_retention.run_once(self.db_session, raw_retention=timedelta(days=days))
+        deleted['sessions'] = cleanup_expired_sessions(self.db_session)
+        logger.info(f"Cleaned up data older than {days} days: {deleted}")
+        return deleted
 
 # Global instances
 performance_monitor = PerformanceMonitor()
@@ -46,6 +46,13 @@ class Config:
         'echo': DEBUG
     }
 
+    # SQLite engine profile (used when the database URL is sqlite)
+    SQLITE_POOL_SIZE = settings.get('SQLITE_POOL_SIZE', 5)  # Readers run concurrently under WAL
+    SQLITE_BUSY_TIMEOUT_MS = settings.get('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_MMAP_SIZE = settings.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)  # bytes
+    SQLITE_CACHE_SIZE_KB = settings.get('SQLITE_CACHE_SIZE_KB', 64 * 1024)  # Page cache per connection
+    SQLITE_SERIALIZE_WRITES = settings.get('SQLITE_SERIALIZE_WRITES', True)  # FIFO write queue per process
+
     # Redis Configuration
     REDIS_URL = settings.get('REDIS_URL', 'redis://localhost:6379/0')
     CACHE_TYPE = 'RedisCache' if REDIS_URL != 'redis://localhost:6379/0' else 'SimpleCache'
@@ -75,6 +82,37 @@ class Config:
     PROJECT_STORAGE_PATH = settings.get('PROJECT_STORAGE_PATH', os.path.join(os.path.dirname(__file__), '..', 'generated_apps'))
     TEMP_STORAGE_HOURS = settings.get('TEMP_STORAGE_HOURS', 24)
     MAX_PROJECT_SIZE_MB = settings.get('MAX_PROJECT_SIZE_MB', 100)
+    CLEANUP_INTERVAL_SECONDS = settings.get('CLEANUP_INTERVAL_SECONDS', 300)  # Upper bound between sweeps
+    COLD_STORAGE_IDLE_HOURS = settings.get('COLD_STORAGE_IDLE_HOURS', 6)  # 0 disables archiving; .tar.zst with zstandard installed, else .tar.xz
+    PROJECTS_PAGE_SIZE = settings.get('PROJECTS_PAGE_SIZE', 20)
+    PROJECTS_MAX_PAGE_SIZE = settings.get('PROJECTS_MAX_PAGE_SIZE', 100)
+
+    # Job State Store (generation status shared between worker processes)
+    JOB_STORE_BACKEND = settings.get('JOB_STORE_BACKEND', 'sqlite' if WORKERS > 1 else 'memory')  # memory, sqlite
+    JOB_STORE_PATH = settings.get('JOB_STORE_PATH', os.path.join(PROJECT_STORAGE_PATH, '.jobs.sqlite3'))
+    JOB_STORE_FLUSH_INTERVAL = settings.get('JOB_STORE_FLUSH_INTERVAL', 0.25)  # Seconds between batched writes
+    JOB_STORE_POLL_INTERVAL = settings.get('JOB_STORE_POLL_INTERVAL', 0.5)  # Waiters re-read other workers' changes this often
+
+    # Webhooks (signed completion callbacks)
+    WEBHOOK_QUEUE_PATH = settings.get('WEBHOOK_QUEUE_PATH', os.path.join(PROJECT_STORAGE_PATH, '.webhooks.sqlite3'))
+    WEBHOOK_SECRET = settings.get('WEBHOOK_SECRET')  # Shared with integrators; callbacks are disabled while unset
+    WEBHOOK_MAX_ATTEMPTS = settings.get('WEBHOOK_MAX_ATTEMPTS', 8)
+    WEBHOOK_TIMEOUT_SECONDS = settings.get('WEBHOOK_TIMEOUT_SECONDS', 10)
+    WEBHOOK_WORKERS = settings.get('WEBHOOK_WORKERS', 2)
+    WEBHOOK_ALLOWED_HOSTS = settings.get('WEBHOOK_ALLOWED_HOSTS', [])  # Exempt from the public-address check, e.g. a local test receiver
+
+    # Artifact Storage (project ZIPs and APKs shared between API nodes)
+    ARTIFACT_STORAGE_BACKEND = settings.get('ARTIFACT_STORAGE_BACKEND', 'local')  # local, s3
+    ARTIFACT_STORAGE_PATH = settings.get('ARTIFACT_STORAGE_PATH', os.path.join(PROJECT_STORAGE_PATH, '.artifacts'))
+    ARTIFACT_URL_EXPIRES_SECONDS = settings.get('ARTIFACT_URL_EXPIRES_SECONDS', 300)
+    S3_BUCKET = settings.get('S3_BUCKET', 'codecraft-artifacts')
+    S3_ENDPOINT_URL = settings.get('S3_ENDPOINT_URL')  # e.g. http://localhost:9000 for MinIO
+    S3_REGION = settings.get('S3_REGION', 'us-east-1')
+    S3_ACCESS_KEY_ID = settings.get('S3_ACCESS_KEY_ID')
+    S3_SECRET_ACCESS_KEY = settings.get('S3_SECRET_ACCESS_KEY')
+    S3_MULTIPART_THRESHOLD_MB = settings.get('S3_MULTIPART_THRESHOLD_MB', 8)
+    S3_MULTIPART_CHUNK_MB = settings.get('S3_MULTIPART_CHUNK_MB', 8)
+    S3_UPLOAD_CONCURRENCY = settings.get('S3_UPLOAD_CONCURRENCY', 4)
 
     # Concurrent Processing
     MAX_CONCURRENT_GENERATIONS = settings.get('MAX_CONCURRENT_GENERATIONS', 5)
@@ -100,8 +138,11 @@ class Config:
     # CORS Configuration
     CORS_ORIGINS = settings.get('CORS_ORIGINS', ['http://localhost:3000', 'http://localhost:5000'])
     CORS_METHODS = ['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS']
-    CORS_ALLOW_HEADERS = ['Content-Type', 'Authorization', 'X-Requested-With']
-    CORS_EXPOSE_HEADERS = ['X-Total-Count', 'X-Page-Count']
+    CORS_ALLOW_HEADERS = ['Content-Type', 'Authorization', 'X-Requested-With', 'If-None-Match']
+    CORS_EXPOSE_HEADERS = [
+        'X-Total-Count', 'X-Page-Count', 'X-Next-Cursor', 'Link', 'X-Manifest-Hash', 'ETag',
+        'X-DB-Query-Count', 'X-DB-Time-Ms', 'X-DB-Pool-Wait-Ms', 'X-DB-Repeated-Queries'
+    ]
     CORS_SUPPORTS_CREDENTIALS = True
 
     # Logging Configuration
@@ -110,13 +151,39 @@ class Config:
     LOG_FILE = settings.get('LOG_FILE', 'app.log')
     LOG_MAX_BYTES = 10 * 1024 * 1024  # 10MB
     LOG_BACKUP_COUNT = 5
+    AUDIT_SPILL_PATH = settings.get('AUDIT_SPILL_PATH', 'audit_spill.jsonl')  # Audit events waiting for the database
+    AUDIT_QUEUE_SIZE = settings.get('AUDIT_QUEUE_SIZE', 10000)
+    AUDIT_FLUSH_INTERVAL = settings.get('AUDIT_FLUSH_INTERVAL', 1.0)
+    PARTITIONING_ENABLED = settings.get('PARTITIONING_ENABLED', True)  # Monthly tables for audit_logs and project_analytics
+    PARTITION_ARCHIVE_PATH = settings.get('PARTITION_ARCHIVE_PATH', 'archive')  # Gzipped JSONL of archived months
+    PARTITION_KEEP_MONTHS = settings.get('PARTITION_KEEP_MONTHS', 12)  # 0 keeps every month in the database
+    PARTITION_MAINTENANCE_INTERVAL = settings.get('PARTITION_MAINTENANCE_INTERVAL', 3600)
 
     # Monitoring
     ENABLE_METRICS = settings.get('ENABLE_METRICS', True)
     METRICS_PORT = settings.get('METRICS_PORT', 9090)
+    ANALYTICS_BUCKET_SECONDS = settings.get('ANALYTICS_BUCKET_SECONDS', 3600)  # Generation rollup granularity
+    ANALYTICS_FLUSH_SECONDS = settings.get('ANALYTICS_FLUSH_SECONDS', 10)
+    REQUEST_METRICS_FLUSH_SECONDS = settings.get('REQUEST_METRICS_FLUSH_SECONDS', 10)
+    METRICS_RAW_RETENTION_HOURS = settings.get('METRICS_RAW_RETENTION_HOURS', 24)  # Then only rollups remain
+    METRICS_MINUTE_RETENTION_DAYS = settings.get('METRICS_MINUTE_RETENTION_DAYS', 7)
+    METRICS_HOUR_RETENTION_DAYS = settings.get('METRICS_HOUR_RETENTION_DAYS', 90)
+    METRICS_DAY_RETENTION_DAYS = settings.get('METRICS_DAY_RETENTION_DAYS', 730)
+    METRICS_RETENTION_INTERVAL = settings.get('METRICS_RETENTION_INTERVAL', 60)  # Seconds between rollup passes
+    METRICS_RETENTION_BATCH_SIZE = settings.get('METRICS_RETENTION_BATCH_SIZE', 5000)  # Rows per delete transaction
 
     # Feature Flags
     ENABLE_REAL_TIME_UPDATES = settings.get('ENABLE_REAL_TIME_UPDATES', True)
+    SSE_KEEPALIVE_SECONDS = settings.get('SSE_KEEPALIVE_SECONDS', 15)
+    SSE_MAX_STREAM_SECONDS = settings.get('SSE_MAX_STREAM_SECONDS', 300)  # Each open stream holds a worker thread; clients reconnect after this
+    SSE_RETRY_MS = settings.get('SSE_RETRY_MS', 2000)  # Reconnect delay sent to EventSource
+    PROGRESS_UPDATE_HZ = settings.get('PROGRESS_UPDATE_HZ', 4)  # Max progress updates per project per second, 0 disables coalescing
+    SQL_PROFILER_ENABLED = settings.get('SQL_PROFILER_ENABLED', DEBUG)  # Per-request SQL stats, headers and /debug/sql
+    SQL_SLOW_QUERY_SECONDS = settings.get('SQL_SLOW_QUERY_SECONDS', 0.1)  # Slower SELECTs get an EXPLAIN plan
+    SQL_REPEAT_THRESHOLD = settings.get('SQL_REPEAT_THRESHOLD', 5)  # Same statement this often in one request flags N+1
+    REALTIME_MESSAGE_QUEUE = settings.get('REALTIME_MESSAGE_QUEUE')  # e.g. redis://localhost:6379/1 to share realtime events between workers
+    REALTIME_CHANNEL = settings.get('REALTIME_CHANNEL', 'codecraft-realtime')
+    LONG_POLL_TIMEOUT_SECONDS = settings.get('LONG_POLL_TIMEOUT_SECONDS', 30)  # Each waiting /status?since= request holds a worker thread this long
     ENABLE_ANALYTICS = settings.get('ENABLE_ANALYTICS', True)
     ENABLE_CACHING = settings.get('ENABLE_CACHING', True)
     ENABLE_BACKGROUND_TASKS = settings.get('ENABLE_BACKGROUND_TASKS', True)
@@ -0,0 +1,200 @@
+"""
+Database Engine Module
+Engine construction per backend; SQLite gets a tuned profile with WAL, pragmas
+set on every connection and in-process write serialisation
+"""
+
+import re
+import time
+import threading
+import logging
+from typing import Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import QueuePool, StaticPool
+
+logger = logging.getLogger(__name__)
+
+WRITE_STATEMENT = re.compile(r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
+class SQLiteWriteQueue:
+    """FIFO lock handing out the single SQLite write slot to one transaction at a time
+
+    Threads wait here in arrival order instead of polling the file lock
+    inside busy_timeout, which is what starves writers under contention.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._next_ticket = 0
+        self._serving = 0
+        self._abandoned = set()
+        self.total_wait = 0.0
+        self.acquisitions = 0
+
+    def acquire(self, timeout: float) -> None:
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            ticket = self._next_ticket
+            self._next_ticket += 1
+            while self._serving != ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._cond.wait(remaining):
+                    if self._serving == ticket:
+                        break
+                    self._abandoned.add(ticket)
+                    raise TimeoutError(f"Timed out after {timeout:.1f}s waiting for the SQLite write queue")
+            self.total_wait += time.monotonic() - start
+            self.acquisitions += 1
+
+    def release(self) -> None:
+        with self._cond:
+            self._serving += 1
+            while self._serving in self._abandoned:
+                self._abandoned.discard(self._serving)
+                self._serving += 1
+            self._cond.notify_all()
+
+    @property
+    def depth(self) -> int:
+        """Transactions holding or waiting for the write slot"""
+        with self._cond:
+            return self._next_ticket - self._serving - len(self._abandoned)
+
+def is_sqlite_url(url: str) -> bool:
+    return make_url(url).get_backend_name() == 'sqlite'
+
+def _install_sqlite_hooks(engine: Engine, busy_timeout_ms: int, mmap_size: int, cache_size_kb: int,
+                          write_queue: Optional[SQLiteWriteQueue]) -> None:
+    """Pragmas on connect and explicit transaction control
+
+    pysqlite's implicit BEGIN is disabled. Reads run in autocommit, as they
+    did under pysqlite's default handling, and the first write of a
+    transaction issues BEGIN IMMEDIATE. Opening a deferred BEGIN on a read
+    would pin a WAL snapshot that cannot be upgraded once another connection
+    commits (SQLITE_BUSY_SNAPSHOT, which busy_timeout does not retry).
+
+    Reads before the first write therefore see no snapshot. Transactions
+    that decide what to write from what they read call begin_write() first,
+    which takes the write lock at the first statement instead:
+    MetricsRetention.roll and NotificationManager.delete_notification.
+    GenerationAnalytics.flush and write_project_record start with their
+    UPDATE and need no opt-in.
+    """
+
+    @event.listens_for(engine, 'connect')
+    def set_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f'PRAGMA busy_timeout={int(busy_timeout_ms)}')
+        cursor.execute(f'PRAGMA mmap_size={int(mmap_size)}')
+        cursor.execute(f'PRAGMA cache_size=-{int(cache_size_kb)}')  # Negative means KiB
+        cursor.execute('PRAGMA temp_store=MEMORY')
+        cursor.close()
+
+    @event.listens_for(engine, 'begin')
+    def defer_begin(conn):
+        conn.info['sqlite_txn'] = 'pending'
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def open_transaction(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get('sqlite_txn') != 'pending':
+            return
+        if not WRITE_STATEMENT.match(statement) and not conn.get_execution_options().get('sqlite_begin_write'):
+            return
+        if write_queue is not None:
+            write_queue.acquire(busy_timeout_ms / 1000)
+            conn.info['sqlite_write_slot'] = True
+        cursor.execute('BEGIN IMMEDIATE')
+        conn.info['sqlite_txn'] = 'write'
+
+    def end_transaction(info, finish):
+        info.pop('sqlite_txn', None)
+        if info.pop('sqlite_write_slot', False):
+            # These events fire before the driver call, so finish the
+            # transaction here and only then hand the slot on; the driver's
+            # own commit/rollback afterwards is a no-op
+            try:
+                finish()
+            finally:
+                write_queue.release()
+
+    @event.listens_for(engine, 'commit')
+    def on_commit(conn):
+        end_transaction(conn.info, conn.connection.dbapi_connection.commit)
+
+    @event.listens_for(engine, 'rollback')
+    def on_rollback(conn):
+        end_transaction(conn.info, conn.connection.dbapi_connection.rollback)
+
+    @event.listens_for(engine.pool, 'reset')
+    def release_on_reset(dbapi_connection, connection_record, reset_state=None):
+        # Connections returned mid-transaction must not keep the write slot
+        end_transaction(connection_record.info, dbapi_connection.rollback)
+
+def begin_write(session) -> None:
+    """Start the session's transaction holding the write lock from its first statement
+
+    Call before any statement of the transaction (again after a commit).
+    Other backends ignore it; their row locks and isolation already apply.
+    """
+    session.connection(execution_options={'sqlite_begin_write': True})
+
+def create_sqlite_engine(url: str, pool_size: int = 5, busy_timeout_ms: int = 5000,
+                         mmap_size: int = 268435456, cache_size_kb: int = 65536,
+                         serialize_writes: bool = True, poolclass=QueuePool, echo: bool = False) -> Engine:
+    """SQLite engine with the production profile
+
+    A file database gets a small pool: WAL serves readers concurrently but
+    there is only ever one writer, so extra connections only add lock
+    contention. In-memory databases share one connection.
+    """
+    database = make_url(url).database
+    if not database or database == ':memory:':
+        engine = create_engine(
+            url, poolclass=StaticPool, connect_args={'check_same_thread': False}, echo=echo
+        )
+    else:
+        engine = create_engine(
+            url,
+            poolclass=poolclass,
+            pool_size=pool_size,
+            max_overflow=0,
+            pool_timeout=max(busy_timeout_ms / 1000, 30),
+            connect_args={'check_same_thread': False, 'timeout': busy_timeout_ms / 1000},
+            echo=echo
+        )
+
+    write_queue = SQLiteWriteQueue() if serialize_writes else None
+    _install_sqlite_hooks(engine, busy_timeout_ms, mmap_size, cache_size_kb, write_queue)
+    engine.sqlite_write_queue = write_queue
+    return engine
+
+def create_database_engine(config, poolclass=QueuePool) -> Engine:
+    """Build the application engine from configuration"""
+    options = config.SQLALCHEMY_ENGINE_OPTIONS
+    if is_sqlite_url(config.SQLALCHEMY_DATABASE_URI):
+        logger.info("Using SQLite engine profile (WAL, serialised writes)")
+        return create_sqlite_engine(
+            config.SQLALCHEMY_DATABASE_URI,
+            pool_size=config.SQLITE_POOL_SIZE,
+            busy_timeout_ms=config.SQLITE_BUSY_TIMEOUT_MS,
+            mmap_size=config.SQLITE_MMAP_SIZE,
+            cache_size_kb=config.SQLITE_CACHE_SIZE_KB,
+            serialize_writes=config.SQLITE_SERIALIZE_WRITES,
+            poolclass=poolclass,
+            echo=options['echo']
+        )
+
+    return create_engine(
+        config.SQLALCHEMY_DATABASE_URI,
+        poolclass=poolclass,
+        pool_size=options['pool_size'],
+        max_overflow=options['max_overflow'],
+        pool_recycle=options['pool_recycle'],
+        echo=options['echo']
+    )
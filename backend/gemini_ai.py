@@ -1,15 +1,41 @@
 """
 Gemini AI Integration - Intelligent Android Code Generation
 """
+import time
 import requests
 import json
 
+from metrics import GEMINI_LATENCY
+
 class GeminiAI:
     
     def __init__(self, api_key):
         self.api_key = api_key
         self.base_url = "https://generativelanguage.googleapis.com/v1beta/models/gemini-pro:generateContent"
     
+    def _post(self, operation, prompt, timeout):
+        """Send a prompt to Gemini, timing the call per operation"""
+        start = time.perf_counter()
+        status = 'error'
+        try:
+            response = requests.post(
+                f"{self.base_url}?key={self.api_key}",
+                headers={"Content-Type": "application/json"},
+                json={
+                    "contents": [{
+                        "parts": [{"text": prompt}]
+                    }]
+                },
+                timeout=timeout
+            )
+            status = str(response.status_code)
+            return response
+        except requests.Timeout:
+            status = 'timeout'
+            raise
+        finally:
+            GEMINI_LATENCY.labels(operation=operation, status=status).observe(time.perf_counter() - start)
+    
     def generate_app_concept(self, idea):
         """Generate detailed app concept from user idea"""
         
@@ -29,16 +55,7 @@ Provide a JSON response with:
 }}"""
         
         try:
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "contents": [{
-                        "parts": [{"text": prompt}]
-                    }]
-                },
-                timeout=30
-            )
+            response = self._post('app_concept', prompt, timeout=30)
             
             if response.status_code == 200:
                 result = response.json()
@@ -69,16 +86,7 @@ Provide 3-5 realistic data items that would appear on this screen. Keep it simpl
 Return as JSON array: ["item 1", "item 2", "item 3"]"""
         
         try:
-            response = requests.post(
-                f"{self.base_url}?key={self.api_key}",
-                headers={"Content-Type": "application/json"},
-                json={
-                    "contents": [{
-                        "parts": [{"text": prompt}]
-                    }]
-                },
-                timeout=20
-            )
+            response = self._post('screen_content', prompt, timeout=20)
             
             if response.status_code == 200:
                 result = response.json()
@@ -0,0 +1,308 @@
+"""
+Generation Analytics Module
+Streaming generation counters and duration histograms, materialised periodically
+into hourly and all-time GenerationRollup rows per category and architecture
+"""
+
+import time
+import atexit
+import bisect
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Callable, Optional
+
+from sqlalchemy import and_, case, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from models import GenerationRollup
+from request_metrics import bucket_quantile
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket catches everything slower
+DURATION_BUCKETS = (5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900, 1200, 1800, float('inf'))
+
+# bucket_start of the all-time rows (bucket_seconds = 0)
+ALL_TIME = datetime(1970, 1, 1)
+
+# Terminal job statuses and the counter each one increments
+OUTCOME_COUNTERS = {'completed': 'completed', 'error': 'failed', 'cancelled': 'cancelled'}
+
+COUNTERS = ('started', 'completed', 'failed', 'cancelled')
+
+RollupKey = Tuple[int, datetime, str, str]
+
+def empty_stats() -> Dict[str, Any]:
+    return {
+        'started': 0, 'completed': 0, 'failed': 0, 'cancelled': 0,
+        'count': 0, 'sum': 0.0, 'min': None, 'max': None,
+        'buckets': [0] * len(DURATION_BUCKETS)
+    }
+
+def merge_stats(into: Dict[str, Any], other: Dict[str, Any]) -> Dict[str, Any]:
+    """Add other into into; counters and histograms are plain sums, so any order works"""
+    for name in COUNTERS:
+        into[name] += other[name]
+    into['count'] += other['count']
+    into['sum'] += other['sum']
+    if other['min'] is not None:
+        into['min'] = other['min'] if into['min'] is None else min(into['min'], other['min'])
+    if other['max'] is not None:
+        into['max'] = other['max'] if into['max'] is None else max(into['max'], other['max'])
+    counts = other['buckets'] or []
+    for i, n in enumerate(counts[:len(into['buckets'])]):
+        into['buckets'][i] += n
+    return into
+
+def summarize(stats: Dict[str, Any]) -> Dict[str, Any]:
+    """API view of merged stats"""
+    finished = stats['completed'] + stats['failed'] + stats['cancelled']
+
+    def quantile(q):
+        if not stats['count']:
+            return 0
+        value = bucket_quantile(DURATION_BUCKETS, stats['buckets'], q)
+        return round(min(max(value, stats['min']), stats['max']), 2)
+
+    return {
+        'total_projects': stats['started'],
+        'completed': stats['completed'],
+        'failed': stats['failed'],
+        'cancelled': stats['cancelled'],
+        'success_rate': round(stats['completed'] / finished * 100, 2) if finished else 0,
+        'avg_generation_time': round(stats['sum'] / stats['count'], 2) if stats['count'] else 0,
+        'p50_generation_time': quantile(0.50),
+        'p95_generation_time': quantile(0.95)
+    }
+
+class GenerationAnalytics:
+    """Generation outcomes aggregated as they happen
+
+    Each event updates an hourly bucket and an all-time bucket per category
+    and architecture in memory. A background thread merges the pending
+    deltas into GenerationRollup rows, so reading any window touches a
+    bounded number of rows regardless of how many projects exist.
+    """
+
+    def __init__(self, session_factory: Callable = None, bucket_seconds: int = 3600,
+                 flush_interval: float = 10):
+        self.session_factory = session_factory
+        self.bucket_seconds = bucket_seconds
+        self.flush_interval = flush_interval
+        self._pending: Dict[RollupKey, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, session_factory: Callable = None) -> None:
+        """Start the background flusher"""
+        if session_factory is not None:
+            self.session_factory = session_factory
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _keys(self, category: str, architecture: str, at: float) -> List[RollupKey]:
+        bucket = datetime.utcfromtimestamp(int(at // self.bucket_seconds) * self.bucket_seconds)
+        category, architecture = category or 'unknown', architecture or 'unknown'
+        return [(self.bucket_seconds, bucket, category, architecture), (0, ALL_TIME, category, architecture)]
+
+    def _apply(self, keys: List[RollupKey], counter: str, duration: Optional[float]) -> None:
+        bucket = bisect.bisect_left(DURATION_BUCKETS, duration) if duration is not None else None
+        with self._lock:
+            for key in keys:
+                stats = self._pending.get(key)
+                if stats is None:
+                    stats = self._pending[key] = empty_stats()
+                stats[counter] += 1
+                if bucket is None:
+                    continue
+                stats['count'] += 1
+                stats['sum'] += duration
+                stats['min'] = duration if stats['min'] is None else min(stats['min'], duration)
+                stats['max'] = duration if stats['max'] is None else max(stats['max'], duration)
+                stats['buckets'][bucket] += 1
+
+    def record_started(self, category: str, architecture: str, at: float = None) -> None:
+        self._apply(self._keys(category, architecture, at or time.time()), 'started', None)
+
+    def record_finished(self, category: str, architecture: str, status: str,
+                        duration: float = None, at: float = None) -> None:
+        """Count a terminal status; the duration feeds the histogram"""
+        counter = OUTCOME_COUNTERS.get(status)
+        if counter is None:
+            return
+        self._apply(self._keys(category, architecture, at or time.time()), counter, duration)
+
+    def _restore(self, pending: Dict[RollupKey, Dict[str, Any]]) -> None:
+        """Put deltas that failed to write back in front of newer ones"""
+        with self._lock:
+            for key, stats in pending.items():
+                current = self._pending.get(key)
+                self._pending[key] = merge_stats(stats, current) if current else stats
+
+    def flush(self) -> int:
+        """Merge pending deltas into rollup rows, returns the number of rows touched"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending or self.session_factory is None:
+            if pending:
+                self._restore(pending)
+            return 0
+
+        session = self.session_factory()
+        try:
+            for key, stats in pending.items():
+                self._merge_row(session, key, stats)
+            session.commit()
+            return len(pending)
+        except IntegrityError as e:
+            # Another worker created one of the rows first; merge into it next time
+            session.rollback()
+            self._restore(pending)
+            logger.debug(f"Generation rollup insert raced another worker, retrying next flush: {str(e)}")
+            return 0
+        except Exception as e:
+            session.rollback()
+            self._restore(pending)
+            logger.error(f"Failed to write generation rollups: {str(e)}")
+            return 0
+        finally:
+            session.close()
+
+    @staticmethod
+    def _merge_row(session, key: RollupKey, stats: Dict[str, Any]) -> None:
+        """Add one delta to its rollup row with in-database increments
+
+        The UPDATE is the transaction's first statement, so it takes the row
+        lock (the write lock on SQLite) before anything is read; the
+        histogram read-modify-write after it cannot interleave with another
+        worker's flush of the same row.
+        """
+        bucket_seconds, bucket_start, category, architecture = key
+        c = GenerationRollup.__table__.c
+        match = and_(
+            c.bucket_seconds == bucket_seconds, c.bucket_start == bucket_start,
+            c.category == category, c.architecture == architecture
+        )
+        values = {name: func.coalesce(c[name], 0) + stats[name] for name in COUNTERS}
+        values['duration_count'] = func.coalesce(c.duration_count, 0) + stats['count']
+        values['duration_sum'] = func.coalesce(c.duration_sum, 0.0) + stats['sum']
+        if stats['min'] is not None:
+            values['duration_min'] = case(
+                (c.duration_min.is_(None), stats['min']),
+                (c.duration_min > stats['min'], stats['min']),
+                else_=c.duration_min
+            )
+        if stats['max'] is not None:
+            values['duration_max'] = case(
+                (c.duration_max.is_(None), stats['max']),
+                (c.duration_max < stats['max'], stats['max']),
+                else_=c.duration_max
+            )
+        values['updated_at'] = datetime.utcnow()
+
+        if session.execute(update(GenerationRollup.__table__).where(match).values(**values)).rowcount == 0:
+            try:
+                with session.begin_nested():
+                    session.execute(insert(GenerationRollup.__table__).values(
+                        bucket_seconds=bucket_seconds, bucket_start=bucket_start,
+                        category=category, architecture=architecture,
+                        duration_count=stats['count'], duration_sum=stats['sum'],
+                        duration_min=stats['min'], duration_max=stats['max'],
+                        duration_buckets=stats['buckets'], updated_at=datetime.utcnow(),
+                        **{name: stats[name] for name in COUNTERS}
+                    ))
+                return
+            except IntegrityError:
+                # Created by another worker since the UPDATE; it holds the row now
+                session.execute(update(GenerationRollup.__table__).where(match).values(**values))
+
+        if not stats['count']:
+            return
+        current = session.execute(select(c.duration_buckets).where(match)).scalar() or []
+        buckets = [
+            (current[i] if i < len(current) else 0) + n for i, n in enumerate(stats['buckets'])
+        ]
+        session.execute(update(GenerationRollup.__table__).where(match).values(duration_buckets=buckets))
+
+    @staticmethod
+    def _row_stats(row: GenerationRollup) -> Dict[str, Any]:
+        stats = empty_stats()
+        for name in COUNTERS:
+            stats[name] = getattr(row, name) or 0
+        stats['count'] = row.duration_count or 0
+        stats['sum'] = row.duration_sum or 0.0
+        stats['min'] = row.duration_min
+        stats['max'] = row.duration_max
+        for i, n in enumerate((row.duration_buckets or [])[:len(DURATION_BUCKETS)]):
+            stats['buckets'][i] = n
+        return stats
+
+    def query(self, session, window_seconds: int = None, category: str = None,
+              architecture: str = None) -> Dict[str, Any]:
+        """Totals plus per-category and per-architecture breakdowns
+
+        window_seconds None reads the all-time rows; otherwise the hourly
+        buckets overlapping the last window_seconds. Deltas not flushed yet
+        by this process are included.
+        """
+        if window_seconds:
+            bucket_seconds = self.bucket_seconds
+            since = datetime.utcfromtimestamp(
+                int((time.time() - window_seconds) // self.bucket_seconds) * self.bucket_seconds
+            )
+        else:
+            bucket_seconds, since = 0, ALL_TIME
+
+        query = session.query(GenerationRollup).filter(
+            GenerationRollup.bucket_seconds == bucket_seconds,
+            GenerationRollup.bucket_start >= since
+        )
+        if category:
+            query = query.filter(GenerationRollup.category == category)
+        if architecture:
+            query = query.filter(GenerationRollup.architecture == architecture)
+
+        entries = [((row.category, row.architecture), self._row_stats(row)) for row in query.all()]
+        with self._lock:
+            for (seconds, start, cat, arch), stats in self._pending.items():
+                if seconds != bucket_seconds or start < since:
+                    continue
+                if (category and cat != category) or (architecture and arch != architecture):
+                    continue
+                entries.append(((cat, arch), merge_stats(empty_stats(), stats)))
+
+        total = empty_stats()
+        by_category: Dict[str, Dict[str, Any]] = {}
+        by_architecture: Dict[str, Dict[str, Any]] = {}
+        for (cat, arch), stats in entries:
+            merge_stats(total, stats)
+            merge_stats(by_category.setdefault(cat, empty_stats()), stats)
+            merge_stats(by_architecture.setdefault(arch, empty_stats()), stats)
+
+        result = summarize(total)
+        result['by_category'] = {name: summarize(stats) for name, stats in sorted(by_category.items())}
+        result['by_architecture'] = {name: summarize(stats) for name, stats in sorted(by_architecture.items())}
+        return result
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Generation analytics flush error: {str(e)}")
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+# Global instance
+generation_analytics = GenerationAnalytics()
@@ -0,0 +1,420 @@
+"""
+Job State Store Module
+Shared generation job state (status, analytics, active generations) with an in-memory
+backend for single-process use and a SQLite WAL backend shared by all workers on a host
+"""
+
+import os
+import json
+import time
+import sqlite3
+import atexit
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Optional, List
+
+from status_events import TERMINAL_STATUSES
+
+logger = logging.getLogger(__name__)
+
+class JobStore(ABC):
+    """Interface for generation job state"""
+
+    @abstractmethod
+    def create(self, project_id: str, status: Dict[str, Any], analytics: Dict[str, Any] = None) -> None:
+        """Register a new job with its initial status (version 1)"""
+
+    @abstractmethod
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Copy of a job's status, None if unknown"""
+
+    @abstractmethod
+    def update(self, project_id: str, changes: Dict[str, Any]) -> Optional[int]:
+        """Merge changes into a job's status, returns the new version"""
+
+    @abstractmethod
+    def delete(self, project_id: str) -> None:
+        """Forget a job"""
+
+    @abstractmethod
+    def wait_for_change(self, project_id: str, since: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the job's version passes since or timeout, returns its status"""
+
+    @abstractmethod
+    def append_analytics(self, project_id: str, key: str, entry: Dict[str, Any]) -> None:
+        """Append an entry to one of the job's analytics lists"""
+
+    @abstractmethod
+    def get_analytics(self, project_id: str) -> Dict[str, Any]:
+        """Analytics recorded for a job"""
+
+    @abstractmethod
+    def start_generation(self, project_id: str) -> None:
+        """Mark a job as actively generating"""
+
+    @abstractmethod
+    def finish_generation(self, project_id: str) -> None:
+        """Clear a job's active generation mark"""
+
+    @abstractmethod
+    def active_count(self) -> int:
+        """Number of actively generating jobs"""
+
+    def flush(self) -> None:
+        """Write buffered changes"""
+
+    def close(self) -> None:
+        """Flush and release resources"""
+        self.flush()
+
+class InMemoryJobStore(JobStore):
+    """Process-local job state, suitable for a single worker"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._statuses: Dict[str, Dict[str, Any]] = {}
+        self._analytics: Dict[str, Dict[str, Any]] = {}
+        self._active: set = set()
+        # Per-project condition variables sharing _lock, used by long-polling
+        self._conditions: Dict[str, threading.Condition] = {}
+
+    def create(self, project_id: str, status: Dict[str, Any], analytics: Dict[str, Any] = None) -> None:
+        with self._lock:
+            self._statuses[project_id] = dict(status, version=1)
+            self._analytics[project_id] = dict(analytics or {})
+
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            status = self._statuses.get(project_id)
+            return dict(status) if status else None
+
+    def update(self, project_id: str, changes: Dict[str, Any]) -> Optional[int]:
+        with self._lock:
+            status = self._statuses.get(project_id)
+            if status is None:
+                return None
+            status.update(changes)
+            status['version'] = status.get('version', 0) + 1
+
+            condition = self._conditions.get(project_id)
+            if condition:
+                condition.notify_all()
+            return status['version']
+
+    def delete(self, project_id: str) -> None:
+        with self._lock:
+            self._statuses.pop(project_id, None)
+            self._analytics.pop(project_id, None)
+            self._active.discard(project_id)
+            condition = self._conditions.pop(project_id, None)
+            if condition:
+                condition.notify_all()
+
+    def wait_for_change(self, project_id: str, since: int, timeout: float) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            if project_id not in self._statuses:
+                return None
+            condition = self._conditions.get(project_id)
+            if condition is None:
+                condition = self._conditions[project_id] = threading.Condition(self._lock)
+            condition.wait_for(
+                lambda: project_id not in self._statuses or self._statuses[project_id].get('version', 0) > since,
+                timeout
+            )
+            status = self._statuses.get(project_id)
+            return dict(status) if status else None
+
+    def append_analytics(self, project_id: str, key: str, entry: Dict[str, Any]) -> None:
+        with self._lock:
+            if project_id in self._analytics:
+                self._analytics[project_id].setdefault(key, []).append(entry)
+
+    def get_analytics(self, project_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self._analytics.get(project_id, {}))
+
+    def start_generation(self, project_id: str) -> None:
+        with self._lock:
+            self._active.add(project_id)
+
+    def finish_generation(self, project_id: str) -> None:
+        with self._lock:
+            self._active.discard(project_id)
+
+    def active_count(self) -> int:
+        with self._lock:
+            return len(self._active)
+
+class SQLiteJobStore(JobStore):
+    """Job state in a WAL-mode SQLite file shared by every worker on the host
+
+    Stage updates are coalesced per job in memory and written in one
+    transaction every flush_interval seconds; terminal statuses are written
+    immediately. Local readers see buffered changes at once, other workers
+    see them after the next flush. Waiters wake on local changes at once and
+    re-read the file every poll_interval seconds for other workers' changes.
+    """
+
+    def __init__(self, path: str, flush_interval: float = 0.25, poll_interval: float = 0.5,
+                 active_ttl: float = 3600):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.poll_interval = poll_interval
+        self.active_ttl = active_ttl
+
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._conditions: Dict[str, threading.Condition] = {}
+        # project_id -> {'changes': {...}, 'version': int, 'analytics': {key: [entries]}}
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}  # Batch being written
+        self._wake = threading.Event()
+        self._stopped = False
+
+        self._conn = self._connect()
+        self._flusher = threading.Thread(target=self._flush_loop, daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                project_id TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                status TEXT NOT NULL,
+                analytics TEXT,
+                updated_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS active_jobs (
+                project_id TEXT PRIMARY KEY,
+                pid INTEGER,
+                started_at REAL NOT NULL
+            ) WITHOUT ROWID
+        ''')
+        return conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        with self._db_lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def _load(self, project_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._execute('SELECT version, status FROM jobs WHERE project_id = ?', (project_id,))
+        if not rows:
+            return None
+        status = json.loads(rows[0][1])
+        status['version'] = rows[0][0]
+        return status
+
+    def _overlay(self, project_id: str, status: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Apply this worker's buffered changes on top of the stored status"""
+        if status is None:
+            return None
+        for buffer in (self._inflight, self._pending):
+            pending = buffer.get(project_id)
+            if pending:
+                status.update(pending['changes'])
+                status['version'] = max(status['version'], pending['version'])
+        return status
+
+    def create(self, project_id: str, status: Dict[str, Any], analytics: Dict[str, Any] = None) -> None:
+        with self._db_lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO jobs (project_id, version, status, analytics, updated_at) '
+                'VALUES (?, 1, ?, ?, ?)',
+                (project_id, json.dumps(status, default=str), json.dumps(analytics or {}, default=str), time.time())
+            )
+
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        status = self._load(project_id)
+        with self._lock:
+            return self._overlay(project_id, status)
+
+    def _ensure_pending(self, project_id: str) -> bool:
+        """Create the job's buffer entry from its stored version, False if unknown"""
+        with self._lock:
+            if project_id in self._pending:
+                return True
+        # Load without holding _lock: flush() takes _db_lock before _lock
+        current = self._load(project_id)
+        if current is None:
+            return False
+        with self._lock:
+            self._pending.setdefault(project_id, {
+                'changes': {}, 'version': current['version'], 'analytics': {}
+            })
+        return True
+
+    def update(self, project_id: str, changes: Dict[str, Any]) -> Optional[int]:
+        while True:
+            if not self._ensure_pending(project_id):
+                return None
+            with self._lock:
+                pending = self._pending.get(project_id)
+                if pending is None:
+                    continue  # Flushed in between, reload
+                pending['changes'].update(changes)
+                pending['version'] += 1
+                version = pending['version']
+
+                condition = self._conditions.get(project_id)
+                if condition:
+                    condition.notify_all()
+                break
+
+        if changes.get('status') in TERMINAL_STATUSES:
+            self.flush()
+        return version
+
+    def delete(self, project_id: str) -> None:
+        with self._lock:
+            self._pending.pop(project_id, None)
+            condition = self._conditions.pop(project_id, None)
+            if condition:
+                condition.notify_all()
+        with self._db_lock:
+            self._conn.execute('DELETE FROM jobs WHERE project_id = ?', (project_id,))
+            self._conn.execute('DELETE FROM active_jobs WHERE project_id = ?', (project_id,))
+
+    def wait_for_change(self, project_id: str, since: int, timeout: float) -> Optional[Dict[str, Any]]:
+        deadline = time.time() + timeout
+        while True:
+            status = self.get(project_id)
+            remaining = deadline - time.time()
+            if status is None or status.get('version', 0) > since or remaining <= 0:
+                return status
+
+            # Local updates wake us at once; other workers' flushes are picked up by polling
+            with self._lock:
+                condition = self._conditions.get(project_id)
+                if condition is None:
+                    condition = self._conditions[project_id] = threading.Condition(self._lock)
+                condition.wait(min(remaining, self.poll_interval))
+
+    def append_analytics(self, project_id: str, key: str, entry: Dict[str, Any]) -> None:
+        while True:
+            if not self._ensure_pending(project_id):
+                return
+            with self._lock:
+                pending = self._pending.get(project_id)
+                if pending is None:
+                    continue  # Flushed in between, reload
+                pending['analytics'].setdefault(key, []).append(entry)
+                return
+
+    def get_analytics(self, project_id: str) -> Dict[str, Any]:
+        rows = self._execute('SELECT analytics FROM jobs WHERE project_id = ?', (project_id,))
+        analytics = json.loads(rows[0][0] or '{}') if rows else {}
+        with self._lock:
+            pending = self._pending.get(project_id)
+            if pending:
+                for key, entries in pending['analytics'].items():
+                    analytics[key] = analytics.get(key, []) + entries
+        return analytics
+
+    def start_generation(self, project_id: str) -> None:
+        with self._db_lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO active_jobs (project_id, pid, started_at) VALUES (?, ?, ?)',
+                (project_id, os.getpid(), time.time())
+            )
+
+    def finish_generation(self, project_id: str) -> None:
+        with self._db_lock:
+            self._conn.execute('DELETE FROM active_jobs WHERE project_id = ?', (project_id,))
+
+    def active_count(self) -> int:
+        # Entries older than the TTL belong to workers that died mid-generation
+        rows = self._execute(
+            'SELECT COUNT(*) FROM active_jobs WHERE started_at > ?',
+            (time.time() - self.active_ttl,)
+        )
+        return rows[0][0]
+
+    def flush(self) -> None:
+        """Write all buffered changes in a single transaction"""
+        with self._db_lock:
+            with self._lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, {}
+                self._inflight = batch
+
+            now = time.time()
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                for project_id, pending in batch.items():
+                    rows = self._conn.execute(
+                        'SELECT version, status, analytics FROM jobs WHERE project_id = ?', (project_id,)
+                    ).fetchall()
+                    if not rows:
+                        continue
+                    version, status, analytics = rows[0]
+                    status = json.loads(status)
+                    status.update(pending['changes'])
+                    analytics = json.loads(analytics or '{}')
+                    for key, entries in pending['analytics'].items():
+                        analytics.setdefault(key, []).extend(entries)
+                    self._conn.execute(
+                        'UPDATE jobs SET version = ?, status = ?, analytics = ?, updated_at = ? '
+                        'WHERE project_id = ?',
+                        (max(version + 1, pending['version']), json.dumps(status, default=str),
+                         json.dumps(analytics, default=str), now, project_id)
+                    )
+                self._conn.execute('COMMIT')
+            except Exception as e:
+                self._conn.execute('ROLLBACK')
+                logger.error(f"Job store flush failed: {e}")
+                self._requeue(batch)
+            finally:
+                with self._lock:
+                    self._inflight = {}
+
+    def _requeue(self, batch: Dict[str, Dict[str, Any]]) -> None:
+        """Put a failed batch back underneath any newer buffered changes"""
+        with self._lock:
+            for project_id, pending in batch.items():
+                newer = self._pending.get(project_id)
+                if newer:
+                    pending['changes'].update(newer['changes'])
+                    pending['version'] = max(pending['version'], newer['version'])
+                    for key, entries in newer['analytics'].items():
+                        pending['analytics'].setdefault(key, []).extend(entries)
+                self._pending[project_id] = pending
+
+    def _flush_loop(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Job store flush loop error: {e}")
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+def create_job_store(config) -> JobStore:
+    """Build the job store backend selected in configuration"""
+    backend = (config.JOB_STORE_BACKEND or 'memory').lower()
+
+    if backend == 'sqlite':
+        logger.info(f"Using SQLite job store at {config.JOB_STORE_PATH}")
+        return SQLiteJobStore(
+            config.JOB_STORE_PATH,
+            flush_interval=config.JOB_STORE_FLUSH_INTERVAL,
+            poll_interval=config.JOB_STORE_POLL_INTERVAL
+        )
+
+    if backend != 'memory':
+        logger.warning(f"Unknown job store backend '{backend}', using in-memory store")
+    return InMemoryJobStore()
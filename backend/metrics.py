@@ -0,0 +1,96 @@
+"""
+Metrics Module
+Prometheus metrics for the hot paths (requests, generation stages, builds, queues,
+cache, database pool, Gemini) served in text exposition format on METRICS_PORT
+"""
+
+import os
+import time
+import logging
+from typing import Callable, List
+
+from prometheus_client import (
+    CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, start_http_server
+)
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+BUILD_BUCKETS = (10, 30, 60, 120, 180, 300, 450, 600, 900)
+
+REQUEST_LATENCY = Histogram(
+    'codecraft_http_request_duration_seconds', 'HTTP request latency',
+    ['endpoint', 'method', 'status'], buckets=REQUEST_BUCKETS
+)
+STAGE_DURATION = Histogram(
+    'codecraft_generation_stage_duration_seconds', 'Duration of each app generation stage',
+    ['stage'], buckets=STAGE_BUCKETS
+)
+GENERATION_DURATION = Histogram(
+    'codecraft_generation_duration_seconds', 'End-to-end app generation time',
+    ['result'], buckets=STAGE_BUCKETS + (600, 900)
+)
+BUILD_DURATION = Histogram(
+    'codecraft_apk_build_duration_seconds', 'Gradle APK build duration',
+    ['result'], buckets=BUILD_BUCKETS
+)
+QUEUE_DEPTH = Gauge('codecraft_generation_queue_depth', 'Generations waiting to start')
+ACTIVE_GENERATIONS = Gauge('codecraft_active_generations', 'Generations currently running')
+CACHE_REQUESTS = Counter(
+    'codecraft_cache_requests_total', 'Cache lookups by cache and result (hit or miss)',
+    ['cache', 'result']
+)
+DB_POOL_WAIT = Histogram(
+    'codecraft_db_pool_checkout_wait_seconds', 'Time spent waiting for a pooled database connection',
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)
+)
+GEMINI_LATENCY = Histogram(
+    'codecraft_gemini_request_duration_seconds', 'Gemini API call latency',
+    ['operation', 'status'], buckets=(0.25, 0.5, 1, 2, 5, 10, 20, 30, 60)
+)
+
+# Extra observers of pool checkout waits (e.g. the per-request SQL profiler)
+pool_wait_listeners: List[Callable[[float], None]] = []
+
+class TimedQueuePool(QueuePool):
+    """QueuePool that reports how long each checkout waited for a connection"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            wait = time.perf_counter() - start
+            DB_POOL_WAIT.observe(wait)
+            for listener in pool_wait_listeners:
+                listener(wait)
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    CACHE_REQUESTS.labels(cache=cache, result='hit' if hit else 'miss').inc()
+
+def bind_gauges(queue_depth: Callable[[], float], active_generations: Callable[[], float]) -> None:
+    """Compute the queue gauges at scrape time"""
+    QUEUE_DEPTH.set_function(queue_depth)
+    ACTIVE_GENERATIONS.set_function(active_generations)
+
+def start_metrics_server(port: int) -> bool:
+    """Serve /metrics on port; returns False if another worker already serves it
+
+    With PROMETHEUS_MULTIPROC_DIR set, the served registry aggregates every
+    worker's samples (callback gauges are then per process and not exported).
+    """
+    registry = REGISTRY
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    try:
+        start_http_server(port, registry=registry)
+    except OSError as e:
+        logger.info(f"Metrics port {port} unavailable ({e}), assuming another worker serves it")
+        return False
+    logger.info(f"Serving Prometheus metrics on port {port}")
+    return True
@@ -0,0 +1,399 @@
+"""
+Metrics Retention Module
+Downsamples SystemMetrics into 1-minute, 1-hour and 1-day rollups, expires each
+tier in bounded delete batches and answers series queries from the coarsest
+tier that fits the requested range
+"""
+
+import math
+import json
+import time
+import atexit
+import threading
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Tuple, Callable, Optional
+
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from models import SystemMetrics, MetricRollup, MetricRollupWatermark
+from database import begin_write
+
+logger = logging.getLogger(__name__)
+
+RAW = 0
+MINUTE = 60
+HOUR = 3600
+DAY = 86400
+
+# Each tier is built from the one before it
+TIERS = (MINUTE, HOUR, DAY)
+SOURCE_TIER = {MINUTE: RAW, HOUR: MINUTE, DAY: HOUR}
+
+# Metadata keys that hold statistics rather than labels
+STAT_KEYS = {'count', 'sum', 'min', 'max', 'p50', 'p95', 'p99', 'buckets', 'interval_seconds'}
+
+# Sketch bucket growth factor; quantiles are within ~2.5% relative error
+SKETCH_GAMMA = 1.05
+_LOG_GAMMA = math.log(SKETCH_GAMMA)
+ZERO_KEY = 'z'
+
+def sketch_add(sketch: Dict[str, int], value: float, n: int = 1) -> None:
+    key = ZERO_KEY if value <= 1e-9 else str(math.ceil(math.log(value) / _LOG_GAMMA))
+    sketch[key] = sketch.get(key, 0) + n
+
+def sketch_merge(into: Dict[str, int], other: Optional[Dict[str, int]]) -> None:
+    for key, n in (other or {}).items():
+        into[key] = into.get(key, 0) + n
+
+def sketch_quantile(sketch: Dict[str, int], q: float) -> Optional[float]:
+    total = sum(sketch.values())
+    if not total:
+        return None
+    rank = q * (total - 1)
+    seen = 0
+    for key in sorted(sketch, key=lambda k: float('-inf') if k == ZERO_KEY else int(k)):
+        seen += sketch[key]
+        if seen > rank:
+            if key == ZERO_KEY:
+                return 0.0
+            # Midpoint of (gamma^(k-1), gamma^k] in relative terms
+            return 2 * SKETCH_GAMMA ** int(key) / (SKETCH_GAMMA + 1)
+    return None
+
+def floor_time(moment: datetime, resolution: int) -> datetime:
+    seconds = int((moment - datetime(1970, 1, 1)).total_seconds())
+    return datetime(1970, 1, 1) + timedelta(seconds=seconds - seconds % resolution)
+
+def empty_stats() -> Dict[str, Any]:
+    return {'count': 0, 'sum': 0.0, 'min': None, 'max': None, 'sketch': {}}
+
+def merge_stats(into: Dict[str, Any], count: int, total: float, low: Optional[float],
+                high: Optional[float], sketch: Optional[Dict[str, int]]) -> None:
+    into['count'] += count
+    into['sum'] += total
+    if low is not None:
+        into['min'] = low if into['min'] is None else min(into['min'], low)
+    if high is not None:
+        into['max'] = high if into['max'] is None else max(into['max'], high)
+    sketch_merge(into['sketch'], sketch)
+
+def raw_point(row: SystemMetrics) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+    """(labels, stats) of a raw point
+
+    Pre-aggregated rows (request metrics) carry count/sum/min/max and a
+    histogram in their metadata; their sketch places each histogram bucket's
+    count at the bucket midpoint, clamped to the observed range.
+    """
+    meta = row.metric_metadata or {}
+    labels = {k: v for k, v in meta.items() if k not in STAT_KEYS}
+    stats = empty_stats()
+    if 'count' in meta and 'sum' in meta:
+        low, high = meta.get('min', row.value), meta.get('max', row.value)
+        sketch: Dict[str, int] = {}
+        lower = 0.0
+        for bound, n in sorted(((float(le), n) for le, n in (meta.get('buckets') or {}).items())):
+            upper = high if math.isinf(bound) else bound
+            sketch_add(sketch, min(max((lower + upper) / 2, low), high), n)
+            lower = upper
+        if not sketch:
+            sketch_add(sketch, row.value, meta['count'])
+        merge_stats(stats, meta['count'], meta['sum'], low, high, sketch)
+    else:
+        sketch = {}
+        sketch_add(sketch, row.value)
+        merge_stats(stats, 1, row.value, row.value, row.value, sketch)
+    return labels, stats
+
+def summarize(stats: Dict[str, Any]) -> Dict[str, Any]:
+    def quantile(q):
+        value = sketch_quantile(stats['sketch'], q)
+        if value is None:
+            return None
+        return round(min(max(value, stats['min']), stats['max']), 6)
+
+    return {
+        'count': stats['count'],
+        'avg': round(stats['sum'] / stats['count'], 6) if stats['count'] else None,
+        'min': stats['min'],
+        'max': stats['max'],
+        'p50': quantile(0.50),
+        'p95': quantile(0.95),
+        'p99': quantile(0.99)
+    }
+
+class MetricsRetention:
+    """Rollup and retention engine for SystemMetrics
+
+    Closed buckets are rolled into the next tier exactly once: the rows and
+    the tier's watermark move in the same transaction, and the watermark
+    update is conditional, so concurrent workers cannot double count.
+    Expired rows are deleted in batches of batch_size with a commit after
+    each, keeping locks short.
+    """
+
+    def __init__(self, session_factory: Callable = None, retention: Dict[int, timedelta] = None,
+                 batch_size: int = 5000, max_buckets_per_pass: int = 120,
+                 raw_grace_seconds: int = 60, interval: float = 60, points: int = 300):
+        self.session_factory = session_factory
+        self.retention = retention or {
+            RAW: timedelta(days=1),
+            MINUTE: timedelta(days=7),
+            HOUR: timedelta(days=90),
+            DAY: timedelta(days=730)
+        }
+        self.batch_size = batch_size
+        self.max_buckets_per_pass = max_buckets_per_pass
+        self.raw_grace_seconds = raw_grace_seconds
+        self.interval = interval
+        self.points = points
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, session_factory: Callable = None) -> None:
+        """Start the background rollup and retention loop"""
+        if session_factory is not None:
+            self.session_factory = session_factory
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    # Rollups
+
+    def _watermark(self, session, resolution: int) -> Optional[datetime]:
+        row = session.get(MetricRollupWatermark, resolution)
+        return row.rolled_until if row else None
+
+    def _earliest(self, session, source: int) -> Optional[datetime]:
+        if source == RAW:
+            row = session.query(SystemMetrics.timestamp).order_by(SystemMetrics.timestamp).first()
+        else:
+            row = session.query(MetricRollup.bucket_start).filter(
+                MetricRollup.resolution_seconds == source
+            ).order_by(MetricRollup.bucket_start).first()
+        return row[0] if row else None
+
+    def _source_stats(self, session, source: int, start: datetime, end: datetime,
+                      resolution: int, metric_name: str = None) -> Dict[Tuple, Dict[str, Any]]:
+        """Source rows in [start, end) merged per (bucket, type, name, series)"""
+        buckets: Dict[Tuple, Dict[str, Any]] = {}
+        if source == RAW:
+            query = session.query(SystemMetrics).filter(
+                SystemMetrics.timestamp >= start, SystemMetrics.timestamp < end
+            )
+            if metric_name:
+                query = query.filter(SystemMetrics.metric_name == metric_name)
+            for row in query.yield_per(1000):
+                labels, stats = raw_point(row)
+                series = json.dumps(labels, sort_keys=True, default=str)
+                key = (floor_time(row.timestamp, resolution), row.metric_type, row.metric_name, series)
+                entry = buckets.setdefault(key, {'labels': labels, 'stats': empty_stats()})
+                merge_stats(entry['stats'], stats['count'], stats['sum'], stats['min'], stats['max'], stats['sketch'])
+        else:
+            query = session.query(MetricRollup).filter(
+                MetricRollup.resolution_seconds == source,
+                MetricRollup.bucket_start >= start,
+                MetricRollup.bucket_start < end
+            )
+            if metric_name:
+                query = query.filter(MetricRollup.metric_name == metric_name)
+            for row in query.yield_per(1000):
+                key = (floor_time(row.bucket_start, resolution), row.metric_type, row.metric_name, row.series)
+                entry = buckets.setdefault(key, {'labels': row.labels or {}, 'stats': empty_stats()})
+                merge_stats(entry['stats'], row.count, row.sum, row.min, row.max, row.sketch)
+        return buckets
+
+    def roll(self, session, resolution: int) -> Optional[datetime]:
+        """Build one chunk of a tier; returns the new watermark, None when there was nothing to do"""
+        source = SOURCE_TIER[resolution]
+        now = datetime.utcnow()
+        begin_write(session)  # Watermarks and source rows are read to decide what to write
+        if source == RAW:
+            until = floor_time(now - timedelta(seconds=self.raw_grace_seconds), resolution)
+        else:
+            source_watermark = self._watermark(session, source)
+            if source_watermark is None:
+                session.rollback()  # Release the write lock taken by begin_write
+                return None
+            until = floor_time(source_watermark, resolution)
+
+        start = self._watermark(session, resolution)
+        if start is None:
+            earliest = self._earliest(session, source)
+            start = floor_time(earliest, resolution) if earliest else until
+            try:
+                session.add(MetricRollupWatermark(resolution_seconds=resolution, rolled_until=start))
+                session.commit()
+            except IntegrityError:
+                session.rollback()  # Another worker initialised it
+                return None
+            begin_write(session)
+
+        until = min(until, start + timedelta(seconds=resolution * self.max_buckets_per_pass))
+        if until <= start:
+            session.rollback()
+            return None
+
+        buckets = self._source_stats(session, source, start, until, resolution)
+        session.add_all([
+            MetricRollup(
+                resolution_seconds=resolution,
+                bucket_start=bucket_start,
+                metric_type=metric_type,
+                metric_name=metric_name,
+                series=series,
+                labels=entry['labels'],
+                count=entry['stats']['count'],
+                sum=entry['stats']['sum'],
+                min=entry['stats']['min'],
+                max=entry['stats']['max'],
+                sketch=entry['stats']['sketch']
+            )
+            for (bucket_start, metric_type, metric_name, series), entry in buckets.items()
+        ])
+        moved = session.execute(
+            update(MetricRollupWatermark)
+            .where(MetricRollupWatermark.resolution_seconds == resolution,
+                   MetricRollupWatermark.rolled_until == start)
+            .values(rolled_until=until)
+        )
+        if moved.rowcount != 1:
+            session.rollback()  # Another worker rolled this range first
+            return None
+        session.commit()
+        return until
+
+    # Retention
+
+    def _delete_batches(self, session, model, id_column, time_column, cutoff: datetime, *filters) -> int:
+        deleted = 0
+        while not self._stopped:
+            ids = [row[0] for row in session.query(id_column).filter(
+                time_column < cutoff, *filters
+            ).order_by(time_column).limit(self.batch_size)]
+            if not ids:
+                break
+            session.query(model).filter(id_column.in_(ids)).delete(synchronize_session=False)
+            session.commit()
+            deleted += len(ids)
+            if len(ids) < self.batch_size:
+                break
+            time.sleep(0.05)  # Let request writes in between batches
+        return deleted
+
+    def expire(self, session, raw_retention: timedelta = None) -> Dict[str, int]:
+        """Delete rows past each tier's retention; raw points only once rolled up"""
+        now = datetime.utcnow()
+        deleted = {}
+
+        raw_cutoff = now - (raw_retention or self.retention[RAW])
+        minute_watermark = self._watermark(session, MINUTE)
+        raw_cutoff = min(raw_cutoff, minute_watermark) if minute_watermark else None
+        deleted['raw'] = self._delete_batches(
+            session, SystemMetrics, SystemMetrics.id, SystemMetrics.timestamp, raw_cutoff
+        ) if raw_cutoff else 0
+
+        for resolution in TIERS:
+            cutoff = now - self.retention[resolution]
+            next_tier = next((t for t in TIERS if SOURCE_TIER[t] == resolution), None)
+            if next_tier:
+                # Keep rows the coarser tier has not absorbed yet
+                next_watermark = self._watermark(session, next_tier)
+                if next_watermark is None:
+                    continue
+                cutoff = min(cutoff, next_watermark)
+            deleted[f"{resolution}s"] = self._delete_batches(
+                session, MetricRollup, MetricRollup.id, MetricRollup.bucket_start, cutoff,
+                MetricRollup.resolution_seconds == resolution
+            )
+        return deleted
+
+    def run_once(self, session, raw_retention: timedelta = None) -> Dict[str, int]:
+        """Catch every tier up, then expire old rows"""
+        rolled = 0
+        for resolution in TIERS:
+            while not self._stopped:
+                if self.roll(session, resolution) is None:
+                    break
+                rolled += 1
+        deleted = self.expire(session, raw_retention)
+        if rolled or any(deleted.values()):
+            logger.info(f"Metrics retention: rolled {rolled} chunks, deleted {deleted}")
+        return deleted
+
+    # Queries
+
+    def choose_tier(self, start: datetime, end: datetime, step: int = None) -> int:
+        """Coarsest tier no coarser than the step, falling back to whatever still covers start"""
+        desired = step or max((end - start).total_seconds() / self.points, 1)
+        oldest_needed = datetime.utcnow() - start
+        candidates = [t for t in (RAW,) + TIERS if self.retention[t] >= oldest_needed]
+        fitting = [t for t in candidates if t <= desired]
+        if fitting:
+            return max(fitting)
+        return min(candidates) if candidates else DAY
+
+    def _collect(self, session, tier: int, start: datetime, end: datetime, resolution: int,
+                 metric_name: str) -> Dict[Tuple, Dict[str, Any]]:
+        """Stats for [start, end) from a tier, with the part it has not built yet taken from finer tiers"""
+        if tier == RAW:
+            return self._source_stats(session, RAW, start, end, resolution, metric_name)
+
+        watermark = self._watermark(session, tier) or start
+        buckets = self._source_stats(session, tier, start, min(end, watermark), resolution, metric_name) \
+            if watermark > start else {}
+        if end > watermark:
+            tail = self._collect(session, SOURCE_TIER[tier], max(start, watermark), end, resolution, metric_name)
+            for key, entry in tail.items():
+                existing = buckets.setdefault(key, {'labels': entry['labels'], 'stats': empty_stats()})
+                s = entry['stats']
+                merge_stats(existing['stats'], s['count'], s['sum'], s['min'], s['max'], s['sketch'])
+        return buckets
+
+    def query(self, session, metric_name: str, start: datetime, end: datetime = None, step: int = None,
+              metric_type: str = None, labels: Dict[str, str] = None) -> Dict[str, Any]:
+        """Series for one metric between start and end, merged across label sets matching labels"""
+        end = end or datetime.utcnow()
+        tier = self.choose_tier(start, end, step)
+        resolution = max(tier, step or 0, 1)
+        buckets = self._collect(session, tier, floor_time(start, resolution), end, resolution, metric_name)
+
+        points: Dict[datetime, Dict[str, Any]] = {}
+        for (bucket_start, kind, _, _), entry in buckets.items():
+            if metric_type and kind != metric_type:
+                continue
+            if labels and any(str(entry['labels'].get(k)) != str(v) for k, v in labels.items()):
+                continue
+            s = entry['stats']
+            merge_stats(points.setdefault(bucket_start, empty_stats()), s['count'], s['sum'], s['min'], s['max'], s['sketch'])
+
+        return {
+            'metric': metric_name,
+            'tier_seconds': tier,
+            'resolution_seconds': resolution,
+            'points': [dict(summarize(stats), timestamp=moment.isoformat()) for moment, stats in sorted(points.items())]
+        }
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            if self._stopped or self.session_factory is None:
+                continue
+            session = self.session_factory()
+            try:
+                self.run_once(session)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Metrics retention error: {str(e)}")
+            finally:
+                session.close()
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+# Global instance
+metrics_retention = MetricsRetention()
@@ -6,7 +6,7 @@ Comprehensive data models with relationships, validation, and performance optimi
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, Float, JSON, ForeignKey, Index
-from sqlalchemy.orm import relationship, backref, validates
+from sqlalchemy.orm import relationship, backref, validates, selectinload
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.sql import func
 from werkzeug.security import generate_password_hash, check_password_hash
@@ -169,7 +169,7 @@ class Project(Base):
     features = relationship('ProjectFeature', back_populates='project', cascade='all, delete-orphan')
     activities = relationship('ProjectActivity', back_populates='project', cascade='all, delete-orphan')
     dependencies = relationship('ProjectDependency', back_populates='project', cascade='all, delete-orphan')
-    analytics = relationship('ProjectAnalytics', back_populates='project', cascade='all, delete-orphan')
+    # ProjectAnalytics rows live in monthly partitions (partitions.analytics_partitions), not behind a relationship
 
     __table_args__ = (
         Index('idx_project_user', 'user_id', 'created_at'),
@@ -184,9 +184,14 @@ class Project(Base):
             raise ValueError('Progress must be between 0 and 100')
         return value
 
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for API responses"""
-        return {
+    def to_dict(self, include_components: bool = False) -> Dict[str, Any]:
+        """Convert to dictionary for API responses
+
+        include_components adds features, activities and dependencies; load the
+        project with get_project_with_components() so they come from three
+        selectin queries instead of lazy loads.
+        """
+        data = {
             'id': self.id,
             'name': self.name,
             'description': self.description,
@@ -205,6 +210,11 @@ class Project(Base):
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'metadata': self.project_metadata or {}
         }
+        if include_components:
+            data['features'] = [feature.to_dict() for feature in self.features]
+            data['activities'] = [activity.to_dict() for activity in self.activities]
+            data['dependencies'] = [dependency.to_dict() for dependency in self.dependencies]
+        return data
 
 class ProjectFeature(Base):
     """Features associated with a project"""
@@ -226,6 +236,15 @@ class ProjectFeature(Base):
         Index('idx_feature_project', 'project_id', 'is_implemented'),
     )
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'description': self.description,
+            'category': self.category,
+            'complexity': self.complexity,
+            'is_implemented': self.is_implemented
+        }
+
 class ProjectActivity(Base):
     """Activities/screens in the project"""
     __tablename__ = 'project_activities'
@@ -246,6 +265,15 @@ class ProjectActivity(Base):
         Index('idx_activity_project', 'project_id', 'type'),
     )
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'type': self.type,
+            'description': self.description,
+            'layout_file': self.layout_file,
+            'is_main': self.is_main
+        }
+
 class ProjectDependency(Base):
     """Dependencies/libraries used in the project"""
     __tablename__ = 'project_dependencies'
@@ -266,6 +294,15 @@ class ProjectDependency(Base):
         Index('idx_dependency_project', 'project_id', 'type'),
     )
 
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'version': self.version,
+            'type': self.type,
+            'description': self.description,
+            'is_optional': self.is_optional
+        }
+
 class ProjectAnalytics(Base):
     """Analytics data for project generation"""
     __tablename__ = 'project_analytics'
@@ -279,9 +316,6 @@ class ProjectAnalytics(Base):
     memory_usage = Column(Float)  # Memory usage in MB
     cpu_usage = Column(Float)  # CPU usage percentage
 
-    # Relationships
-    project = relationship('Project', back_populates='analytics')
-
     __table_args__ = (
         Index('idx_analytics_project', 'project_id', 'event_type', 'timestamp'),
     )
@@ -301,6 +335,60 @@ class SystemMetrics(Base):
     __table_args__ = (
         Index('idx_metrics_type_time', 'metric_type', 'timestamp'),
         Index('idx_metrics_name_time', 'metric_name', 'timestamp'),
+        Index('idx_metrics_time', 'timestamp'),
+    )
+
+class MetricRollup(Base):
+    """Downsampled SystemMetrics series (1 minute, 1 hour and 1 day tiers)"""
+    __tablename__ = 'metric_rollups'
+
+    id = Column(Integer, primary_key=True)
+    resolution_seconds = Column(Integer, nullable=False)  # 60, 3600 or 86400
+    bucket_start = Column(DateTime, nullable=False)
+    metric_type = Column(String(50), nullable=False)
+    metric_name = Column(String(100), nullable=False)
+    series = Column(String(500), nullable=False)  # Canonical JSON of the labels
+    labels = Column(JSON)
+    count = Column(Integer, nullable=False)
+    sum = Column(Float, nullable=False)
+    min = Column(Float)
+    max = Column(Float)
+    sketch = Column(JSON)  # Log-bucketed counts for percentiles, see metrics_retention
+
+    __table_args__ = (
+        Index('idx_metric_rollup_name_time', 'resolution_seconds', 'metric_name', 'bucket_start'),
+        Index('idx_metric_rollup_time', 'resolution_seconds', 'bucket_start'),
+    )
+
+class MetricRollupWatermark(Base):
+    """How far each rollup tier has been built"""
+    __tablename__ = 'metric_rollup_watermarks'
+
+    resolution_seconds = Column(Integer, primary_key=True)
+    rolled_until = Column(DateTime, nullable=False)
+
+class GenerationRollup(Base):
+    """Generation counters and duration histogram per time bucket, category and architecture"""
+    __tablename__ = 'generation_rollups'
+
+    id = Column(Integer, primary_key=True)
+    bucket_seconds = Column(Integer, nullable=False)  # 0 marks the all-time row
+    bucket_start = Column(DateTime, nullable=False)
+    category = Column(String(50), nullable=False)
+    architecture = Column(String(50), nullable=False)
+    started = Column(Integer, default=0)
+    completed = Column(Integer, default=0)
+    failed = Column(Integer, default=0)
+    cancelled = Column(Integer, default=0)
+    duration_count = Column(Integer, default=0)
+    duration_sum = Column(Float, default=0.0)  # Seconds
+    duration_min = Column(Float)
+    duration_max = Column(Float)
+    duration_buckets = Column(JSON)  # Counts per generation_analytics.DURATION_BUCKETS bound
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_rollup_bucket', 'bucket_seconds', 'bucket_start', 'category', 'architecture', unique=True),
     )
 
 class BackgroundTask(Base):
@@ -330,6 +418,37 @@ class BackgroundTask(Base):
         """Check if task can be retried"""
         return self.retry_count < self.max_retries
 
+class Notification(Base):
+    """User notification history"""
+    __tablename__ = 'notifications'
+
+    id = Column(Integer, primary_key=True)  # Monotonic, used as the pagination cursor
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    title = Column(String(200), nullable=False)
+    message = Column(Text)
+    type = Column(String(20), default='info')  # info, success, warning, error
+    data = Column(JSON)
+    read = Column(Boolean, default=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        Index('idx_notification_user_id', 'user_id', 'id'),
+        Index('idx_notification_user_unread', 'user_id', 'read'),
+    )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for API responses"""
+        return {
+            'id': self.id,
+            'user_id': self.user_id,
+            'title': self.title,
+            'message': self.message,
+            'type': self.type,
+            'data': self.data or {},
+            'read': self.read,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 class AuditLog(Base):
     """Audit logging for security and compliance"""
     __tablename__ = 'audit_logs'
@@ -371,6 +490,14 @@ def get_user_by_username(session, username: str) -> Optional[User]:
     """Get user by username"""
     return session.query(User).filter_by(username=username, is_active=True).first()
 
+def get_project_with_components(session, project_id: str) -> Optional[Project]:
+    """Get project by ID with features, activities and dependencies eagerly loaded"""
+    return session.query(Project).options(
+        selectinload(Project.features),
+        selectinload(Project.activities),
+        selectinload(Project.dependencies)
+    ).filter_by(id=project_id).first()
+
 def get_project_by_id(session, project_id: str) -> Optional[Project]:
     """Get project by ID"""
     return session.query(Project).filter_by(id=project_id).first()
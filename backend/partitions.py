@@ -0,0 +1,274 @@
+"""
+Partitions Module
+Monthly partition tables for append-only models (audit log, project analytics),
+a UNION ALL view over them, range reads and archival of old months to compressed files
+"""
+
+import os
+import re
+import gzip
+import json
+import atexit
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import MetaData, Table, Column, Index, inspect, insert, select, text
+from sqlalchemy.schema import CreateTable, CreateIndex
+
+from models import AuditLog, ProjectAnalytics
+
+logger = logging.getLogger(__name__)
+
+def month_suffix(moment: datetime) -> str:
+    return moment.strftime('%Y%m')
+
+def month_start(suffix: str) -> datetime:
+    return datetime(int(suffix[:4]), int(suffix[4:]), 1)
+
+def next_month(suffix: str) -> str:
+    year, month = int(suffix[:4]), int(suffix[4:])
+    return f"{year + month // 12}{month % 12 + 1:02d}"
+
+class MonthlyPartitions:
+    """One table per calendar month for an append-only model
+
+    Partition tables copy the model's columns and indexes (without foreign
+    keys) plus an index on the time column, so inserts only maintain the
+    small current month's indexes and range queries touch just the months
+    they overlap. A view named <table>_all spans the base table and every
+    partition for ad-hoc reads. The set of existing months is cached per
+    process and reloaded on a miss and on every maintenance pass, since other
+    workers create and drop partitions too.
+    """
+
+    def __init__(self, model, time_column: str = 'timestamp', archive_path: str = None,
+                 keep_months: int = 12):
+        self.base: Table = model.__table__
+        self.name = self.base.name
+        self.view_name = f"{self.name}_all"
+        self.time_column = time_column
+        self.archive_path = archive_path
+        self.keep_months = keep_months
+        self.metadata = MetaData()
+        self._tables: Dict[str, Table] = {}
+        self._known: Optional[frozenset] = None  # Replaced, never mutated, so readers need no lock
+        self._lock = threading.Lock()
+        self._pattern = re.compile(rf'^{re.escape(self.name)}_(\d{{6}})$')
+
+    def table(self, suffix: str) -> Table:
+        """Table object for a month, created in metadata on first use"""
+        with self._lock:
+            table = self._tables.get(suffix)
+            if table is None:
+                name = f"{self.name}_{suffix}"
+                columns = [
+                    Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable,
+                           default=c.default.arg if c.default is not None else None)
+                    for c in self.base.columns
+                ]
+                table = Table(name, self.metadata, *columns)
+                for index in self.base.indexes:
+                    Index(f"{index.name}_{suffix}", *[table.c[c.name] for c in index.columns])
+                Index(f"idx_{name}_time", table.c[self.time_column])
+                self._tables[suffix] = table
+            return table
+
+    def existing(self, conn) -> List[str]:
+        """Month suffixes that have a table, oldest first"""
+        suffixes = []
+        for name in inspect(conn).get_table_names():
+            match = self._pattern.match(name)
+            if match:
+                suffixes.append(match.group(1))
+        return sorted(suffixes)
+
+    def refresh(self, conn) -> List[str]:
+        """Reload the cached month suffixes from the database"""
+        suffixes = self.existing(conn)
+        self._known = frozenset(suffixes)
+        return suffixes
+
+    def known(self, conn) -> List[str]:
+        """Cached month suffixes, oldest first"""
+        known = self._known
+        if known is None:
+            return self.refresh(conn)
+        return sorted(known)
+
+    def ensure(self, conn, suffix: str) -> Table:
+        """Create a month's table and indexes if missing"""
+        table = self.table(suffix)
+        if self._known is not None and suffix in self._known:
+            return table
+        if suffix not in self.refresh(conn):  # Another worker may have created it
+            conn.execute(CreateTable(table, if_not_exists=True))
+            for index in table.indexes:
+                conn.execute(CreateIndex(index, if_not_exists=True))
+            self._known = self._known | {suffix}
+            self.rebuild_view(conn)
+            logger.info(f"Created partition {table.name}")
+        return table
+
+    def rebuild_view(self, conn) -> None:
+        columns = ', '.join(c.name for c in self.base.columns)
+        sources = [self.name] + [f"{self.name}_{suffix}" for suffix in self.existing(conn)]
+        body = ' UNION ALL '.join(f"SELECT {columns} FROM {source}" for source in sources)
+        if conn.dialect.name == 'sqlite':
+            conn.execute(text(f"DROP VIEW IF EXISTS {self.view_name}"))
+            conn.execute(text(f"CREATE VIEW {self.view_name} AS {body}"))
+        else:
+            conn.execute(text(f"CREATE OR REPLACE VIEW {self.view_name} AS {body}"))
+
+    def insert(self, conn, rows: List[Dict[str, Any]]) -> None:
+        """Route rows to their month's table, one executemany per month"""
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            moment = row.get(self.time_column)
+            if moment is None:
+                moment = row[self.time_column] = datetime.utcnow()
+            groups.setdefault(month_suffix(moment), []).append(row)
+        for suffix, group in groups.items():
+            conn.execute(insert(self.ensure(conn, suffix)), group)
+
+    def query(self, conn, start: datetime = None, end: datetime = None, **filters) -> List[Dict[str, Any]]:
+        """Rows in [start, end) matching column=value filters, oldest first
+
+        Reads the base table (rows written before partitioning or with it
+        disabled) plus only the months overlapping the range. IDs are per
+        table, so they are not unique across the result.
+        """
+        known = self.known(conn)
+        current = month_suffix(datetime.utcnow())
+        if current not in known and (end is None or month_start(current) < end):
+            known = self.refresh(conn)  # The current month may have been created elsewhere
+
+        sources = [self.base]
+        for suffix in known:
+            if end is not None and month_start(suffix) >= end:
+                continue
+            if start is not None and month_start(next_month(suffix)) <= start:
+                continue
+            sources.append(self.table(suffix))
+
+        rows = []
+        for table in sources:
+            statement = select(table).where(*[table.c[name] == value for name, value in filters.items()])
+            if start is not None:
+                statement = statement.where(table.c[self.time_column] >= start)
+            if end is not None:
+                statement = statement.where(table.c[self.time_column] < end)
+            rows.extend(dict(row._mapping) for row in conn.execute(statement))
+        rows.sort(key=lambda row: row[self.time_column] or datetime.min)
+        return rows
+
+    def adopt_base_rows(self, engine, batch_size: int = 5000) -> int:
+        """Move rows written before partitioning out of the base table, one batch per transaction"""
+        moved = 0
+        while True:
+            with engine.begin() as conn:
+                rows = [dict(r._mapping) for r in conn.execute(
+                    select(self.base).order_by(self.base.c.id).limit(batch_size)
+                )]
+                if not rows:
+                    return moved
+                last_id = rows[-1]['id']
+                for row in rows:
+                    del row['id']
+                self.insert(conn, rows)
+                conn.execute(self.base.delete().where(self.base.c.id <= last_id))
+            moved += len(rows)
+
+    def archive(self, engine, now: datetime = None) -> List[str]:
+        """Write months older than keep_months to <archive_path>/<table>.jsonl.gz and drop them"""
+        if not self.archive_path or not self.keep_months:
+            return []
+        now = now or datetime.utcnow()
+        cutoff_index = now.year * 12 + now.month - 1 - self.keep_months
+        cutoff = f"{cutoff_index // 12}{cutoff_index % 12 + 1:02d}"
+
+        with engine.connect() as conn:
+            old = [suffix for suffix in self.existing(conn) if suffix < cutoff]
+
+        archived = []
+        for suffix in old:
+            table = self.table(suffix)
+            os.makedirs(self.archive_path, exist_ok=True)
+            path = os.path.join(self.archive_path, f"{table.name}.jsonl.gz")
+            tmp_path = f"{path}.tmp"
+            count = 0
+            with engine.connect() as conn:
+                with gzip.open(tmp_path, 'wt', encoding='utf-8') as f:
+                    for row in conn.execution_options(yield_per=1000).execute(select(table).order_by(table.c.id)):
+                        f.write(json.dumps(dict(row._mapping), default=str) + '\n')
+                        count += 1
+            with open(tmp_path, 'rb') as f:
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+
+            with engine.begin() as conn:
+                # Rows cannot arrive for a closed month, but never drop what was not written out
+                total = conn.execute(text(f"SELECT COUNT(*) FROM {table.name}")).scalar()
+                if total != count:
+                    logger.error(f"Partition {table.name} changed during archival ({count} written, {total} now), keeping it")
+                    continue
+                table.drop(conn)
+                if self._known is not None:
+                    self._known = self._known - {suffix}
+                self.rebuild_view(conn)
+            archived.append(path)
+            logger.info(f"Archived {count} rows from {table.name} to {path}")
+        return archived
+
+class PartitionMaintenance:
+    """Background upkeep for partitioned tables
+
+    Each pass moves pre-partitioning rows out of the base tables, creates
+    the current and next month ahead of time (so month rollover does not put
+    DDL on the insert path) and archives months past retention.
+    """
+
+    def __init__(self, partition_sets: List[MonthlyPartitions], interval: float = 3600):
+        self.partition_sets = partition_sets
+        self.interval = interval
+        self.engine = None
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, engine) -> None:
+        self.engine = engine
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def run_once(self) -> None:
+        current = month_suffix(datetime.utcnow())
+        for partitions in self.partition_sets:
+            try:
+                with self.engine.begin() as conn:
+                    partitions.refresh(conn)  # Pick up months other workers created or archived
+                    partitions.ensure(conn, current)
+                    partitions.ensure(conn, next_month(current))
+                moved = partitions.adopt_base_rows(self.engine)
+                if moved:
+                    logger.info(f"Moved {moved} rows from {partitions.name} into monthly partitions")
+                partitions.archive(self.engine)
+            except Exception as e:
+                logger.error(f"Partition maintenance failed for {partitions.name}: {str(e)}")
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self.run_once()
+            self._wake.wait(self.interval)
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wake.set()
+
+# Global instances
+audit_partitions = MonthlyPartitions(AuditLog)
+analytics_partitions = MonthlyPartitions(ProjectAnalytics)
+partition_maintenance = PartitionMaintenance([audit_partitions, analytics_partitions])
@@ -0,0 +1,724 @@
+"""
+Project Storage Module
+Sharded project layout, on-disk project index, expiry tracking, restart-safe cleanup
+and cold-storage tiering for generated project directories
+"""
+
+import os
+import re
+import json
+import heapq
+import hashlib
+import shutil
+import sqlite3
+import tarfile
+import threading
+import time
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, List, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+META_DIR_NAME = '.meta'  # Pre-index metadata files, migrated on load
+INDEX_FILE_NAME = '.index.sqlite3'
+ARCHIVE_DIR_NAME = '.archive'
+SWEEP_LOCK_NAME = '.sweep.lock'
+LOCK_DIR_NAME = '.locks'  # Per-project locks shared by archival, rehydration and downloads
+SHARD_DIR_PATTERN = re.compile(r'^[0-9a-f]{2}$')
+ARCHIVE_SUFFIX = '.tar.zst' if zstandard else '.tar.xz'
+
+# Caches and intermediates that are cheap to rebuild and not worth archiving
+ARCHIVE_SKIP_DIRS = {'.gradle', '.idea'}
+
+# Directories left out of project downloads and manifests
+DOWNLOAD_SKIP_DIRS = {'build', '.gradle', '.idea'}
+
+class FileLock:
+    """Cross-process advisory lock backed by a lock file
+
+    Shared locks admit any number of shared holders and exclude exclusive
+    ones (Windows has no shared mode, so there they are exclusive too).
+    """
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared
+        self._fd = None
+
+    def acquire(self, blocking: bool = False) -> bool:
+        """Acquire the lock, returns False if another process holds it"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if fcntl:
+                flags = fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX
+                if not blocking:
+                    flags |= fcntl.LOCK_NB
+                fcntl.flock(fd, flags)
+            else:
+                mode = msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK
+                msvcrt.locking(fd, mode, 1)
+        except OSError:
+            os.close(fd)
+            return False
+
+        self._fd = fd
+        return True
+
+    def release(self) -> None:
+        """Release the lock if held"""
+        if self._fd is None:
+            return
+        try:
+            if fcntl:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            else:
+                os.lseek(self._fd, 0, os.SEEK_SET)
+                msvcrt.locking(self._fd, msvcrt.LK_UNLCK, 1)
+        finally:
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        self.acquire(blocking=True)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+class ExpiryIndex:
+    """Min-heap of expiry times with lazy deletion of superseded entries"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, str]] = []
+        self._expiry: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def add(self, key: str, expires_at: float) -> None:
+        """Add or reschedule a key"""
+        with self._lock:
+            self._expiry[key] = expires_at
+            heapq.heappush(self._heap, (expires_at, key))
+
+    def remove(self, key: str) -> None:
+        """Forget a key; its heap entry is discarded when it surfaces"""
+        with self._lock:
+            self._expiry.pop(key, None)
+
+    def pop_expired(self, now: float) -> List[str]:
+        """Pop every key whose expiry is at or before now"""
+        expired = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                expires_at, key = heapq.heappop(self._heap)
+                if self._expiry.get(key) != expires_at:
+                    continue  # Removed or rescheduled
+                del self._expiry[key]
+                expired.append(key)
+        return expired
+
+    def next_expiry(self) -> Optional[float]:
+        """Earliest live expiry time, or None when empty"""
+        with self._lock:
+            while self._heap and self._expiry.get(self._heap[0][1]) != self._heap[0][0]:
+                heapq.heappop(self._heap)
+            return self._heap[0][0] if self._heap else None
+
+    def __len__(self) -> int:
+        return len(self._expiry)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._expiry
+
+class ProjectIndex:
+    """SQLite index mapping project IDs to storage paths and metadata"""
+
+    COLUMNS = ('project_id', 'folder', 'created_at', 'expires_at', 'last_accessed',
+               'tier', 'archive', 'contents', 'metadata')
+    JSON_COLUMNS = ('contents', 'metadata')
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS projects (
+                    project_id TEXT PRIMARY KEY,
+                    folder TEXT NOT NULL,
+                    created_at TEXT NOT NULL,
+                    expires_at TEXT NOT NULL,
+                    last_accessed TEXT,
+                    tier TEXT NOT NULL DEFAULT 'hot',
+                    archive TEXT,
+                    contents TEXT,
+                    metadata TEXT
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS manifests (
+                    project_id TEXT PRIMARY KEY,
+                    manifest_hash TEXT NOT NULL,
+                    files TEXT NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_manifest_hash ON manifests (manifest_hash)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _to_row(self, meta: Dict[str, Any]) -> Tuple:
+        return tuple(
+            json.dumps(meta.get(col)) if col in self.JSON_COLUMNS and meta.get(col) is not None
+            else meta.get(col)
+            for col in self.COLUMNS
+        )
+
+    def _from_row(self, row: Tuple) -> Dict[str, Any]:
+        meta = dict(zip(self.COLUMNS, row))
+        for col in self.JSON_COLUMNS:
+            if meta[col] is not None:
+                meta[col] = json.loads(meta[col])
+        return {k: v for k, v in meta.items() if v is not None}
+
+    def put(self, meta: Dict[str, Any]) -> None:
+        """Insert or replace a project entry"""
+        self.put_many([meta])
+
+    def put_many(self, metas: List[Dict[str, Any]]) -> None:
+        """Insert or replace project entries in one transaction"""
+        placeholders = ', '.join('?' for _ in self.COLUMNS)
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO projects ({', '.join(self.COLUMNS)}) VALUES ({placeholders})",
+                    [self._to_row(meta) for meta in metas]
+                )
+
+    def get(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Look up a project entry by ID"""
+        with self._lock:
+            row = self._connection().execute(
+                f"SELECT {', '.join(self.COLUMNS)} FROM projects WHERE project_id = ?",
+                (project_id,)
+            ).fetchone()
+        return self._from_row(row) if row else None
+
+    def delete(self, project_id: str) -> None:
+        """Remove a project entry"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute('DELETE FROM projects WHERE project_id = ?', (project_id,))
+                conn.execute('DELETE FROM manifests WHERE project_id = ?', (project_id,))
+
+    def put_manifest(self, project_id: str, manifest_hash: str, files: Dict[str, str]) -> None:
+        """Store a project's file manifest"""
+        with self._lock:
+            conn = self._connection()
+            with conn:
+                conn.execute(
+                    'INSERT OR REPLACE INTO manifests (project_id, manifest_hash, files) VALUES (?, ?, ?)',
+                    (project_id, manifest_hash, json.dumps(files, separators=(',', ':')))
+                )
+
+    def get_manifest(self, project_id: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(manifest_hash, files) for a project"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT manifest_hash, files FROM manifests WHERE project_id = ?', (project_id,)
+            ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def find_manifest(self, manifest_hash: str) -> Optional[Dict[str, str]]:
+        """Files of any stored manifest with the given hash"""
+        with self._lock:
+            row = self._connection().execute(
+                'SELECT files FROM manifests WHERE manifest_hash = ? LIMIT 1', (manifest_hash,)
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def iter_schedule(self) -> List[Tuple[str, str, Optional[str], str]]:
+        """(project_id, expires_at, last_accessed, tier) for every project"""
+        with self._lock:
+            return self._connection().execute(
+                'SELECT project_id, expires_at, last_accessed, tier FROM projects'
+            ).fetchall()
+
+    def folders(self) -> set:
+        """Relative storage paths of all indexed projects"""
+        with self._lock:
+            return {row[0] for row in self._connection().execute('SELECT folder FROM projects')}
+
+class ProjectStorage:
+    """Generated project storage with a sharded layout, project index and cold tier"""
+
+    def __init__(self, root: str, retention_hours: float = 24, idle_hours: float = 0):
+        self.root = root
+        self.retention = timedelta(hours=retention_hours)
+        self.idle_seconds = idle_hours * 3600  # 0 disables tiering
+        self.meta_dir = os.path.join(root, META_DIR_NAME)
+        self.archive_dir = os.path.join(root, ARCHIVE_DIR_NAME)
+        self.index = ProjectIndex(os.path.join(root, INDEX_FILE_NAME))
+        self.expiry_index = ExpiryIndex()
+        self.idle_index = ExpiryIndex()
+        self.sweep_lock = FileLock(os.path.join(root, SWEEP_LOCK_NAME))
+        self.tier_lock = threading.Lock()
+
+    @staticmethod
+    def shard_for(project_id: str) -> str:
+        """Two-level shard prefix derived from the project ID"""
+        key = project_id.replace('-', '').lower()
+        return os.path.join(key[:2], key[2:4])
+
+    def project_lock(self, project_id: str, shared: bool = False) -> FileLock:
+        """Cross-process lock on a project's directory
+
+        Readers (downloads) take it shared; archive, rehydrate and delete
+        take it exclusive. Lock files are never removed, since a process
+        holding or waiting on an unlinked file would no longer exclude
+        anyone locking the new one.
+        """
+        return FileLock(
+            os.path.join(self.root, LOCK_DIR_NAME, self.shard_for(project_id), f"{project_id}.lock"), shared
+        )
+
+    def _write_meta(self, meta: Dict[str, Any]) -> None:
+        self.index.put(meta)
+
+    def read_meta(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Read project metadata, None if unknown"""
+        return self.index.get(project_id)
+
+    def _new_meta(self, project_id: str, folder: str, created_at: datetime,
+                  metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        return {
+            'project_id': project_id,
+            'folder': folder,
+            'created_at': created_at.isoformat(),
+            'expires_at': (created_at + self.retention).isoformat(),
+            'last_accessed': created_at.isoformat(),
+            'tier': 'hot',
+            'metadata': metadata or {}
+        }
+
+    def register(self, project_id: str, folder_name: str, created_at: datetime = None,
+                 metadata: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Record a new project in its shard and schedule its expiry"""
+        created_at = created_at or datetime.utcnow()
+        folder = os.path.join(self.shard_for(project_id), folder_name).replace(os.sep, '/')
+        meta = self._new_meta(project_id, folder, created_at, metadata)
+        self._write_meta(meta)
+        self._schedule(meta)
+        return meta
+
+    def update_metadata(self, project_id: str, **fields) -> None:
+        """Merge fields into a project's stored metadata"""
+        meta = self.read_meta(project_id)
+        if not meta:
+            return
+        meta.setdefault('metadata', {}).update(fields)
+        self._write_meta(meta)
+
+    def save_manifest(self, project_id: str, project_path: str) -> str:
+        """Hash the project's downloadable files once and store the manifest"""
+        files = build_manifest(project_path)
+        manifest_hash = manifest_digest(files)
+        self.index.put_manifest(project_id, manifest_hash, files)
+        return manifest_hash
+
+    def get_manifest(self, project_id: str) -> Optional[Tuple[str, Dict[str, str]]]:
+        """(manifest_hash, files) for a project, None if never hashed"""
+        return self.index.get_manifest(project_id)
+
+    def find_manifest(self, manifest_hash: str) -> Optional[Dict[str, str]]:
+        """Look up a previously issued manifest by its hash"""
+        return self.index.find_manifest(manifest_hash)
+
+    def _schedule(self, meta: Dict[str, Any]) -> None:
+        expires_at = datetime.fromisoformat(meta['expires_at'])
+        self.expiry_index.add(meta['project_id'], _timestamp(expires_at))
+        self._schedule_idle(meta)
+
+    def _schedule_idle(self, meta: Dict[str, Any]) -> None:
+        """Schedule a hot project for archival once it goes idle"""
+        if not self.idle_seconds or meta.get('tier', 'hot') != 'hot':
+            return
+        last_accessed = datetime.fromisoformat(meta.get('last_accessed') or meta['created_at'])
+        self.idle_index.add(meta['project_id'], _timestamp(last_accessed) + self.idle_seconds)
+
+    def touch(self, project_id: str) -> None:
+        """Record an access, postponing archival"""
+        meta = self.read_meta(project_id)
+        if not meta:
+            return
+        meta['last_accessed'] = datetime.utcnow().isoformat()
+        self._write_meta(meta)
+        self._schedule_idle(meta)
+
+    def load_index(self) -> int:
+        """Rebuild the in-memory schedules from the project index"""
+        self._migrate_legacy()
+
+        loaded = 0
+        for project_id, expires_at, last_accessed, tier in self.index.iter_schedule():
+            try:
+                self._schedule({
+                    'project_id': project_id,
+                    'expires_at': expires_at,
+                    'last_accessed': last_accessed,
+                    'created_at': expires_at,
+                    'tier': tier
+                })
+            except ValueError as e:
+                logger.warning(f"Skipping unreadable index entry {project_id}: {e}")
+                continue
+            loaded += 1
+
+        logger.info(f"Expiry index loaded with {loaded} projects")
+        return loaded
+
+    def _migrate_legacy(self) -> None:
+        """Import pre-index metadata files and adopt unindexed flat directories"""
+        migrated = []
+
+        if os.path.isdir(self.meta_dir):
+            for entry in os.scandir(self.meta_dir):
+                if not entry.name.endswith('.json'):
+                    continue
+                try:
+                    with open(entry.path, encoding='utf-8') as f:
+                        meta = json.load(f)
+                    datetime.fromisoformat(meta['expires_at'])
+                except (OSError, ValueError, KeyError) as e:
+                    logger.warning(f"Skipping unreadable project metadata {entry.name}: {e}")
+                    continue
+                if meta.get('archive') and '/' not in meta['archive']:
+                    legacy_index = os.path.join(self.archive_dir, f"{meta['project_id']}.index.json")
+                    try:
+                        with open(legacy_index, encoding='utf-8') as f:
+                            meta['contents'] = json.load(f)
+                        os.remove(legacy_index)
+                    except (OSError, ValueError):
+                        pass
+                migrated.append(meta)
+
+        # Directories written before metadata existed are dated by mtime
+        if os.path.isdir(self.root):
+            known_folders = self.index.folders() | {meta.get('folder') for meta in migrated}
+            for entry in os.scandir(self.root):
+                if (not entry.is_dir() or entry.name.startswith('.')
+                        or SHARD_DIR_PATTERN.match(entry.name) or entry.name in known_folders):
+                    continue
+                created_at = datetime.utcfromtimestamp(entry.stat().st_mtime)
+                migrated.append(self._new_meta(entry.name, entry.name, created_at))
+
+        if migrated:
+            self.index.put_many(migrated)
+            logger.info(f"Migrated {len(migrated)} legacy projects into the project index")
+        if os.path.isdir(self.meta_dir):
+            shutil.rmtree(self.meta_dir, ignore_errors=True)
+
+    def project_path(self, project_id: str) -> Optional[str]:
+        """Resolve a project ID to its directory"""
+        meta = self.read_meta(project_id)
+        if meta and meta.get('folder'):
+            return os.path.join(self.root, meta['folder'])
+        return None
+
+    def delete(self, project_id: str) -> bool:
+        """Remove project files, archive and metadata; False if the project is in use"""
+        lock = self.project_lock(project_id)
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            self._delete(project_id)
+        finally:
+            lock.release()
+        return True
+
+    def _delete(self, project_id: str) -> None:
+        meta = self.read_meta(project_id)
+        if meta and meta.get('folder'):
+            project_path = os.path.join(self.root, meta['folder'])
+            if os.path.exists(project_path):
+                shutil.rmtree(project_path, ignore_errors=True)
+        if meta and meta.get('archive'):
+            archive_path = self._archive_path(meta)
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+        self.index.delete(project_id)
+        self.expiry_index.remove(project_id)
+        self.idle_index.remove(project_id)
+
+    # Cold storage tier
+    def _archive_path(self, meta: Dict[str, Any]) -> str:
+        return os.path.join(self.archive_dir, meta['archive'])
+
+    def is_archived(self, project_id: str) -> bool:
+        """Check whether a project currently lives in the cold tier"""
+        meta = self.read_meta(project_id)
+        return bool(meta and meta.get('tier') == 'cold')
+
+    def read_archive_index(self, project_id: str) -> Optional[Dict[str, Any]]:
+        """Read the content index of an archived project"""
+        meta = self.read_meta(project_id)
+        if not meta or meta.get('tier') != 'cold':
+            return None
+        return meta.get('contents')
+
+    def archive(self, project_id: str, now: float = None) -> bool:
+        """Pack an idle project directory into a single compressed archive
+
+        Skipped while another thread or worker holds the project lock, and
+        when the shared index shows an access since the sweep picked it.
+        """
+        lock = self.project_lock(project_id)
+        if not lock.acquire(blocking=False):
+            return False
+        try:
+            return self._archive(project_id, now or time.time())
+        finally:
+            lock.release()
+
+    def _archive(self, project_id: str, now: float) -> bool:
+        with self.tier_lock:
+            meta = self.read_meta(project_id)
+            if not meta or meta.get('tier') != 'hot':
+                return False
+            project_path = os.path.join(self.root, meta['folder'])
+            if not os.path.isdir(project_path):
+                return False
+            last_accessed = datetime.fromisoformat(meta.get('last_accessed') or meta['created_at'])
+            if now - _timestamp(last_accessed) < self.idle_seconds:
+                self._schedule_idle(meta)
+                return False
+
+            meta['archive'] = os.path.join(
+                self.shard_for(project_id), f"{project_id}{ARCHIVE_SUFFIX}"
+            ).replace(os.sep, '/')
+            archive_path = self._archive_path(meta)
+            os.makedirs(os.path.dirname(archive_path), exist_ok=True)
+            tmp_path = f"{archive_path}.tmp"
+            files = []
+
+            def _filter(info):
+                parts = info.name.split('/')
+                if any(part in ARCHIVE_SKIP_DIRS for part in parts):
+                    return None
+                # Keep build outputs (the APK), drop the rest of build/
+                for i, part in enumerate(parts[:-1]):
+                    if part == 'build' and parts[i + 1] != 'outputs':
+                        return None
+                if info.isfile():
+                    files.append({'path': os.path.normpath(info.name).replace(os.sep, '/'), 'size': info.size})
+                return info
+
+            with open(tmp_path, 'wb') as raw:
+                if zstandard:
+                    with zstandard.ZstdCompressor(level=10).stream_writer(raw) as writer:
+                        with tarfile.open(fileobj=writer, mode='w|') as tar:
+                            tar.add(project_path, arcname='.', filter=_filter)
+                else:
+                    with tarfile.open(fileobj=raw, mode='w:xz') as tar:
+                        tar.add(project_path, arcname='.', filter=_filter)
+
+            os.replace(tmp_path, archive_path)
+
+            meta['contents'] = {
+                'files': files,
+                'file_count': len(files),
+                'total_size': sum(entry['size'] for entry in files),
+                'archived_at': datetime.utcnow().isoformat()
+            }
+            meta['tier'] = 'cold'
+            self._write_meta(meta)
+            shutil.rmtree(project_path, ignore_errors=True)
+            self.idle_index.remove(project_id)
+
+        logger.info(f"Archived idle project {project_id} to cold storage")
+        return True
+
+    def rehydrate(self, project_id: str) -> Optional[str]:
+        """Restore an archived project to its directory, returns the path"""
+        with self.project_lock(project_id):
+            return self._rehydrate(project_id)
+
+    @contextmanager
+    def checkout(self, project_id: str):
+        """Yield the project's directory (None if unknown), restored and held against archival
+
+        Concurrent checkouts share the lock; only restoring a cold project
+        briefly takes it exclusively.
+        """
+        while True:
+            meta = self.read_meta(project_id)
+            if meta and meta.get('tier') == 'cold':
+                self.rehydrate(project_id)
+            with self.project_lock(project_id, shared=True):
+                meta = self.read_meta(project_id)
+                if meta and meta.get('tier') == 'cold':
+                    continue  # Archived again before the shared lock was taken
+                self.touch(project_id)
+                yield self.project_path(project_id)
+                return
+
+    def _rehydrate(self, project_id: str) -> Optional[str]:
+        with self.tier_lock:
+            meta = self.read_meta(project_id)
+            if not meta:
+                return None
+            project_path = os.path.join(self.root, meta['folder'])
+            if meta.get('tier') != 'cold':
+                return project_path
+
+            archive_path = self._archive_path(meta)
+            tmp_path = f"{project_path}.rehydrate"
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            with open(archive_path, 'rb') as raw:
+                if zstandard:
+                    with zstandard.ZstdDecompressor().stream_reader(raw) as reader:
+                        with tarfile.open(fileobj=reader, mode='r|') as tar:
+                            _safe_extract(tar, tmp_path)
+                else:
+                    with tarfile.open(fileobj=raw, mode='r:xz') as tar:
+                        _safe_extract(tar, tmp_path)
+            os.replace(tmp_path, project_path)
+
+            if os.path.exists(archive_path):
+                os.remove(archive_path)
+            meta.pop('archive', None)
+            meta.pop('contents', None)
+            meta['tier'] = 'hot'
+            meta['last_accessed'] = datetime.utcnow().isoformat()
+            self._write_meta(meta)
+            self._schedule_idle(meta)
+
+        logger.info(f"Rehydrated project {project_id} from cold storage")
+        return project_path
+
+    def tier_idle(self, now: float = None) -> List[str]:
+        """Archive every project that has been idle past the threshold"""
+        archived = []
+        for project_id in self.idle_index.pop_expired(now or time.time()):
+            try:
+                if self.archive(project_id, now):
+                    archived.append(project_id)
+            except (OSError, tarfile.TarError) as e:
+                logger.error(f"Failed to archive project {project_id}: {e}")
+        return archived
+
+    def sweep(self, now: float = None) -> Optional[List[str]]:
+        """Delete expired projects, returns None if another worker is sweeping"""
+        if not self.sweep_lock.acquire(blocking=False):
+            return None
+
+        try:
+            removed = []
+            now = now or time.time()
+            for project_id in self.expiry_index.pop_expired(now):
+                try:
+                    if self.delete(project_id):
+                        removed.append(project_id)
+                    else:
+                        # Being downloaded or restored; try again shortly
+                        self.expiry_index.add(project_id, now + 60)
+                except OSError as e:
+                    logger.error(f"Failed to remove expired project {project_id}: {e}")
+            if removed:
+                logger.info(f"Cleaned up {len(removed)} expired projects")
+            if self.idle_seconds:
+                self.tier_idle(now)
+            return removed
+        finally:
+            self.sweep_lock.release()
+
+    def run_sweeper(self, on_expired: Callable[[str], None] = None,
+                    max_interval: float = 300) -> None:
+        """Sweep loop that wakes at the next expiry, capped at max_interval"""
+        while True:
+            try:
+                removed = self.sweep()
+                for project_id in removed or []:
+                    if on_expired:
+                        on_expired(project_id)
+            except Exception as e:
+                logger.error(f"Error in cleanup: {e}")
+
+            pending = [t for t in (self.expiry_index.next_expiry(), self.idle_index.next_expiry())
+                       if t is not None]
+            delay = max_interval
+            if pending:
+                delay = min(max_interval, max(min(pending) - time.time(), 1))
+            time.sleep(delay)
+
+def iter_project_files(project_path: str):
+    """Yield (relative_path, absolute_path) for downloadable project files"""
+    for root, dirs, files in os.walk(project_path):
+        # Skip build directories
+        dirs[:] = [d for d in dirs if d not in DOWNLOAD_SKIP_DIRS]
+
+        for file in files:
+            file_path = os.path.join(root, file)
+            yield os.path.relpath(file_path, project_path).replace(os.sep, '/'), file_path
+
+def build_manifest(project_path: str) -> Dict[str, str]:
+    """Map each downloadable file to its SHA-256"""
+    manifest = {}
+    for rel_path, file_path in iter_project_files(project_path):
+        digest = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), b''):
+                digest.update(chunk)
+        manifest[rel_path] = digest.hexdigest()
+    return manifest
+
+def manifest_digest(files: Dict[str, str]) -> str:
+    """Stable hash identifying a whole manifest"""
+    digest = hashlib.sha256()
+    for rel_path in sorted(files):
+        digest.update(f"{rel_path}\0{files[rel_path]}\n".encode('utf-8'))
+    return digest.hexdigest()
+
+def diff_manifests(base: Dict[str, str], target: Dict[str, str]) -> Dict[str, List[str]]:
+    """Added, changed and deleted paths going from base to target"""
+    return {
+        'added': sorted(path for path in target if path not in base),
+        'changed': sorted(path for path in target if path in base and base[path] != target[path]),
+        'deleted': sorted(path for path in base if path not in target)
+    }
+
+def _safe_extract(tar: tarfile.TarFile, path: str) -> None:
+    """Extract a tar stream, refusing members that escape the target"""
+    root = os.path.realpath(path)
+    for member in tar:
+        target = os.path.realpath(os.path.join(root, member.name))
+        if target != root and not target.startswith(root + os.sep):
+            raise tarfile.TarError(f"Unsafe archive member {member.name}")
+        if member.issym() or member.islnk():
+            continue
+        tar.extract(member, root)
+
+def _timestamp(value: datetime) -> float:
+    """Convert a naive UTC datetime to a POSIX timestamp"""
+    return (value - datetime(1970, 1, 1)).total_seconds()
@@ -5,8 +5,11 @@ WebSocket support for live updates, notifications, and collaborative features
 
 import json
 import time
+import itertools
+from contextlib import contextmanager
+from collections import OrderedDict, deque
 from datetime import datetime
-from typing import Dict, Any, Optional, Callable, List
+from typing import Dict, Any, Optional, Callable, List, Set, Tuple, Hashable, Deque
 from threading import Lock
 import logging
 from flask import request
@@ -14,23 +17,160 @@ from flask_socketio import SocketIO, emit, join_room, leave_room, disconnect
 from flask_jwt_extended import decode_token
 import eventlet
 
+from models import Notification
+from database import begin_write
+from status_events import ProgressCoalescer
+from realtime_bus import MessageBus, LocalMessageBus, create_message_bus
+
 logger = logging.getLogger(__name__)
 
+class EventQueue:
+    """Bounded ordered queue of outgoing events
+
+    Events sharing a conflation key replace the queued one (only the latest
+    progress matters). When full, the oldest conflatable event is dropped
+    first so one-off events such as completions survive slow consumers.
+    """
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.events: 'OrderedDict[Any, Tuple[str, Dict[str, Any]]]' = OrderedDict()
+        self.dropped = 0
+        self._counter = itertools.count()
+        self._lock = Lock()
+
+    def put(self, event: str, data: Dict[str, Any], key: Optional[Hashable] = None):
+        """Queue an event, conflating it with any queued event under the same key"""
+        # Unkeyed events get a unique int key, conflatable keys are tuples
+        slot = ('c', key) if key is not None else None
+        with self._lock:
+            if slot is not None and slot in self.events:
+                # Replacing moves the event to the newest position without evicting anything
+                del self.events[slot]
+            elif len(self.events) >= self.maxsize:
+                stale = next((k for k in self.events if isinstance(k, tuple)), None)
+                if stale is not None:
+                    del self.events[stale]
+                else:
+                    self.events.popitem(last=False)
+                self.dropped += 1
+            self.events[slot if slot is not None else next(self._counter)] = (event, data)
+
+    def drain(self, limit: int = None) -> List[Tuple[str, Dict[str, Any], Optional[Hashable]]]:
+        """Remove and return up to limit queued events in order"""
+        drained = []
+        with self._lock:
+            while self.events and (limit is None or len(drained) < limit):
+                key, (event, data) = self.events.popitem(last=False)
+                drained.append((event, data, key[1] if isinstance(key, tuple) else None))
+        return drained
+
+    def __len__(self) -> int:
+        return len(self.events)
+
+def _hashable(key: Any) -> Hashable:
+    """Restore tuple conflation keys that went through JSON as lists"""
+    if isinstance(key, list):
+        return tuple(_hashable(item) for item in key)
+    return key
+
+class TimingWheel:
+    """Hashed timing wheel for a fixed timeout
+
+    Every touch reschedules an item into the slot timeout ticks ahead of the
+    cursor, so touch, remove and advancing one tick are all O(1) per item.
+    """
+
+    def __init__(self, timeout: float, resolution: float = 1.0):
+        self.resolution = resolution
+        self.timeout_ticks = max(1, int(-(-timeout // resolution)))
+        self.slots: List[Set[Hashable]] = [set() for _ in range(self.timeout_ticks + 1)]
+        self.positions: Dict[Hashable, int] = {}
+        self.cursor = 0
+        self.last_tick = time.time()
+
+    def touch(self, item: Hashable):
+        """Add or reschedule item to expire timeout seconds from now"""
+        slot = self.positions.get(item)
+        if slot is not None:
+            self.slots[slot].discard(item)
+        slot = (self.cursor + self.timeout_ticks) % len(self.slots)
+        self.slots[slot].add(item)
+        self.positions[item] = slot
+
+    def remove(self, item: Hashable):
+        slot = self.positions.pop(item, None)
+        if slot is not None:
+            self.slots[slot].discard(item)
+
+    def advance(self, now: float = None) -> List[Hashable]:
+        """Move the cursor for the time elapsed, returns the items that expired"""
+        now = now or time.time()
+        expired = []
+        while now - self.last_tick >= self.resolution:
+            self.last_tick += self.resolution
+            self.cursor = (self.cursor + 1) % len(self.slots)
+            bucket = self.slots[self.cursor]
+            if bucket:
+                self.slots[self.cursor] = set()
+                for item in bucket:
+                    del self.positions[item]
+                expired.extend(bucket)
+        return expired
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
 class RealtimeManager:
-    """Real-time communication manager using Socket.IO"""
+    """Real-time communication manager using Socket.IO
 
-    def __init__(self, app=None, cors_allowed_origins="*"):
+    Room broadcasts are queued per room and fanned out on a short tick into
+    bounded per-client queues, which are drained a few events at a time so
+    a large room never monopolises the event loop.
+    """
+
+    def __init__(self, app=None, cors_allowed_origins="*", tick_interval: float = 0.1,
+                 client_queue_size: int = 64, sends_per_tick: int = 32, yield_every: int = 100,
+                 progress_hz: float = 4.0, heartbeat_timeout: float = 60,
+                 heartbeat_resolution: float = 1.0):
         self.app = app
         self.socketio = None
+        self.tick_interval = tick_interval
+        self.client_queue_size = client_queue_size
+        self.sends_per_tick = sends_per_tick
+        self.yield_every = yield_every
         self.connected_clients: Dict[str, Dict[str, Any]] = {}
-        self.project_rooms: Dict[str, List[str]] = {}
+        self.project_rooms: Dict[str, Set[str]] = {}
+        self.user_clients: Dict[Any, Set[str]] = {}
+        self.room_queues: Dict[str, EventQueue] = {}
+        self.client_queues: Dict[str, EventQueue] = {}
+        self.dirty_clients: Set[str] = set()
+        self.dropped_events = 0
         self.client_lock = Lock()
+        # Rate-limits progress and project updates, flushed from the fan-out tick
+        self.coalescer = ProgressCoalescer(self._emit_coalesced, progress_hz, background=False)
+        self.tick_callbacks: List[Callable[[], None]] = []
+        # Carries broadcasts between processes; in-process until a message queue is configured
+        self.bus: MessageBus = LocalMessageBus()
+        self.bus.subscribe(self._on_bus_message)
+        # Clients silent for heartbeat_timeout seconds whose Engine.IO transport is also gone are evicted
+        self.heartbeats = TimingWheel(heartbeat_timeout, heartbeat_resolution)
+        self.evicted_clients = 0
+        self.subscription_count = 0
+        self._transport_check_warned = False
+        self._flusher_started = False
 
         if app:
             self.init_app(app, cors_allowed_origins)
 
-    def init_app(self, app, cors_allowed_origins="*"):
-        """Initialize with Flask app"""
+    def init_app(self, app, cors_allowed_origins="*", message_queue: str = None,
+                 channel: str = 'codecraft-realtime'):
+        """Initialize with Flask app
+
+        With a message_queue URL (e.g. redis://host:6379/1) every node
+        receives broadcasts published by any process and delivers them to
+        its own clients.
+        """
         self.socketio = SocketIO(
             app,
             cors_allowed_origins=cors_allowed_origins,
@@ -42,6 +182,14 @@ class RealtimeManager:
         # Register event handlers
         self._register_handlers()
 
+        if message_queue:
+            self._set_bus(create_message_bus(message_queue, channel), self.socketio.start_background_task)
+
+        # Start the fan-out tick
+        if not self._flusher_started:
+            self._flusher_started = True
+            self.socketio.start_background_task(self._flush_loop)
+
         logger.info("Real-time manager initialized")
 
     def _register_handlers(self):
@@ -71,8 +219,11 @@ class RealtimeManager:
                     self.connected_clients[client_id] = {
                         'user_id': user_id,
                         'connected_at': datetime.utcnow(),
-                        'rooms': []
+                        'rooms': set()
                     }
+                    self.user_clients.setdefault(user_id, set()).add(client_id)
+                    self.client_queues[client_id] = EventQueue(self.client_queue_size)
+                    self.heartbeats.touch(client_id)
 
                 logger.info(f"Client {client_id} connected for user {user_id}")
                 emit('connected', {'status': 'success', 'client_id': client_id})
@@ -85,20 +236,11 @@ class RealtimeManager:
         @self.socketio.on('disconnect')
         def handle_disconnect():
             """Handle client disconnection"""
+            # Socket.IO drops the sid from its rooms itself; only our indexes need updating
             client_id = request.sid
-            with self.client_lock:
-                if client_id in self.connected_clients:
-                    user_id = self.connected_clients[client_id]['user_id']
-                    rooms = self.connected_clients[client_id]['rooms']
-
-                    # Leave all rooms
-                    for room in rooms:
-                        leave_room(room)
-                        self._remove_from_room(room, client_id)
-
-                    del self.connected_clients[client_id]
-
-                    logger.info(f"Client {client_id} disconnected (user {user_id})")
+            client_info = self._forget_client(client_id)
+            if client_info:
+                logger.info(f"Client {client_id} disconnected (user {client_info['user_id']})")
 
         @self.socketio.on('join_project')
         def handle_join_project(data):
@@ -110,15 +252,16 @@ class RealtimeManager:
                     return
 
                 client_id = request.sid
+                self.touch(client_id)
                 with self.client_lock:
                     if client_id not in self.connected_clients:
                         emit('error', {'message': 'Not authenticated'})
                         return
 
-                    join_room(project_id)
-                    self.connected_clients[client_id]['rooms'].append(project_id)
+                    self.connected_clients[client_id]['rooms'].add(project_id)
                     self._add_to_room(project_id, client_id)
 
+                join_room(project_id)
                 logger.info(f"Client {client_id} joined project {project_id}")
                 emit('joined_project', {'project_id': project_id})
 
@@ -135,13 +278,15 @@ class RealtimeManager:
                     return
 
                 client_id = request.sid
+                self.touch(client_id)
                 with self.client_lock:
-                    if client_id in self.connected_clients:
-                        if project_id in self.connected_clients[client_id]['rooms']:
-                            leave_room(project_id)
-                            self.connected_clients[client_id]['rooms'].remove(project_id)
-                            self._remove_from_room(project_id, client_id)
+                    client_info = self.connected_clients.get(client_id)
+                    if not client_info or project_id not in client_info['rooms']:
+                        return
+                    client_info['rooms'].discard(project_id)
+                    self._remove_from_room(project_id, client_id)
 
+                leave_room(project_id)
                 logger.info(f"Client {client_id} left project {project_id}")
 
             except Exception as e:
@@ -151,6 +296,7 @@ class RealtimeManager:
         def handle_project_update(data):
             """Handle project update notifications"""
             try:
+                self.touch(request.sid)
                 project_id = data.get('project_id')
                 update_type = data.get('type', 'general')
                 update_data = data.get('data', {})
@@ -168,51 +314,253 @@ class RealtimeManager:
         @self.socketio.on('ping')
         def handle_ping():
             """Handle ping for connection health check"""
+            self.touch(request.sid)
             emit('pong', {'timestamp': datetime.utcnow().isoformat()})
 
     def _add_to_room(self, room: str, client_id: str):
-        """Add client to room tracking"""
-        if room not in self.project_rooms:
-            self.project_rooms[room] = []
-        if client_id not in self.project_rooms[room]:
-            self.project_rooms[room].append(client_id)
+        """Add client to room tracking, called with client_lock held"""
+        clients = self.project_rooms.setdefault(room, set())
+        if client_id not in clients:
+            clients.add(client_id)
+            self.subscription_count += 1
 
     def _remove_from_room(self, room: str, client_id: str):
-        """Remove client from room tracking"""
-        if room in self.project_rooms:
-            if client_id in self.project_rooms[room]:
-                self.project_rooms[room].remove(client_id)
-            if not self.project_rooms[room]:
-                del self.project_rooms[room]
-
-    def broadcast_to_project(self, project_id: str, event: str, data: Dict[str, Any]):
-        """Broadcast event to all clients in project room"""
+        """Remove client from room tracking, called with client_lock held"""
+        clients = self.project_rooms.get(room)
+        if clients is None or client_id not in clients:
+            return
+        clients.discard(client_id)
+        self.subscription_count -= 1
+        if not clients:
+            del self.project_rooms[room]
+
+    def _forget_client(self, client_id: str) -> Optional[Dict[str, Any]]:
+        """Drop a client from every index, returns its info"""
+        with self.client_lock:
+            client_info = self.connected_clients.pop(client_id, None)
+            if client_info is None:
+                return None
+            for room in client_info['rooms']:
+                self._remove_from_room(room, client_id)
+
+            user_clients = self.user_clients.get(client_info['user_id'])
+            if user_clients is not None:
+                user_clients.discard(client_id)
+                if not user_clients:
+                    del self.user_clients[client_info['user_id']]
+
+            self.heartbeats.remove(client_id)
+            queue = self.client_queues.pop(client_id, None)
+            if queue:
+                self.dropped_events += queue.dropped
+            self.dirty_clients.discard(client_id)
+        return client_info
+
+    def broadcast_to_project(self, project_id: str, event: str, data: Dict[str, Any],
+                             conflate_key: Optional[Hashable] = None):
+        """Queue event for all clients in project room on every node, sent on the next tick
+
+        Events with a conflate_key replace any queued event with the same key.
+        """
         try:
-            self.socketio.emit(event, data, room=project_id)
-            logger.debug(f"Broadcasted {event} to project {project_id}")
+            self.bus.publish({
+                'kind': 'room', 'room': project_id, 'event': event, 'data': data, 'key': conflate_key
+            })
         except Exception as e:
             logger.error(f"Broadcast error: {str(e)}")
 
+    def _queue_for_room(self, project_id: str, event: str, data: Dict[str, Any],
+                        conflate_key: Optional[Hashable] = None):
+        """Queue event for this node's clients in the room"""
+        if not self.socketio:
+            return
+        with self.client_lock:
+            if project_id not in self.project_rooms:
+                return  # Nobody is listening
+            queue = self.room_queues.get(project_id)
+            if queue is None:
+                queue = self.room_queues[project_id] = EventQueue(self.client_queue_size)
+            queue.put(event, data, conflate_key)
+
     def send_to_user(self, user_id: int, event: str, data: Dict[str, Any]):
-        """Send event to specific user"""
+        """Send event to specific user, on whichever node they are connected to"""
+        try:
+            self.bus.publish({'kind': 'user', 'user_id': user_id, 'event': event, 'data': data})
+        except Exception as e:
+            logger.error(f"Send to user error: {str(e)}")
+
+    def _send_to_local_user(self, user_id: int, event: str, data: Dict[str, Any]):
+        if not self.socketio:
+            return
         try:
             with self.client_lock:
-                for client_id, client_info in self.connected_clients.items():
-                    if client_info['user_id'] == user_id:
-                        self.socketio.emit(event, data, room=client_id)
-                        logger.debug(f"Sent {event} to user {user_id}")
+                client_ids = list(self.user_clients.get(user_id, ()))
+            for client_id in client_ids:
+                self.socketio.emit(event, data, to=client_id)
+            if client_ids:
+                logger.debug(f"Sent {event} to user {user_id}")
         except Exception as e:
             logger.error(f"Send to user error: {str(e)}")
 
+    def flush(self):
+        """Fan queued room events out to client queues and send a slice of each"""
+        with self.client_lock:
+            room_queues, self.room_queues = self.room_queues, {}
+            targets = {room: list(self.project_rooms.get(room, ())) for room in room_queues}
+            self.dropped_events += sum(queue.dropped for queue in room_queues.values())
+
+        fanned_out = 0
+        for room, room_queue in room_queues.items():
+            batch = room_queue.drain()
+            for client_id in targets[room]:
+                client_queue = self.client_queues.get(client_id)
+                if client_queue is None:
+                    continue
+                for event, data, key in batch:
+                    client_queue.put(event, data, (room, key) if key is not None else None)
+                self.dirty_clients.add(client_id)
+                fanned_out += 1
+                if fanned_out % self.yield_every == 0:
+                    self.socketio.sleep(0)  # Let other greenlets run between chunks
+
+        with self.client_lock:
+            dirty, self.dirty_clients = self.dirty_clients, set()
+
+        for sent, client_id in enumerate(dirty, 1):
+            client_queue = self.client_queues.get(client_id)
+            if client_queue is None:
+                continue
+            try:
+                for event, data, _ in client_queue.drain(self.sends_per_tick):
+                    self.socketio.emit(event, data, to=client_id)
+            except Exception as e:
+                logger.error(f"Send error for client {client_id}: {str(e)}")
+            self.dropped_events += client_queue.dropped
+            client_queue.dropped = 0
+            if len(client_queue):
+                with self.client_lock:
+                    self.dirty_clients.add(client_id)  # Backlog continues next tick
+            if sent % self.yield_every == 0:
+                self.socketio.sleep(0)
+
+    def touch(self, client_id: str):
+        """Record activity from a client, postponing its idle eviction"""
+        with self.client_lock:
+            if client_id in self.connected_clients:
+                self.heartbeats.touch(client_id)
+
+    def _transport_alive(self, client_id: str) -> bool:
+        """True while the client's Engine.IO socket is open
+
+        Engine.IO closes sockets that stop answering its ping/pong, so an
+        open socket means the transport is healthy even if the client only
+        listens and never sends an application event. The socket is found
+        through python-socketio/engineio internals (versions pinned in
+        requirements.txt); if those are missing the client counts as alive
+        and only the disconnect handler removes it.
+        """
+        try:
+            server = self.socketio.server
+            eio_sid_from_sid = server.manager.eio_sid_from_sid
+            sockets = server.eio.sockets
+        except AttributeError as e:
+            if not self._transport_check_warned:
+                self._transport_check_warned = True
+                logger.warning(f"Engine.IO socket state unavailable, idle eviction disabled: {str(e)}")
+            return True
+
+        eio_sid = eio_sid_from_sid(client_id, '/')
+        socket = sockets.get(eio_sid) if eio_sid else None
+        if socket is None:
+            return False
+        return not socket.closed and not getattr(socket, 'closing', False)
+
+    def evict_idle(self, now: float = None) -> int:
+        """Disconnect clients whose heartbeat lapsed and whose transport is gone"""
+        with self.client_lock:
+            expired = self.heartbeats.advance(now)
+        evicted = 0
+        for client_id in expired:
+            if self._transport_alive(client_id):
+                # Listen-only client: transport-level pongs count as activity
+                self.touch(client_id)
+                continue
+            client_info = self._forget_client(client_id)
+            if client_info is None:
+                continue
+            self.evicted_clients += 1
+            evicted += 1
+            logger.info(f"Evicting idle client {client_id} (user {client_info['user_id']})")
+            try:
+                self.socketio.server.disconnect(client_id)
+            except Exception as e:
+                logger.debug(f"Idle client {client_id} already gone: {str(e)}")
+        return evicted
+
+    def _flush_loop(self):
+        while True:
+            self.socketio.sleep(self.tick_interval)
+            try:
+                self.evict_idle()
+                self.coalescer.flush_due()
+                for callback in self.tick_callbacks:
+                    callback()
+                self.flush()
+            except Exception as e:
+                logger.error(f"Realtime flush error: {str(e)}")
+
+    def init_publisher(self, message_queue: str, channel: str = 'codecraft-realtime'):
+        """Publish-only mode for processes without Socket.IO clients, such as generation workers"""
+        self._set_bus(create_message_bus(message_queue, channel))
+        # No fan-out tick runs here, so the coalescer needs its own timer
+        self.coalescer.background = True
+
+    def _set_bus(self, bus: MessageBus, start_task: Callable = None):
+        self.bus.close()
+        self.bus = bus
+        self.bus.subscribe(self._on_bus_message, start_task)
+
+    def _on_bus_message(self, message: Dict[str, Any]):
+        """Deliver a bus message to this node's clients"""
+        kind = message.get('kind')
+        if kind == 'room':
+            key = message.get('key')
+            self._queue_for_room(
+                message['room'], message['event'], message['data'],
+                _hashable(key) if key is not None else None
+            )
+        elif kind == 'user':
+            self._send_to_local_user(message['user_id'], message['event'], message['data'])
+
+    def add_tick_callback(self, callback: Callable[[], None]):
+        """Run callback on every fan-out tick, before queued events are sent"""
+        self.tick_callbacks.append(callback)
+
+    def _emit_coalesced(self, key: Tuple, data: Dict[str, Any]):
+        """Broadcast the latest coalesced state for a progress or project-update key"""
+        kind, project_id = key[0], key[1]
+        if kind == 'progress':
+            self.broadcast_to_project(project_id, 'progress_update', data, conflate_key='progress_update')
+        else:
+            self.broadcast_to_project(project_id, 'project_update', {
+                'type': key[2],
+                'data': data,
+                'timestamp': datetime.utcnow().isoformat()
+            }, conflate_key=('project_update', key[2]))
+
     def notify_project_progress(self, project_id: str, progress: float, status: str, step: str):
-        """Notify project progress to all subscribers"""
-        self.broadcast_to_project(project_id, 'progress_update', {
+        """Notify project progress to all subscribers, at most progress_hz times a second"""
+        self.coalescer.submit(('progress', project_id), {
             'progress': progress,
             'status': status,
             'current_step': step,
             'timestamp': datetime.utcnow().isoformat()
         })
 
+    def emit_project_update(self, project_id: str, update_type: str, data: Dict[str, Any]):
+        """Coalesced project update; updates of the same type merge until the next flush"""
+        self.coalescer.submit(('update', project_id, update_type), data)
+
     def notify_generation_complete(self, project_id: str, result: Dict[str, Any]):
         """Notify generation completion"""
         self.broadcast_to_project(project_id, 'generation_complete', {
@@ -222,7 +570,21 @@ class RealtimeManager:
 
     def get_room_clients(self, room: str) -> List[str]:
         """Get all clients in a room"""
-        return self.project_rooms.get(room, [])
+        with self.client_lock:
+            return list(self.project_rooms.get(room, ()))
+
+    def connection_gauges(self) -> Dict[str, int]:
+        """Consistent snapshot of live-connection gauges"""
+        with self.client_lock:
+            return {
+                'connected_clients': len(self.connected_clients),
+                'connected_users': len(self.user_clients),
+                'active_projects': len(self.project_rooms),
+                'total_subscribers': self.subscription_count,
+                'heartbeat_tracked': len(self.heartbeats),
+                'dropped_events': self.dropped_events,
+                'evicted_idle_clients': self.evicted_clients
+            }
 
     def get_connected_clients_count(self) -> int:
         """Get total connected clients"""
@@ -231,24 +593,76 @@ class RealtimeManager:
 
     def get_project_subscribers_count(self, project_id: str) -> int:
         """Get number of subscribers for a project"""
-        return len(self.get_room_clients(project_id))
+        with self.client_lock:
+            return len(self.project_rooms.get(project_id, ()))
 
 class NotificationManager:
-    """Notification management system"""
-
-    def __init__(self, realtime_manager: RealtimeManager = None):
+    """Notification management system
+
+    The newest buffer_size notifications of recently active users are kept in
+    per-user ring buffers with maintained unread counters. With a
+    session_factory every notification is also stored in the notifications
+    table, which serves older pages via keyset pagination on the notification
+    ID. Each operation opens its own session, so Socket.IO handler threads
+    never share one.
+    """
+
+    def __init__(self, realtime_manager: RealtimeManager = None, session_factory: Callable = None,
+                 buffer_size: int = 100, max_users: int = 10000):
         self.realtime = realtime_manager
-        self.notifications: Dict[str, List[Dict[str, Any]]] = {}
+        self.session_factory = session_factory
+        self.buffer_size = buffer_size
+        self.max_users = max_users
+        # user_id -> deque of newest notifications (oldest first), LRU ordered by user
+        self.notifications: 'OrderedDict[int, Deque[Dict[str, Any]]]' = OrderedDict()
+        self.unread_counts: Dict[int, int] = {}
         self.notification_lock = Lock()
+        self._ids = itertools.count(int(time.time() * 1000))  # Used without a database
+
+    @contextmanager
+    def _session(self):
+        """Session for a single operation, closed (and rolled back if uncommitted) afterwards"""
+        session = self.session_factory()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    def _user_buffer(self, user_id: int) -> Deque[Dict[str, Any]]:
+        """Ring buffer for user, loaded from history on first use"""
+        with self.notification_lock:
+            buffer = self.notifications.get(user_id)
+            if buffer is not None:
+                self.notifications.move_to_end(user_id)
+                return buffer
+
+        recent, unread = [], 0
+        if self.session_factory is not None:
+            try:
+                with self._session() as session:
+                    rows = session.query(Notification).filter_by(user_id=user_id) \
+                        .order_by(Notification.id.desc()).limit(self.buffer_size).all()
+                    recent = [row.to_dict() for row in reversed(rows)]
+                    unread = session.query(Notification).filter_by(user_id=user_id, read=False).count()
+            except Exception as e:
+                logger.error(f"Failed to load notifications for user {user_id}: {str(e)}")
+
+        with self.notification_lock:
+            buffer = self.notifications.get(user_id)
+            if buffer is None:
+                buffer = self.notifications[user_id] = deque(recent, maxlen=self.buffer_size)
+                self.unread_counts[user_id] = unread
+                while len(self.notifications) > self.max_users:
+                    evicted, _ = self.notifications.popitem(last=False)
+                    self.unread_counts.pop(evicted, None)
+            return buffer
 
     def create_notification(self, user_id: int, title: str, message: str,
                           notification_type: str = 'info',
-                          data: Dict[str, Any] = None) -> str:
+                          data: Dict[str, Any] = None) -> int:
         """Create a new notification"""
-        notification_id = f"notif_{int(time.time())}_{user_id}"
-
         notification = {
-            'id': notification_id,
+            'id': None,
             'user_id': user_id,
             'title': title,
             'message': message,
@@ -258,73 +672,231 @@ class NotificationManager:
             'created_at': datetime.utcnow().isoformat()
         }
 
+        buffer = self._user_buffer(user_id)
+
+        if self.session_factory is not None:
+            try:
+                with self._session() as session:
+                    row = Notification(
+                        user_id=user_id,
+                        title=title,
+                        message=message,
+                        type=notification_type,
+                        data=data or {}
+                    )
+                    session.add(row)
+                    session.commit()
+                    notification['id'] = row.id
+                    notification['created_at'] = row.created_at.isoformat()
+            except Exception as e:
+                logger.error(f"Failed to store notification for user {user_id}: {str(e)}")
+        if notification['id'] is None:
+            notification['id'] = next(self._ids)
+
         with self.notification_lock:
-            if str(user_id) not in self.notifications:
-                self.notifications[str(user_id)] = []
-            self.notifications[str(user_id)].append(notification)
+            unread = self.unread_counts.get(user_id, 0) + 1
+            if self.session_factory is None and len(buffer) == buffer.maxlen and not buffer[0]['read']:
+                unread -= 1  # Evicted for good, nothing else remembers it
+            buffer.append(notification)
+            self.unread_counts[user_id] = unread
 
         # Send real-time notification if manager available
         if self.realtime:
             self.realtime.send_to_user(user_id, 'notification', notification)
 
         logger.info(f"Created notification for user {user_id}: {title}")
-        return notification_id
+        return notification['id']
 
-    def get_user_notifications(self, user_id: int, limit: int = 50) -> List[Dict[str, Any]]:
-        """Get notifications for user"""
+    def get_user_notifications(self, user_id: int, limit: int = 50,
+                               before_id: int = None) -> List[Dict[str, Any]]:
+        """Get notifications for user, newest first; pass the last ID seen as before_id for the next page"""
+        buffer = self._user_buffer(user_id)
         with self.notification_lock:
-            user_notifications = self.notifications.get(str(user_id), [])
-            return sorted(user_notifications, key=lambda x: x['created_at'], reverse=True)[:limit]
-
-    def mark_as_read(self, user_id: int, notification_id: str) -> bool:
+            page = [dict(n) for n in reversed(buffer) if before_id is None or n['id'] < before_id][:limit]
+
+        # The buffer is the newest slice of history; older pages come from the database
+        if len(page) >= limit or self.session_factory is None:
+            return page
+
+        cursor = page[-1]['id'] if page else before_id
+        with self._session() as session:
+            query = session.query(Notification).filter(Notification.user_id == user_id)
+            if cursor is not None:
+                query = query.filter(Notification.id < cursor)
+            rows = query.order_by(Notification.id.desc()).limit(limit - len(page)).all()
+            return page + [row.to_dict() for row in rows]
+
+    def _find(self, buffer: Deque[Dict[str, Any]], notification_id: int) -> Optional[Dict[str, Any]]:
+        for notification in buffer:
+            if notification['id'] == notification_id:
+                return notification
+        return None
+
+    def mark_as_read(self, user_id: int, notification_id: int) -> bool:
         """Mark notification as read"""
-        with self.notification_lock:
-            user_notifications = self.notifications.get(str(user_id), [])
-            for notification in user_notifications:
-                if notification['id'] == notification_id:
+        notification_id = int(notification_id)
+        buffer = self._user_buffer(user_id)
+
+        if self.session_factory is not None:
+            try:
+                with self._session() as session:
+                    changed = session.query(Notification).filter_by(
+                        id=notification_id, user_id=user_id, read=False
+                    ).update({'read': True})
+                    session.commit()
+            except Exception as e:
+                logger.error(f"Failed to mark notification {notification_id} read: {str(e)}")
+                return False
+            with self.notification_lock:
+                notification = self._find(buffer, notification_id)
+                if notification:
                     notification['read'] = True
-                    return True
-        return False
+                if changed:
+                    self.unread_counts[user_id] = max(self.unread_counts.get(user_id, 0) - 1, 0)
+            return bool(changed) or notification is not None
+
+        with self.notification_lock:
+            notification = self._find(buffer, notification_id)
+            if notification is None:
+                return False
+            if not notification['read']:
+                notification['read'] = True
+                self.unread_counts[user_id] = max(self.unread_counts.get(user_id, 0) - 1, 0)
+            return True
+
+    def mark_all_as_read(self, user_id: int) -> None:
+        """Mark all of a user's notifications as read"""
+        buffer = self._user_buffer(user_id)
+        if self.session_factory is not None:
+            try:
+                with self._session() as session:
+                    session.query(Notification).filter_by(user_id=user_id, read=False).update({'read': True})
+                    session.commit()
+            except Exception as e:
+                logger.error(f"Failed to mark notifications read for user {user_id}: {str(e)}")
+                return
+        with self.notification_lock:
+            for notification in buffer:
+                notification['read'] = True
+            self.unread_counts[user_id] = 0
 
-    def delete_notification(self, user_id: int, notification_id: str) -> bool:
+    def delete_notification(self, user_id: int, notification_id: int) -> bool:
         """Delete notification"""
+        notification_id = int(notification_id)
+        buffer = self._user_buffer(user_id)
+
+        deleted_unread = None
+        if self.session_factory is not None:
+            try:
+                with self._session() as session:
+                    begin_write(session)  # The row's read flag decides the counter change
+                    row = session.query(Notification).filter_by(id=notification_id, user_id=user_id).first()
+                    if row is not None:
+                        deleted_unread = not row.read
+                        session.delete(row)
+                        session.commit()
+            except Exception as e:
+                logger.error(f"Failed to delete notification {notification_id}: {str(e)}")
+                return False
+
         with self.notification_lock:
-            user_notifications = self.notifications.get(str(user_id), [])
-            for i, notification in enumerate(user_notifications):
-                if notification['id'] == notification_id:
-                    del user_notifications[i]
-                    return True
-        return False
+            notification = self._find(buffer, notification_id)
+            if notification is not None:
+                buffer.remove(notification)
+                if deleted_unread is None:
+                    deleted_unread = not notification['read']
+            if deleted_unread:
+                self.unread_counts[user_id] = max(self.unread_counts.get(user_id, 0) - 1, 0)
+        return deleted_unread is not None
 
     def get_unread_count(self, user_id: int) -> int:
         """Get unread notification count"""
+        self._user_buffer(user_id)
         with self.notification_lock:
-            user_notifications = self.notifications.get(str(user_id), [])
-            return sum(1 for n in user_notifications if not n['read'])
+            return self.unread_counts.get(user_id, 0)
+
+def _common_prefix_length(a: str, b: str) -> int:
+    """Length of the common prefix, by binary search over C-level slice compares"""
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[:mid] == b[:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def _common_suffix_length(a: str, b: str, limit: int) -> int:
+    low, high = 0, limit
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[len(a) - mid:] == b[len(b) - mid:]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+def diff_text(old: str, new: str) -> List[Dict[str, Any]]:
+    """Edit ops turning old into new: [{'p': position, 'd': deleted chars, 'i': inserted text}]"""
+    if old == new:
+        return []
+    prefix = _common_prefix_length(old, new)
+    suffix = _common_suffix_length(old, new, min(len(old), len(new)) - prefix)
+    op = {'p': prefix, 'd': len(old) - prefix - suffix}
+    inserted = new[prefix:len(new) - suffix]
+    if inserted:
+        op['i'] = inserted
+    return [op]
+
+def apply_ops(text: str, ops: List[Dict[str, Any]]) -> str:
+    """Apply edit ops produced by diff_text"""
+    for op in ops:
+        position = op['p']
+        text = text[:position] + op.get('i', '') + text[position + op.get('d', 0):]
+    return text
 
 class CollaborativeEditing:
-    """Collaborative editing support"""
+    """Collaborative editing support
+
+    Edit sessions are indexed by project and file. Updates are reduced to
+    compact text deltas, numbered per file and broadcast in batches on the
+    realtime tick; sessions idle for longer than idle_timeout are released.
+    """
 
-    def __init__(self, realtime_manager: RealtimeManager = None):
+    def __init__(self, realtime_manager: RealtimeManager = None, idle_timeout: float = 300,
+                 sweep_interval: float = 30):
         self.realtime = realtime_manager
-        self.active_edits: Dict[str, Dict[str, Any]] = {}
+        self.idle_timeout = idle_timeout
+        self.sweep_interval = sweep_interval
+        # project_id -> file_path -> edit session
+        self.active_edits: Dict[str, Dict[str, Dict[str, Any]]] = {}
         self.edit_lock = Lock()
+        self._last_sweep = time.time()
 
-    def start_editing(self, project_id: str, user_id: int, file_path: str) -> bool:
-        """Start collaborative editing session"""
-        edit_key = f"{project_id}:{file_path}"
+        if self.realtime:
+            self.realtime.add_tick_callback(self.tick)
 
+    def start_editing(self, project_id: str, user_id: int, file_path: str, content: str = None) -> bool:
+        """Start collaborative editing session; content seeds server-side delta encoding"""
         with self.edit_lock:
-            if edit_key in self.active_edits:
-                current_editor = self.active_edits[edit_key]['user_id']
-                if current_editor != user_id:
-                    return False  # Someone else is editing
-
-            self.active_edits[edit_key] = {
-                'user_id': user_id,
-                'started_at': datetime.utcnow(),
-                'last_activity': datetime.utcnow()
-            }
+            files = self.active_edits.setdefault(project_id, {})
+            edit = files.get(file_path)
+            if edit and edit['user_id'] != user_id:
+                return False  # Someone else is editing
+
+            if edit is None:
+                files[file_path] = {
+                    'user_id': user_id,
+                    'started_at': datetime.utcnow(),
+                    'last_activity': time.time(),
+                    'seq': 0,
+                    'content': content,
+                    'pending_ops': [],
+                    'pending_meta': {},
+                    'base_seq': 0
+                }
+            else:
+                edit['last_activity'] = time.time()
 
         # Notify other users
         if self.realtime:
@@ -337,30 +909,121 @@ class CollaborativeEditing:
         return True
 
     def update_edit(self, project_id: str, user_id: int, file_path: str,
-                   changes: Dict[str, Any]):
-        """Update collaborative edit"""
-        edit_key = f"{project_id}:{file_path}"
+                   changes: Dict[str, Any]) -> Optional[int]:
+        """Queue an edit, returns its sequence number or None without an edit session
 
+        changes may carry the full 'content' (diffed against the last known
+        content), ready-made 'ops', or other keys such as cursor position,
+        which are forwarded latest-wins.
+        """
         with self.edit_lock:
-            if edit_key in self.active_edits:
-                self.active_edits[edit_key]['last_activity'] = datetime.utcnow()
+            edit = self.active_edits.get(project_id, {}).get(file_path)
+            if edit is None or edit['user_id'] != user_id:
+                return None
+
+            changes = dict(changes)
+            ops = changes.pop('ops', None) or []
+            content = changes.pop('content', None)
+            if content is not None:
+                if edit['content'] is not None:
+                    ops = ops + diff_text(apply_ops(edit['content'], ops), content)
+                else:
+                    changes['content'] = content  # No base yet, send it whole once
+                edit['content'] = content
+            elif ops and edit['content'] is not None:
+                edit['content'] = apply_ops(edit['content'], ops)
+
+            edit['last_activity'] = time.time()
+            if not ops and not changes:
+                return edit['seq']
+
+            edit['seq'] += 1
+            edit['pending_ops'].extend(ops)
+            edit['pending_meta'].update(changes)
+            seq = edit['seq']
+
+        if not self.realtime:
+            self.flush(project_id, file_path)
+        return seq
+
+    def _take_batch(self, project_id: str, file_path: str, edit: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Pop an edit's pending ops as one broadcast payload, called with edit_lock held"""
+        if edit['seq'] == edit['base_seq']:
+            return None
+        batch = {
+            'file_path': file_path,
+            'user_id': edit['user_id'],
+            'base_seq': edit['base_seq'],  # Receivers apply batches whose base_seq matches their last seq
+            'seq': edit['seq'],
+            'ops': edit['pending_ops'],
+            'timestamp': datetime.utcnow().isoformat()
+        }
+        if edit['pending_meta']:
+            batch['meta'] = edit['pending_meta']
+        edit['base_seq'] = edit['seq']
+        edit['pending_ops'] = []
+        edit['pending_meta'] = {}
+        return batch
+
+    def flush(self, project_id: str = None, file_path: str = None):
+        """Broadcast pending edit batches, for one file or all of them"""
+        batches = []
+        with self.edit_lock:
+            projects = [project_id] if project_id else list(self.active_edits)
+            for pid in projects:
+                files = self.active_edits.get(pid, {})
+                for path in ([file_path] if file_path else list(files)):
+                    edit = files.get(path)
+                    batch = edit and self._take_batch(pid, path, edit)
+                    if batch:
+                        batches.append((pid, batch))
 
-        # Broadcast changes to other users
         if self.realtime:
-            self.realtime.broadcast_to_project(project_id, 'edit_update', {
-                'file_path': file_path,
-                'user_id': user_id,
-                'changes': changes,
-                'timestamp': datetime.utcnow().isoformat()
-            })
+            for pid, batch in batches:
+                self.realtime.broadcast_to_project(pid, 'edit_update', batch)
+
+    def sweep_idle(self, now: float = None) -> int:
+        """Release edit sessions idle for longer than idle_timeout"""
+        now = now or time.time()
+        expired = []
+        with self.edit_lock:
+            for project_id, files in list(self.active_edits.items()):
+                for file_path, edit in list(files.items()):
+                    if now - edit['last_activity'] >= self.idle_timeout:
+                        expired.append((project_id, file_path, edit['user_id'], self._take_batch(project_id, file_path, edit)))
+                        del files[file_path]
+                if not files:
+                    del self.active_edits[project_id]
+
+        if self.realtime:
+            for project_id, file_path, user_id, batch in expired:
+                if batch:
+                    self.realtime.broadcast_to_project(project_id, 'edit_update', batch)
+                self.realtime.broadcast_to_project(project_id, 'editing_stopped', {
+                    'file_path': file_path,
+                    'user_id': user_id,
+                    'reason': 'idle',
+                    'timestamp': datetime.utcnow().isoformat()
+                })
+        return len(expired)
+
+    def tick(self):
+        """Batch flush, plus the idle sweep every sweep_interval seconds"""
+        self.flush()
+        now = time.time()
+        if now - self._last_sweep >= self.sweep_interval:
+            self._last_sweep = now
+            self.sweep_idle(now)
 
     def stop_editing(self, project_id: str, user_id: int, file_path: str):
         """Stop collaborative editing session"""
-        edit_key = f"{project_id}:{file_path}"
-
+        self.flush(project_id, file_path)
         with self.edit_lock:
-            if edit_key in self.active_edits:
-                del self.active_edits[edit_key]
+            files = self.active_edits.get(project_id, {})
+            if file_path in files:
+                del files[file_path]
+            if not files:
+                self.active_edits.pop(project_id, None)
 
         # Notify other users
         if self.realtime:
@@ -372,13 +1035,8 @@ class CollaborativeEditing:
 
     def get_active_editors(self, project_id: str) -> Dict[str, int]:
         """Get active editors for project"""
-        active_editors = {}
         with self.edit_lock:
-            for edit_key, edit_info in self.active_edits.items():
-                if edit_key.startswith(f"{project_id}:"):
-                    file_path = edit_key.split(':', 1)[1]
-                    active_editors[file_path] = edit_info['user_id']
-        return active_editors
+            return {file_path: edit['user_id'] for file_path, edit in self.active_edits.get(project_id, {}).items()}
 
 # Global instances
 realtime_manager = RealtimeManager()
@@ -389,11 +1047,7 @@ collaborative_editing = CollaborativeEditing(realtime_manager)
 def emit_project_update(project_id: str, update_type: str, data: Dict[str, Any]):
     """Emit project update to all subscribers"""
     if realtime_manager:
-        realtime_manager.broadcast_to_project(project_id, 'project_update', {
-            'type': update_type,
-            'data': data,
-            'timestamp': datetime.utcnow().isoformat()
-        })
+        realtime_manager.emit_project_update(project_id, update_type, data)
 
 def emit_user_notification(user_id: int, title: str, message: str,
                           notification_type: str = 'info'):
@@ -404,9 +1058,5 @@ def emit_user_notification(user_id: int, title: str, message: str,
 def get_connection_stats() -> Dict[str, Any]:
     """Get real-time connection statistics"""
     if realtime_manager:
-        return {
-            'connected_clients': realtime_manager.get_connected_clients_count(),
-            'active_projects': len(realtime_manager.project_rooms),
-            'total_subscribers': sum(len(clients) for clients in realtime_manager.project_rooms.values())
-        }
+        return realtime_manager.connection_gauges()
     return {'error': 'Real-time manager not initialized'}
\ No newline at end of file
@@ -0,0 +1,117 @@
+"""
+Realtime Message Bus Module
+Pub/sub layer that carries realtime events between processes, so any worker or
+generation process can publish and every Socket.IO node delivers to its own clients
+"""
+
+import json
+import time
+import threading
+import logging
+from abc import ABC, abstractmethod
+from typing import Dict, Any, Callable, Optional
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+class MessageBus(ABC):
+    """Interface for realtime event distribution"""
+
+    def __init__(self):
+        self.handler: Optional[Callable[[Dict[str, Any]], None]] = None
+
+    def subscribe(self, handler: Callable[[Dict[str, Any]], None],
+                  start_task: Callable = None) -> None:
+        """Deliver every published message to handler; start_task spawns the listener"""
+        self.handler = handler
+
+    @abstractmethod
+    def publish(self, message: Dict[str, Any]) -> None:
+        """Send a message to every subscribed node, including this one"""
+
+    def close(self) -> None:
+        """Release connections"""
+
+    def _dispatch(self, message: Dict[str, Any]) -> None:
+        if self.handler is None:
+            return
+        try:
+            self.handler(message)
+        except Exception as e:
+            logger.error(f"Realtime message handler error: {e}")
+
+class LocalMessageBus(MessageBus):
+    """In-process delivery for a single Socket.IO node"""
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self._dispatch(message)
+
+class RedisMessageBus(MessageBus):
+    """Redis-compatible pub/sub (Redis, Valkey, KeyDB; unix:// URLs use a local socket)"""
+
+    def __init__(self, url: str, channel: str = 'codecraft-realtime'):
+        super().__init__()
+        if redis is None:
+            raise ImportError("redis is required for the Redis realtime message bus")
+
+        self.url = url
+        self.channel = channel
+        self.client = redis.from_url(url)
+        self._pubsub = None
+        self._stopped = False
+
+    def subscribe(self, handler: Callable[[Dict[str, Any]], None],
+                  start_task: Callable = None) -> None:
+        super().subscribe(handler)
+        self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(self.channel)
+        if start_task:
+            start_task(self._listen)
+        else:
+            threading.Thread(target=self._listen, daemon=True).start()
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        self.client.publish(self.channel, json.dumps(message, default=str))
+
+    def _listen(self) -> None:
+        while not self._stopped:
+            try:
+                for item in self._pubsub.listen():
+                    if self._stopped:
+                        break
+                    if item.get('type') == 'message':
+                        self._dispatch(json.loads(item['data']))
+            except Exception as e:
+                if self._stopped:
+                    break
+                logger.error(f"Realtime bus connection lost, resubscribing: {e}")
+                try:
+                    self._pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                    self._pubsub.subscribe(self.channel)
+                except Exception as e:
+                    logger.error(f"Realtime bus resubscribe failed: {e}")
+                    time.sleep(1)
+
+    def close(self) -> None:
+        self._stopped = True
+        if self._pubsub is not None:
+            try:
+                self._pubsub.close()
+            except Exception:
+                pass
+
+def create_message_bus(url: str = None, channel: str = 'codecraft-realtime') -> MessageBus:
+    """Build the bus for a message queue URL, in-process delivery when none is set"""
+    if not url:
+        return LocalMessageBus()
+
+    if url.split('://', 1)[0] in ('redis', 'rediss', 'unix'):
+        logger.info(f"Using Redis realtime message bus on channel {channel}")
+        return RedisMessageBus(url, channel)
+
+    logger.warning(f"Unsupported realtime message queue '{url}', using in-process delivery")
+    return LocalMessageBus()
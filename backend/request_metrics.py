@@ -0,0 +1,161 @@
+"""
+Request Metrics Module
+In-process aggregation of request latencies, flushed periodically as
+pre-aggregated SystemMetrics rows instead of one row per request
+"""
+
+import time
+import atexit
+import bisect
+import threading
+import logging
+from datetime import datetime
+from typing import Dict, Any, List, Tuple, Callable
+
+from sqlalchemy import insert
+
+from models import SystemMetrics
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds in seconds; the last bucket catches everything slower
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf'))
+
+def bucket_quantile(buckets: Tuple[float, ...], counts: List[int], q: float) -> float:
+    """Estimate a quantile from histogram counts by interpolating inside the bucket"""
+    total = sum(counts)
+    if not total:
+        return 0.0
+    rank = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if seen + count >= rank and count:
+            lower = buckets[i - 1] if i else 0.0
+            upper = buckets[i] if buckets[i] != float('inf') else lower
+            return lower + (upper - lower) * (rank - seen) / count
+        seen += count
+    return buckets[-2]
+
+class RequestMetricsAggregator:
+    """Per-endpoint latency histograms and counters
+
+    Recording takes a short lock around a few integer updates. A background
+    thread swaps the current window out every flush_interval seconds and
+    writes one row per endpoint, method and status class in a single bulk insert.
+    """
+
+    def __init__(self, session_factory: Callable = None, flush_interval: float = 10,
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.session_factory = session_factory
+        self.flush_interval = flush_interval
+        self.buckets = buckets
+        self._window: Dict[Tuple[str, str, str], Dict[str, Any]] = {}
+        self._window_start = time.time()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread = None
+
+    def start(self, session_factory: Callable = None) -> None:
+        """Start the background flusher"""
+        if session_factory is not None:
+            self.session_factory = session_factory
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def record(self, endpoint: str, method: str, status_code: int, duration: float) -> None:
+        """Count one request"""
+        bucket = bisect.bisect_left(self.buckets, duration)
+        key = (endpoint or 'unknown', method, f"{status_code // 100}xx" if status_code else 'unknown')
+        with self._lock:
+            stats = self._window.get(key)
+            if stats is None:
+                stats = self._window[key] = {
+                    'count': 0, 'sum': 0.0, 'min': duration, 'max': duration,
+                    'buckets': [0] * len(self.buckets)
+                }
+            stats['count'] += 1
+            stats['sum'] += duration
+            if duration < stats['min']:
+                stats['min'] = duration
+            if duration > stats['max']:
+                stats['max'] = duration
+            stats['buckets'][bucket] += 1
+
+    def snapshot(self) -> Dict[Tuple[str, str, str], Dict[str, Any]]:
+        """Copy of the current, unflushed window"""
+        with self._lock:
+            return {key: dict(stats, buckets=list(stats['buckets'])) for key, stats in self._window.items()}
+
+    def _rows(self, window: Dict[Tuple[str, str, str], Dict[str, Any]], started: float,
+              ended: float) -> List[Dict[str, Any]]:
+        timestamp = datetime.utcfromtimestamp(ended)
+        rows = []
+        for (endpoint, method, status_class), stats in window.items():
+            counts = stats['buckets']
+            # Bucket interpolation can overshoot what was actually observed
+            quantile = lambda q: round(min(max(bucket_quantile(self.buckets, counts, q), stats['min']), stats['max']), 6)
+            rows.append({
+                'metric_type': 'request',
+                'metric_name': 'response_time',
+                'value': stats['sum'] / stats['count'],
+                'unit': 'seconds',
+                'timestamp': timestamp,
+                'metric_metadata': {
+                    'endpoint': endpoint,
+                    'method': method,
+                    'status_class': status_class,
+                    'count': stats['count'],
+                    'sum': round(stats['sum'], 6),
+                    'min': round(stats['min'], 6),
+                    'max': round(stats['max'], 6),
+                    'p50': quantile(0.50),
+                    'p95': quantile(0.95),
+                    'p99': quantile(0.99),
+                    'buckets': {str(le): n for le, n in zip(self.buckets, counts) if n},
+                    'interval_seconds': round(ended - started, 3)
+                }
+            })
+        return rows
+
+    def flush(self) -> int:
+        """Write the current window, returns the number of rows inserted"""
+        now = time.time()
+        with self._lock:
+            window, self._window = self._window, {}
+            started, self._window_start = self._window_start, now
+        if not window or self.session_factory is None:
+            return 0
+
+        rows = self._rows(window, started, now)
+        session = self.session_factory()
+        try:
+            session.execute(insert(SystemMetrics), rows)
+            session.commit()
+            return len(rows)
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Failed to write request metrics: {str(e)}")
+            return 0
+        finally:
+            session.close()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Request metrics flush error: {str(e)}")
+
+    def close(self) -> None:
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self.flush()
+
+# Global instance
+request_metrics = RequestMetricsAggregator()
@@ -0,0 +1,185 @@
+"""
+SQL Profiler Module
+Per-request query accounting from SQLAlchemy cursor events: query counts, DB
+time, repeated statements (N+1 patterns), pool checkout wait and EXPLAIN plans
+for slow statements
+"""
+
+import re
+import time
+import threading
+import logging
+from collections import OrderedDict, deque
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r'\s+')
+_IN_LIST = re.compile(r'\(\s*(?:\?|%s|%\(\w+\)s|:\w+)(?:\s*,\s*(?:\?|%s|%\(\w+\)s|:\w+))+\s*\)')
+
+def normalize_statement(statement: str) -> str:
+    """Statement shape used to group repeats; IN lists of any length look the same"""
+    return _IN_LIST.sub('(...)', _WHITESPACE.sub(' ', statement).strip())
+
+def explain_prefix(dialect_name: str) -> str:
+    return 'EXPLAIN QUERY PLAN ' if dialect_name == 'sqlite' else 'EXPLAIN '
+
+class SQLProfiler:
+    """Collects SQL statistics for the request running on the current thread
+
+    begin_request()/end_request() bracket a request; statements executed
+    outside a request (background threads) are ignored. Finished profiles
+    are kept in a bounded history for the debug endpoint.
+    """
+
+    def __init__(self, slow_threshold: float = 0.1, repeat_threshold: int = 5,
+                 history_size: int = 100, explain_slow: bool = True, plan_cache_size: int = 200):
+        self.slow_threshold = slow_threshold
+        self.repeat_threshold = repeat_threshold
+        self.explain_slow = explain_slow
+        self.plan_cache_size = plan_cache_size
+        self.history: deque = deque(maxlen=history_size)
+        self._plans: OrderedDict = OrderedDict()
+        self._plans_lock = threading.Lock()
+        self._local = threading.local()
+        self._engines = set()
+
+    def install(self, engine: Engine) -> None:
+        """Listen to an engine's cursor events"""
+        if id(engine) in self._engines:
+            return
+        self._engines.add(id(engine))
+        event.listen(engine, 'before_cursor_execute', self._before_execute)
+        event.listen(engine, 'after_cursor_execute', self._after_execute)
+
+    # Request lifecycle
+
+    def begin_request(self, method: str, path: str) -> None:
+        self._local.profile = {
+            'method': method,
+            'path': path,
+            'started_at': time.time(),
+            'queries': 0,
+            'db_time': 0.0,
+            'pool_wait': 0.0,
+            'statements': {},
+            'slow': []
+        }
+
+    def current(self) -> Optional[Dict[str, Any]]:
+        return getattr(self._local, 'profile', None)
+
+    def end_request(self, endpoint: str = None, status: int = None) -> Optional[Dict[str, Any]]:
+        """Finish the current profile, returns its summary"""
+        profile = self.current()
+        if profile is None:
+            return None
+        self._local.profile = None
+
+        repeated = [
+            {'statement': statement, 'count': stats['count'], 'total_ms': round(stats['time'] * 1000, 3)}
+            for statement, stats in profile['statements'].items()
+            if stats['count'] >= self.repeat_threshold
+        ]
+        repeated.sort(key=lambda r: r['count'], reverse=True)
+        summary = {
+            'method': profile['method'],
+            'path': profile['path'],
+            'endpoint': endpoint,
+            'status': status,
+            'started_at': profile['started_at'],
+            'duration_ms': round((time.time() - profile['started_at']) * 1000, 3),
+            'queries': profile['queries'],
+            'distinct_statements': len(profile['statements']),
+            'db_time_ms': round(profile['db_time'] * 1000, 3),
+            'pool_wait_ms': round(profile['pool_wait'] * 1000, 3),
+            'repeated': repeated,
+            'slow': profile['slow']
+        }
+        if repeated:
+            logger.warning(
+                f"Possible N+1 in {profile['method']} {profile['path']}: "
+                f"{repeated[0]['count']}x {repeated[0]['statement'][:120]}"
+            )
+        if profile['queries']:
+            self.history.append(summary)
+        return summary
+
+    def record_pool_wait(self, seconds: float) -> None:
+        profile = self.current()
+        if profile is not None:
+            profile['pool_wait'] += seconds
+
+    # Cursor events
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.current() is not None and not getattr(self._local, 'explaining', False):
+            conn.info.setdefault('profiler_start', []).append(time.perf_counter())
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        profile = self.current()
+        starts = conn.info.get('profiler_start')
+        if profile is None or not starts or getattr(self._local, 'explaining', False):
+            return
+        duration = time.perf_counter() - starts.pop()
+
+        key = normalize_statement(statement)
+        stats = profile['statements'].setdefault(key, {'count': 0, 'time': 0.0})
+        stats['count'] += 1
+        stats['time'] += duration
+        profile['queries'] += 1
+        profile['db_time'] += duration
+
+        if duration >= self.slow_threshold:
+            slow = {'statement': key, 'duration_ms': round(duration * 1000, 3)}
+            if self.explain_slow and key.upper().startswith(('SELECT', 'WITH')):
+                slow['plan'] = self._explain_cursor(cursor, conn.dialect.name, key, statement, parameters)
+            profile['slow'].append(slow)
+
+    # Plans
+
+    def _explain_cursor(self, cursor, dialect_name: str, key: str, statement: str, parameters) -> Any:
+        """EXPLAIN a slow statement on a separate cursor of the same connection, cached per shape"""
+        with self._plans_lock:
+            if key in self._plans:
+                self._plans.move_to_end(key)
+                return self._plans[key]
+
+        self._local.explaining = True
+        try:
+            explain_cursor = cursor.connection.cursor()
+            try:
+                explain_cursor.execute(explain_prefix(dialect_name) + statement, parameters)
+                plan = [list(row) if len(row) > 1 else row[0] for row in explain_cursor.fetchall()]
+            finally:
+                explain_cursor.close()
+        except Exception as e:
+            plan = f"EXPLAIN failed: {e}"
+        finally:
+            self._local.explaining = False
+
+        with self._plans_lock:
+            self._plans[key] = plan
+            while len(self._plans) > self.plan_cache_size:
+                self._plans.popitem(last=False)
+        return plan
+
+    def explain(self, connection, statement) -> List[Any]:
+        """EXPLAIN a SQLAlchemy statement (Select, ORM query statement) on a Connection"""
+        compiled = statement.compile(dialect=connection.dialect)
+        if compiled.positional:
+            params = tuple(compiled.params[name] for name in compiled.positiontup)
+        else:
+            params = compiled.params
+        self._local.explaining = True
+        try:
+            result = connection.exec_driver_sql(explain_prefix(connection.dialect.name) + str(compiled), params)
+            return [list(row) if len(row) > 1 else row[0] for row in result]
+        finally:
+            self._local.explaining = False
+
+# Global instance
+sql_profiler = SQLProfiler()
@@ -0,0 +1,88 @@
+"""
+Status Events Module
+Helpers for the project status stream (Server-Sent Events)
+"""
+
+import json
+import time
+import threading
+import logging
+from typing import Dict, Any, Callable, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = {'completed', 'error', 'cancelled'}
+
+def format_sse(event: str, data: Dict[str, Any], event_id: Any = None) -> str:
+    """Encode a Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+class ProgressCoalescer:
+    """Keeps only the latest state per key and emits it at most rate_hz times a second
+
+    Terminal statuses bypass the rate limit and are emitted at once, merged
+    with anything still pending for the key. With background=False the owner
+    drives emission by calling flush_due() from its own loop.
+    """
+
+    def __init__(self, emit: Callable[[Hashable, Dict[str, Any]], Any], rate_hz: float = 4.0,
+                 background: bool = True):
+        self.emit = emit
+        self.interval = 1.0 / rate_hz if rate_hz > 0 else 0
+        self.background = background
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        # Serializes emits so a batch popped before a terminal update is never sent after it
+        self._emit_lock = threading.Lock()
+        self._last_flush = 0.0
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+
+    def submit(self, key: Hashable, changes: Dict[str, Any], immediate: bool = False) -> Any:
+        """Merge changes for key; returns the emit result if they were sent at once"""
+        if immediate or not self.interval or changes.get('status') in TERMINAL_STATUSES:
+            with self._emit_lock:
+                with self._lock:
+                    merged = self._pending.pop(key, {})
+                merged.update(changes)
+                return self.emit(key, merged)
+
+        with self._lock:
+            self._pending.setdefault(key, {}).update(changes)
+            if self.background and self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        return None
+
+    def flush(self) -> None:
+        """Emit everything pending"""
+        with self._emit_lock:
+            with self._lock:
+                batch, self._pending = self._pending, {}
+                self._last_flush = time.time()
+            for key, changes in batch.items():
+                try:
+                    self.emit(key, changes)
+                except Exception as e:
+                    logger.error(f"Progress emit failed for {key}: {e}")
+
+    def flush_due(self, now: float = None) -> None:
+        """Flush if the rate interval has passed since the last flush"""
+        if self._pending and (now or time.time()) - self._last_flush >= self.interval:
+            self.flush()
+
+    def _run(self) -> None:
+        while not self._stopped:
+            self._wake.wait(self.interval)
+            self.flush()
+
+    def close(self) -> None:
+        self._stopped = True
+        self._wake.set()
+        self.flush()
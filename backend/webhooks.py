@@ -0,0 +1,322 @@
+"""
+Webhooks Module
+Signed completion callbacks delivered through a durable SQLite outbound queue
+with pooled connections, jittered exponential backoff and dead letters
+"""
+
+import os
+import hmac
+import json
+import time
+import random
+import socket
+import sqlite3
+import ipaddress
+import hashlib
+import atexit
+import threading
+import logging
+from typing import Dict, Any, List, Iterable
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+logger = logging.getLogger(__name__)
+
+# Responses worth retrying; other 4xx mean the receiver rejected the event for good
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429}
+
+def is_public_address(address: str) -> bool:
+    """False for loopback, private, link-local (cloud metadata), reserved and multicast addresses"""
+    ip = ipaddress.ip_address(address.split('%', 1)[0])
+    if isinstance(ip, ipaddress.IPv6Address) and ip.ipv4_mapped:
+        ip = ip.ipv4_mapped
+    return ip.is_global and not ip.is_multicast
+
+def is_valid_callback_url(url: str, allowed_hosts: Iterable[str] = ()) -> bool:
+    """Absolute http(s) URL of sane length whose host only resolves to public addresses
+
+    Hosts in allowed_hosts (a local test receiver, say) skip the address check.
+    """
+    if len(url) > 2048:
+        return False
+    parsed = urlparse(url)
+    if parsed.scheme not in ('http', 'https') or not parsed.hostname:
+        return False
+    if parsed.hostname.lower() in {host.lower() for host in allowed_hosts}:
+        return True
+    try:
+        port = parsed.port or (443 if parsed.scheme == 'https' else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parsed.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (socket.gaierror, UnicodeError, ValueError):
+        return False
+    return bool(addresses) and all(is_public_address(address) for address in addresses)
+
+class _PublicPeerMixin:
+    """Refuses a connection once it is open unless the peer address is public
+
+    Checking the socket that was actually connected, rather than resolving
+    the name up front, also covers DNS records that change between
+    registration and delivery.
+    """
+
+    allowed_hosts: frozenset = frozenset()
+
+    def _new_conn(self):
+        sock = super()._new_conn()
+        if self.host.lower() not in self.allowed_hosts:
+            address = sock.getpeername()[0]
+            if not is_public_address(address):
+                sock.close()
+                raise NewConnectionError(self, f"Refusing to deliver webhook to non-public address {address}")
+        return sock
+
+class _PublicHTTPConnection(_PublicPeerMixin, HTTPConnection):
+    pass
+
+class _PublicHTTPSConnection(_PublicPeerMixin, HTTPSConnection):
+    pass
+
+class PublicOnlyAdapter(HTTPAdapter):
+    """HTTPAdapter whose connections may only reach public addresses (or allowed_hosts)"""
+
+    def __init__(self, allowed_hosts: Iterable[str] = (), **kwargs):
+        self.allowed_hosts = frozenset(host.lower() for host in allowed_hosts)
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        # Pool and connection subclasses carrying this adapter's allowlist
+        attrs = {'allowed_hosts': self.allowed_hosts}
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': type('PublicHTTPConnectionPool', (HTTPConnectionPool,), {
+                'ConnectionCls': type('PublicHTTPConnection', (_PublicHTTPConnection,), attrs)
+            }),
+            'https': type('PublicHTTPSConnectionPool', (HTTPSConnectionPool,), {
+                'ConnectionCls': type('PublicHTTPSConnection', (_PublicHTTPSConnection,), attrs)
+            })
+        }
+
+def sign_payload(secret: bytes, timestamp: int, body: bytes) -> str:
+    """Signature header value: t=<unix time>,v1=<hex HMAC-SHA256 of '<t>.<body>'>"""
+    digest = hmac.new(secret, f"{timestamp}.".encode('utf-8') + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+class WebhookDispatcher:
+    """Durable outbound webhook queue
+
+    Events are stored before delivery is attempted, so they survive restarts.
+    Due deliveries are leased in a transaction, which lets several workers
+    share the queue file without sending an event twice while it is in flight.
+    Deliveries that exhaust max_attempts, or are rejected with a
+    non-retryable status, stay in the table with status 'dead'. Without a
+    secret nothing can be signed, so the dispatcher stays disabled.
+    """
+
+    def __init__(self, path: str, secret: str, max_attempts: int = 8, base_delay: float = 2,
+                 max_delay: float = 600, timeout: float = 10, workers: int = 2,
+                 lease_seconds: float = 60, poll_interval: float = 5, allowed_hosts: Iterable[str] = ()):
+        self.path = path
+        self.secret = secret.encode('utf-8') if isinstance(secret, str) else secret
+        self.enabled = bool(self.secret)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.lease_seconds = max(lease_seconds, timeout * 2)
+        self.poll_interval = poll_interval
+
+        self.session = requests.Session()
+        # Environment proxies would make the proxy the checked peer, so deliveries go direct
+        self.session.trust_env = False
+        adapter = PublicOnlyAdapter(allowed_hosts, pool_connections=workers * 2, pool_maxsize=workers * 2)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers['User-Agent'] = 'CodeCraft-Webhooks/1.0'
+
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = False
+        self._conn = self._connect()
+
+        if not self.enabled:
+            logger.warning("WEBHOOK_SECRET is not set, callback URLs are rejected and no webhooks are delivered")
+            self._workers = []
+            return
+        self._workers = [
+            threading.Thread(target=self._run, name=f"webhook-worker-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+        atexit.register(self.close)
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False, isolation_level=None)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS webhook_deliveries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL,
+                event TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT
+            )
+        ''')
+        conn.execute(
+            'CREATE INDEX IF NOT EXISTS idx_webhook_due ON webhook_deliveries (status, next_attempt_at)'
+        )
+        return conn
+
+    def enqueue(self, url: str, event: str, data: Dict[str, Any]) -> int:
+        """Store an event for delivery, returns the delivery ID"""
+        if not self.enabled:
+            raise RuntimeError("Webhooks are disabled: WEBHOOK_SECRET is not set")
+        now = time.time()
+        payload = json.dumps({'event': event, 'created_at': int(now), 'data': data}, default=str)
+        with self._lock:
+            cursor = self._conn.execute(
+                'INSERT INTO webhook_deliveries (url, event, payload, next_attempt_at, created_at) '
+                'VALUES (?, ?, ?, ?, ?)',
+                (url, event, payload, now, now)
+            )
+            delivery_id = cursor.lastrowid
+        self._wake.set()
+        return delivery_id
+
+    def _claim(self, limit: int = 10) -> List[tuple]:
+        """Lease due deliveries so no other worker picks them up meanwhile"""
+        now = time.time()
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = self._conn.execute(
+                    "SELECT id, url, event, payload, attempts FROM webhook_deliveries "
+                    "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT ?",
+                    (now, limit)
+                ).fetchall()
+                self._conn.executemany(
+                    'UPDATE webhook_deliveries SET next_attempt_at = ? WHERE id = ?',
+                    [(now + self.lease_seconds, row[0]) for row in rows]
+                )
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+        return rows
+
+    def backoff(self, attempts: int) -> float:
+        """Full-jitter exponential backoff before the next attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempts)))
+
+    def _deliver(self, delivery_id: int, url: str, event: str, payload: str, attempts: int) -> None:
+        body = payload.encode('utf-8')
+        headers = {
+            'Content-Type': 'application/json',
+            'X-CodeCraft-Event': event,
+            'X-CodeCraft-Delivery': str(delivery_id),
+            'X-CodeCraft-Signature': sign_payload(self.secret, int(time.time()), body)
+        }
+
+        retryable, error = True, None
+        try:
+            response = self.session.post(url, data=body, headers=headers, timeout=self.timeout, allow_redirects=False)
+            if 200 <= response.status_code < 300:
+                with self._lock:
+                    self._conn.execute('DELETE FROM webhook_deliveries WHERE id = ?', (delivery_id,))
+                logger.info(f"Delivered webhook {event} #{delivery_id} to {url}")
+                return
+            error = f"HTTP {response.status_code}"
+            retryable = response.status_code >= 500 or response.status_code in RETRYABLE_STATUS_CODES
+        except requests.RequestException as e:
+            error = str(e)[:500]
+
+        attempts += 1
+        if not retryable or attempts >= self.max_attempts:
+            with self._lock:
+                self._conn.execute(
+                    "UPDATE webhook_deliveries SET status = 'dead', attempts = ?, last_error = ? WHERE id = ?",
+                    (attempts, error, delivery_id)
+                )
+            logger.warning(f"Webhook {event} #{delivery_id} to {url} dead-lettered after {attempts} attempts: {error}")
+            return
+
+        with self._lock:
+            self._conn.execute(
+                'UPDATE webhook_deliveries SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?',
+                (attempts, time.time() + self.backoff(attempts), error, delivery_id)
+            )
+        logger.info(f"Webhook {event} #{delivery_id} failed ({error}), retry {attempts}/{self.max_attempts}")
+
+    def _next_due_in(self) -> float:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT MIN(next_attempt_at) FROM webhook_deliveries WHERE status = 'pending'"
+            ).fetchone()
+        if row[0] is None:
+            return self.poll_interval
+        return min(max(row[0] - time.time(), 0), self.poll_interval)
+
+    def _run(self) -> None:
+        while not self._stopped:
+            try:
+                rows = self._claim()
+                for row in rows:
+                    self._deliver(*row)
+                if rows:
+                    continue
+                wait = self._next_due_in()
+            except Exception as e:
+                logger.error(f"Webhook worker error: {e}")
+                wait = self.poll_interval
+            # Other processes may enqueue into the same file, so wake up periodically too
+            self._wake.wait(wait)
+            self._wake.clear()
+
+    def dead_letters(self, limit: int = 100) -> List[Dict[str, Any]]:
+        """Deliveries that gave up, newest first"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, url, event, attempts, last_error, created_at FROM webhook_deliveries "
+                "WHERE status = 'dead' ORDER BY id DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [
+            {'id': r[0], 'url': r[1], 'event': r[2], 'attempts': r[3], 'last_error': r[4], 'created_at': r[5]}
+            for r in rows
+        ]
+
+    def retry_dead_letter(self, delivery_id: int) -> bool:
+        """Put a dead delivery back in the queue"""
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE webhook_deliveries SET status = 'pending', attempts = 0, next_attempt_at = ? "
+                "WHERE id = ? AND status = 'dead'",
+                (time.time(), delivery_id)
+            )
+        self._wake.set()
+        return cursor.rowcount > 0
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM webhook_deliveries WHERE status = 'pending'"
+            ).fetchone()[0]
+
+    def close(self) -> None:
+        """Stop the workers; undelivered events stay queued for the next start"""
+        if self._stopped:
+            return
+        self._stopped = True
+        self._wake.set()
+        self.session.close()